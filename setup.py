@@ -12,6 +12,7 @@ setup(
     package_data={'': ['LICENSE', 'README.rst']},
     include_package_data=True,
     install_requires=['pytz'],
+    python_requires='>=3.3',
     tests_require=['coverage', 'mock', 'nose'],
     license=open('LICENSE').read(),
     classifiers=[
@@ -21,9 +22,7 @@ setup(
         'Natural Language :: English',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.2',
+        'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: Implementation :: CPython',
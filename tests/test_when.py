@@ -3,15 +3,40 @@
 
 import unittest
 
+import array
 import datetime
+import gc
 import locale
+import numbers
 import os
+import pickle
+import random
 import re
+import shutil
 import sys
+import tempfile
+import threading
+import time
+import weakref
 import pytz
 
 import when
 
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None
+
 # This is a hack for Python 3. Python 3 has no type called basestring.
 try:
     basestring
@@ -22,6 +47,21 @@ sys.path.insert(0, os.path.abspath('..'))
 sys.path.append('.')
 
 
+class Integer(object):
+    """An integer that isn't an int, like NumPy's integer scalars."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __int__(self):
+        return self.value
+
+    __index__ = __int__
+
+
+numbers.Integral.register(Integer)
+
+
 class WhenTest(unittest.TestCase):
     def setUp(self):
         when.unset_utc()
@@ -81,6 +121,14 @@ class WhenTest(unittest.TestCase):
         result = when._add_time(test_value, years=-1)
         self.assertEqual(result, expected_value)
 
+        # Milliseconds and microseconds are added on their own
+        result = when._add_time(test_value, milliseconds=750)
+        self.assertEqual(result, test_value + datetime.timedelta(
+            milliseconds=750))
+        result = when._add_time(test_value, microseconds=-250)
+        self.assertEqual(result, test_value - datetime.timedelta(
+            microseconds=250))
+
     def test__add_time_typeerror(self):
         """Test TypeError raised by when._add_time()"""
         self.assertRaises(TypeError, when._add_time, 'a')
@@ -95,6 +143,23 @@ class WhenTest(unittest.TestCase):
         self.assertTrue(when._is_date_type(self.now))
         self.assertTrue(when._is_date_type(self.now.time()))
 
+    def test__zone_names(self):
+        """Test when._zone_names()"""
+        # The index is only built once when threads race to build it
+        when._ZONE_NAMES = None
+        results = []
+
+        def get_names():
+            results.append(when._zone_names())
+
+        threads = [threading.Thread(target=get_names) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(names) for names in results)), 1)
+        self.assertTrue(when._zone_names() is results[0])
+
     def test_all_timezones(self):
         """Test when.all_timezones()"""
         # Make sure all_timezones() matches pytz's version
@@ -107,6 +172,263 @@ class WhenTest(unittest.TestCase):
         all_timezones_set = when.all_timezones_set()
         self.assertEqual(all_timezones_set, pytz.all_timezones_set)
 
+    def test_between(self):
+        """Test when.between"""
+        start = datetime.datetime(2012, 1, 31, 12)
+        self.assertEqual(when.between(start, start, 'months'), 0)
+        self.assertEqual(
+            when.between(start, datetime.datetime(2012, 3, 2, 12), 'months'),
+            1)
+        # One month after January 31 is March 2 in leap years
+        self.assertEqual(
+            when.between(start, datetime.datetime(2012, 3, 2, 11), 'months'),
+            0)
+        self.assertEqual(
+            when.between(start, datetime.datetime(2013, 1, 31), 'years'), 0)
+        self.assertEqual(
+            when.between(start, datetime.datetime(2013, 1, 31, 12), 'years'),
+            1)
+        self.assertEqual(
+            when.between(datetime.datetime(2013, 1, 31, 12), start, 'months'),
+            -12)
+
+        # Birthdays on February 29
+        birthday = datetime.date(2000, 2, 29)
+        self.assertEqual(
+            when.between(birthday, datetime.date(2012, 2, 28), 'years'), 11)
+        self.assertEqual(
+            when.between(birthday, datetime.date(2012, 2, 29), 'years'), 12)
+
+        # Other units count elapsed time, rounded toward zero
+        end = datetime.datetime(2012, 2, 14, 11, 59)
+        self.assertEqual(when.between(start, end, 'weeks'), 1)
+        self.assertEqual(when.between(start, end), 13)
+        self.assertEqual(when.between(end, start), -13)
+        self.assertEqual(when.between(start, end, 'hours'), 335)
+
+        # Aware datetimes use the calendar of the first time zone
+        tz = pytz.timezone('America/New_York')
+        start = tz.localize(datetime.datetime(2012, 3, 10, 12))
+        end = tz.localize(datetime.datetime(2012, 4, 10, 12))
+        self.assertEqual(when.between(start, end, 'months'), 1)
+        self.assertEqual(when.between(start, end.astimezone(pytz.utc),
+                                      'months'), 1)
+        self.assertEqual(when.between(start, end, 'hours'), 31 * 24 - 1)
+
+    def test_between_typeerror(self):
+        """Test TypeError raised by when.between"""
+        self.assertRaises(TypeError, when.between, self.today, 'today')
+        self.assertRaises(TypeError, when.between, self.now,
+                          pytz.utc.localize(self.now))
+
+    def test_between_valueerror(self):
+        """Test ValueError raised by when.between"""
+        self.assertRaises(ValueError, when.between, self.today, self.today,
+                          'fortnights')
+
+    def test_between_many(self):
+        """Test when.between_many"""
+        starts = [datetime.datetime(2012, 1, 31),
+                  datetime.datetime(2000, 2, 29)]
+        ends = [datetime.datetime(2012, 3, 1), datetime.datetime(2012, 2, 29)]
+        result = when.between_many(starts, ends, 'months', tz='UTC')
+        self.assertTrue(isinstance(result, array.array))
+        self.assertEqual(list(result), [0, 144])
+        self.assertEqual(list(when.between_many(ends, starts, 'years',
+                                                tz='UTC')), [0, -12])
+        self.assertEqual(list(when.between_many(starts, ends, tz='UTC')),
+                         [30, 4383])
+
+        # Columns are compared on the calendar of the starts
+        starts = when.DatetimeColumn.from_datetimes(
+            [datetime.datetime(2012, 2, 1)], tz='Asia/Tokyo')
+        ends = when.DatetimeColumn.from_datetimes(
+            [datetime.datetime(2012, 2, 29, 20)], tz='UTC')
+        self.assertEqual(list(when.between_many(starts, ends, 'months')), [1])
+        self.assertEqual(list(when.between_many(starts, ends, 'months',
+                                                tz='UTC')), [0])
+
+    def test_between_many_valueerror(self):
+        """Test ValueError raised by when.between_many"""
+        self.assertRaises(ValueError, when.between_many, [self.now], [],
+                          'days')
+        self.assertRaises(ValueError, when.between_many, [self.now],
+                          [self.now], 'fortnights')
+
+    def test_bucket(self):
+        """Test when.bucket"""
+        utc = pytz.utc
+        values = [utc.localize(datetime.datetime(2012, 3, 11, 12)),
+                  utc.localize(datetime.datetime(2012, 11, 4, 12)),
+                  utc.localize(datetime.datetime(2012, 3, 11, 3)),
+                  utc.localize(datetime.datetime(2012, 3, 11, 6))]
+
+        buckets = when.bucket(values, 'day', tz='America/New_York')
+        self.assertEqual([positions for _, positions in buckets],
+                         [[2], [0, 3], [1]])
+
+        # Days when daylight saving time starts and ends are 23 and 25
+        # hours long
+        durations = [interval.duration for interval, _ in buckets]
+        self.assertEqual(durations, [datetime.timedelta(hours=24),
+                                     datetime.timedelta(hours=23),
+                                     datetime.timedelta(hours=25)])
+        self.assertEqual(buckets[1][0].start, datetime.datetime(2012, 3, 11))
+
+        column = when.DatetimeColumn.from_datetimes(values, tz='UTC')
+        buckets = when.bucket(column, 'day')
+        self.assertEqual([interval.duration for interval, _ in buckets],
+                         [datetime.timedelta(days=1)] * 2)
+
+    def test_bucket_typeerror(self):
+        """Test TypeError raised by when.bucket"""
+        self.assertRaises(TypeError, when.bucket, [self.today], 'day')
+
+    def test_bucket_valueerror(self):
+        """Test ValueError raised by when.bucket"""
+        self.assertRaises(ValueError, when.bucket, [self.now], 'fortnight')
+
+    def test_business_calendar(self):
+        """Test when.BusinessCalendar"""
+        christmas = datetime.date(2012, 12, 25)
+        saturday = datetime.date(2012, 12, 29)
+        calendar = when.BusinessCalendar([christmas, saturday])
+
+        self.assertFalse(calendar.is_business_day(christmas))
+        self.assertFalse(calendar.is_business_day(datetime.date(2012, 12, 22)))
+        self.assertTrue(calendar.is_business_day(datetime.date(2012, 12, 24)))
+
+        # T+3 from Friday skips the weekend and the holiday
+        trade = datetime.datetime(2012, 12, 21, 15, 30)
+        self.assertEqual(calendar.add_business_days(trade, 3),
+                         datetime.datetime(2012, 12, 27, 15, 30))
+        self.assertEqual(calendar.add_business_days(christmas, -1),
+                         datetime.date(2012, 12, 24))
+        self.assertEqual(calendar.add_business_days(christmas, 0),
+                         datetime.date(2012, 12, 26))
+        self.assertEqual(calendar.add_business_days(trade, 260),
+                         datetime.datetime(2013, 12, 23, 15, 30))
+
+        self.assertEqual(calendar.business_days_between(
+            datetime.date(2012, 12, 1), datetime.date(2013, 1, 1)), 20)
+        self.assertEqual(calendar.business_days_between(
+            datetime.date(2013, 1, 1), datetime.date(2012, 12, 1)), -20)
+
+        # Other weekends
+        calendar = when.BusinessCalendar(weekend=(4, 5))
+        self.assertEqual(calendar.add_business_days(trade, 1),
+                         datetime.datetime(2012, 12, 23, 15, 30))
+
+        dates = [datetime.date(2012, 12, 20), datetime.date(2012, 12, 21)]
+        self.assertEqual(calendar.add_business_days_many(dates, 1),
+                         [datetime.date(2012, 12, 23),
+                          datetime.date(2012, 12, 23)])
+        self.assertEqual(calendar.add_business_days_many(dates, [1, -1]),
+                         [datetime.date(2012, 12, 23),
+                          datetime.date(2012, 12, 20)])
+        self.assertEqual(calendar.business_days_between_many(
+            dates, [datetime.date(2012, 12, 27)] * 2), [5, 4])
+
+        # future() and past() can add business days
+        calendar = when.BusinessCalendar()
+        today = when.now()
+        self.assertEqual(when.future(business_days=3).date(),
+                         calendar.add_business_days(today, 3).date())
+        self.assertEqual(when.past(days=1, business_days=2).date(),
+                         calendar.add_business_days(
+                             today - self.one_day, -2).date())
+
+    def test_business_calendar_typeerror(self):
+        """Test TypeError raised by when.BusinessCalendar"""
+        calendar = when.BusinessCalendar()
+        self.assertRaises(TypeError, when.BusinessCalendar, ['2012-12-25'])
+        self.assertRaises(TypeError, calendar.add_business_days, 'today', 1)
+        self.assertRaises(TypeError, calendar.business_days_between,
+                          self.today, None)
+        self.assertRaises(TypeError, calendar.is_business_day, self.now.time())
+
+    def test_business_calendar_valueerror(self):
+        """Test ValueError raised by when.BusinessCalendar"""
+        self.assertRaises(ValueError, when.BusinessCalendar, weekend=[7])
+        self.assertRaises(ValueError, when.BusinessCalendar,
+                          weekend=[0, 1, 2, 3, 4, 5, 6])
+
+        calendar = when.BusinessCalendar()
+        self.assertRaises(ValueError, calendar.add_business_days_many,
+                          [self.today], [1, 2])
+        self.assertRaises(ValueError, calendar.business_days_between_many,
+                          [self.today], [])
+
+    @unittest.skipIf(asyncio is None, 'asyncio is not available')
+    def test_call_at(self):
+        """Test when.call_at()"""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        called = []
+        millisecond = datetime.timedelta(milliseconds=1)
+        value = pytz.UTC.localize(when.now(utc=True) + 20 * millisecond)
+        when.call_at(value, lambda: called.append(when.now(utc=True)),
+                     loop=loop)
+        handle = when.call_at(when.now() + 10 * millisecond, called.append,
+                              'cancelled', loop=loop)
+        when.call_at(when.now() + 30 * millisecond, loop.stop, loop=loop)
+        handle.cancel()
+        self.assertTrue(handle.cancelled())
+
+        loop.run_forever()
+        self.assertEqual(len(called), 1)
+        self.assertTrue(called[0] >= value.replace(tzinfo=None) - millisecond)
+
+        # Pending deadlines don't keep a closed loop alive
+        other = asyncio.new_event_loop()
+        when.call_at(when.future(seconds=10), other.stop, loop=other)
+        reference = weakref.ref(other)
+        other.close()
+        del other
+        gc.collect()
+        self.assertTrue(reference() is None)
+
+    @unittest.skipIf(asyncio is None, 'asyncio is not available')
+    def test_call_at_typeerror(self):
+        """Test TypeError raised by when.call_at()"""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        self.assertRaises(TypeError, when.call_at, self.today, len, loop=loop)
+        self.assertRaises(TypeError, when.call_at, self.now, len, loop=loop,
+                          bad=True)
+
+    def test_ceil(self):
+        """Test when.ceil"""
+        value = datetime.datetime(2012, 2, 29, 12, 34, 56)
+        self.assertEqual(when.ceil(value, 'year', tz='UTC'),
+                         datetime.datetime(2013, 1, 1))
+        self.assertEqual(when.ceil(value, 'month', tz='UTC'),
+                         datetime.datetime(2012, 3, 1))
+        self.assertEqual(when.ceil(value, 'week', tz='UTC'),
+                         datetime.datetime(2012, 3, 5))
+        self.assertEqual(when.ceil(value, 'minute', tz='UTC'),
+                         datetime.datetime(2012, 2, 29, 12, 35))
+
+        # Values at the start of a unit are unchanged
+        value = datetime.datetime(2012, 3, 1)
+        self.assertEqual(when.ceil(value, 'day', tz='UTC'), value)
+
+        # The first 1:30 is rounded up to the second 1:00
+        tz = pytz.timezone('America/New_York')
+        value = pytz.utc.localize(datetime.datetime(2012, 11, 4, 5, 30))
+        self.assertEqual(when.ceil(value.astimezone(tz), 'hour'),
+                         pytz.utc.localize(datetime.datetime(2012, 11, 4, 6)))
+
+    def test_ceil_typeerror(self):
+        """Test TypeError raised by when.ceil"""
+        self.assertRaises(TypeError, when.ceil, self.today, 'day')
+
+    def test_ceil_valueerror(self):
+        """Test ValueError raised by when.ceil"""
+        self.assertRaises(ValueError, when.ceil, self.now, 'fortnight')
+
     def test_common_timezones(self):
         """Test when.common_timezones()"""
         # Make sure common_timezones() matches pytz's version
@@ -119,6 +441,207 @@ class WhenTest(unittest.TestCase):
         common_timezones_set = when.common_timezones_set()
         self.assertEqual(common_timezones_set, pytz.common_timezones_set)
 
+    def test_datetime_column(self):
+        """Test when.DatetimeColumn"""
+        eastern = pytz.timezone('America/New_York')
+        values = [datetime.datetime(2012, 1, 31, 12),
+                  datetime.datetime(2012, 3, 11, 1, 30),
+                  datetime.datetime(2012, 3, 11, 3, 30),
+                  datetime.datetime(2012, 11, 4, 1, 30)]
+
+        column = when.DatetimeColumn.from_datetimes(values,
+                                                    tz='America/New_York')
+        self.assertEqual(len(column), 4)
+        self.assertEqual(column.zone, 'America/New_York')
+        offset = datetime.timezone(datetime.timedelta(hours=-3))
+        self.assertEqual(when.DatetimeColumn([0], tz=offset).zone, '-03:00')
+        self.assertEqual(column.to_datetimes(), values)
+        self.assertEqual(column.to_datetimes(aware=True),
+                         [eastern.localize(value) for value in values])
+        self.assertEqual(column[0],
+                         when.Instant.from_datetime(values[0],
+                                                    tz='America/New_York'))
+        self.assertEqual(column[1:3].to_datetimes(), values[1:3])
+
+        # Aware values convert losslessly in both directions
+        aware = column.to_datetimes(aware=True)
+        aware[3] = eastern.localize(values[3], is_dst=True)
+        column = when.DatetimeColumn.from_datetimes(aware, tz='UTC')
+        self.assertEqual(column.shift_to('America/New_York')
+                         .to_datetimes(aware=True), aware)
+
+        # Shifting only changes the time zone
+        shifted = column.shift_to('Asia/Kolkata')
+        self.assertTrue(shifted.microseconds is column.microseconds)
+        self.assertEqual(shifted.to_datetimes(),
+                         [when.shift(value, to_tz='Asia/Kolkata')
+                          for value in aware])
+
+        # Units are added to the wall time, like _add_time()
+        column = when.DatetimeColumn.from_datetimes(values,
+                                                    tz='America/New_York')
+        for kwargs in ({'months': 1}, {'years': -1, 'days': 1},
+                       {'hours': 1}, {'weeks': 2, 'microseconds': 5}):
+            expected = [when._add_time(value, **kwargs) for value in values]
+            expected = [eastern.normalize(eastern.localize(value))
+                        .replace(tzinfo=None) for value in expected]
+            self.assertEqual(column.add(**kwargs).to_datetimes(), expected)
+
+        self.assertEqual(column.floor('day').to_datetimes(),
+                         [datetime.datetime(2012, 1, 31),
+                          datetime.datetime(2012, 3, 11),
+                          datetime.datetime(2012, 3, 11),
+                          datetime.datetime(2012, 11, 4)])
+        self.assertEqual(column.floor('month').to_datetimes(),
+                         [datetime.datetime(2012, 1, 1),
+                          datetime.datetime(2012, 3, 1),
+                          datetime.datetime(2012, 3, 1),
+                          datetime.datetime(2012, 11, 1)])
+
+        format_string = '%a %d %b %Y %I:%M:%S.%f %p %j %U %W %z %Z %G %%'
+        self.assertEqual(column.format(format_string),
+                         [value.strftime(format_string)
+                          for value in column.to_datetimes(aware=True)])
+        self.assertEqual(column.format(when.formats.DATETIME),
+                         [when.format(value, when.formats.DATETIME)
+                          for value in values])
+
+        # Comparisons and searching
+        middle = datetime.datetime(2012, 3, 11, 2)
+        self.assertEqual(column < middle, [True, True, False, False])
+        self.assertEqual(column >= column[2], [False, False, True, True])
+        self.assertEqual(column.searchsorted(middle), 2)
+        self.assertEqual(column.searchsorted(column[1]), 1)
+        self.assertEqual(column.searchsorted(column[1], side='right'), 2)
+        self.assertEqual(column, column[:])
+        self.assertNotEqual(column, column[1:])
+
+    def test_datetime_column_ambiguous(self):
+        """Test resolving ambiguous wall times like localize()"""
+        # Both offsets are standard time, so the later instant is used
+        cases = [('Europe/Moscow', datetime.datetime(2014, 10, 26, 1, 30)),
+                 ('Europe/London', datetime.datetime(1971, 10, 31, 2, 30)),
+                 ('Pacific/Apia', datetime.datetime(1910, 12, 31, 23, 58)),
+                 ('America/New_York', datetime.datetime(2012, 11, 4, 1, 30))]
+        for name, value in cases:
+            expected = when.to_epoch(pytz.timezone(name).localize(value),
+                                     unit='us')
+            self.assertEqual(when.to_epoch(value, tz=name, unit='us'),
+                             expected)
+            self.assertEqual(when.Instant.from_datetime(value, tz=name)
+                             .microseconds, expected)
+            column = when.DatetimeColumn.from_datetimes([value], tz=name)
+            self.assertEqual(column.microseconds[0], expected)
+            interval = when.Interval(value, value, tz=name)
+            self.assertEqual(interval.shift(utc=True).start,
+                             when.shift(value, name, 'UTC'))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_datetime_column_arrow(self):
+        """Test converting when.DatetimeColumn to and from pyarrow"""
+        column = when.DatetimeColumn([0, 1331451000000000, -1],
+                                     tz='America/New_York')
+
+        values = column.to_arrow()
+        self.assertEqual(str(values.type),
+                         'timestamp[us, tz=America/New_York]')
+        self.assertEqual(values.to_pylist(),
+                         column.to_datetimes(aware=True))
+
+        # The memory is shared in both directions
+        self.assertEqual(values.buffers()[1].address,
+                         column.microseconds.buffer_info()[0])
+        result = when.DatetimeColumn.from_arrow(values)
+        self.assertEqual(result, column)
+        self.assertEqual(result.zone, 'America/New_York')
+        self.assertEqual(result.to_buffer().obj, values.buffers()[1])
+
+        # Offsets, other units and missing time zones
+        self.assertEqual(when.DatetimeColumn.from_arrow(values[1:]),
+                         column[1:])
+        values = pyarrow.array([1, 2], pyarrow.timestamp('s', tz='+05:30'))
+        result = when.DatetimeColumn.from_arrow(values)
+        self.assertEqual(list(result.microseconds), [1000000, 2000000])
+        self.assertEqual(result.to_datetimes()[0],
+                         datetime.datetime(1970, 1, 1, 5, 30, 1))
+        values = pyarrow.array([1], pyarrow.timestamp('us'))
+        self.assertEqual(when.DatetimeColumn.from_arrow(values).zone, 'UTC')
+
+        self.assertRaises(TypeError, when.DatetimeColumn.from_arrow,
+                          pyarrow.array([1]))
+        self.assertRaises(ValueError, when.DatetimeColumn.from_arrow,
+                          pyarrow.array([None], pyarrow.timestamp('us')))
+
+    def test_datetime_column_buffer(self):
+        """Test sharing the memory of when.DatetimeColumn"""
+        data = array.array('q', [0, 86400000000])
+        column = when.DatetimeColumn.from_buffer(data, tz='UTC')
+        self.assertEqual(column.to_datetimes(),
+                         [datetime.datetime(1970, 1, 1),
+                          datetime.datetime(1970, 1, 2)])
+
+        # Changes to the buffer are seen by the column
+        data[0] = 1000000
+        self.assertEqual(column[0].microseconds, 1000000)
+
+        view = column.to_buffer()
+        self.assertEqual(view.format, 'q')
+        self.assertEqual(view.tolist(), [1000000, 86400000000])
+        self.assertTrue(column.shift_to('Asia/Tokyo').to_buffer().obj is data)
+
+        # Raw bytes are cast to integers
+        column = when.DatetimeColumn.from_buffer(bytearray(data.tobytes()),
+                                                 tz='UTC')
+        self.assertEqual(list(column.microseconds), [1000000, 86400000000])
+        self.assertEqual(column.format('%d'), ['01', '02'])
+
+    def test_datetime_column_typeerror(self):
+        """Test TypeError raised by when.DatetimeColumn"""
+        self.assertRaises(TypeError, when.DatetimeColumn.from_datetimes,
+                          [self.today])
+
+        column = when.DatetimeColumn([0], tz='UTC')
+        self.assertRaises(TypeError, column.searchsorted, self.today)
+
+    def test_datetime_column_valueerror(self):
+        """Test ValueError raised by when.DatetimeColumn"""
+        column = when.DatetimeColumn([0], tz='UTC')
+        self.assertRaises(ValueError, column.floor, 'fortnight')
+        self.assertRaises(ValueError, column.searchsorted, self.now, 'middle')
+        self.assertRaises(ValueError, column.__lt__, column[:0])
+
+    @unittest.skipIf(asyncio is None, 'asyncio is not available')
+    def test_deadlines(self):
+        """Test when.deadlines()"""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        group = when.deadlines(loop=loop, utc=True)
+        millisecond = datetime.timedelta(milliseconds=1)
+        start = when.now(utc=True)
+        futures = [group.sleep_until(start + i * millisecond, i)
+                   for i in range(0, 50, 5)]
+        self.assertEqual(len(group), 10)
+
+        results = loop.run_until_complete(asyncio.gather(*futures))
+        self.assertEqual(results, list(range(0, 50, 5)))
+        self.assertEqual(len(group), 0)
+        self.assertTrue(when.now(utc=True) >= start + 45 * millisecond)
+
+        called = []
+        group.call_at(when.now(utc=True) + 10 * millisecond, called.append, 1)
+        group.close()
+        loop.run_until_complete(asyncio.sleep(0.02))
+        self.assertEqual(called, [])
+
+        # Cancelled deadlines are removed from the heap
+        handles = [group.call_at(when.future(days=1, utc=True), len)
+                   for _ in range(100)]
+        for handle in handles[:99]:
+            handle.cancel()
+        self.assertEqual(len(group), 1)
+        self.assertTrue(len(group._heap) < 50)
+
     def test_ever(self):
         """Test when.ever()"""
         old_result = None
@@ -128,6 +651,116 @@ class WhenTest(unittest.TestCase):
             self.assertNotEqual(result, old_result)
             old_result = result
 
+    def test_fields(self):
+        """Test when.fields"""
+        values = [datetime.datetime(2012, 12, 31, 23, 59, 58, 123456),
+                  datetime.datetime(2012, 2, 29, 12, 30)]
+        result = when.fields(values, tz='UTC')
+        self.assertEqual(sorted(result),
+                         ['day', 'day_of_year', 'hour', 'iso_week',
+                          'iso_year', 'microsecond', 'minute', 'month',
+                          'quarter', 'second', 'weekday', 'year'])
+        for name in result:
+            self.assertTrue(isinstance(result[name], array.array))
+
+        self.assertEqual(list(result['year']), [2012, 2012])
+        self.assertEqual(list(result['month']), [12, 2])
+        self.assertEqual(list(result['day']), [31, 29])
+        self.assertEqual(list(result['hour']), [23, 12])
+        self.assertEqual(list(result['minute']), [59, 30])
+        self.assertEqual(list(result['second']), [58, 0])
+        self.assertEqual(list(result['microsecond']), [123456, 0])
+        self.assertEqual(list(result['weekday']), [0, 2])
+        self.assertEqual(list(result['quarter']), [4, 1])
+        self.assertEqual(list(result['day_of_year']), [366, 60])
+
+        # The last days of a year can be in the first ISO week of the next
+        self.assertEqual(list(result['iso_year']), [2013, 2012])
+        self.assertEqual(list(result['iso_week']), [1, 9])
+
+        # Fields are of the wall time in the time zone
+        column = when.DatetimeColumn.from_datetimes(values, tz='UTC')
+        result = when.fields(column, tz='Asia/Tokyo', fields=['year', 'hour'])
+        self.assertEqual(sorted(result), ['hour', 'year'])
+        self.assertEqual(list(result['year']), [2013, 2012])
+        self.assertEqual(list(result['hour']), [8, 21])
+
+    def test_fields_typeerror(self):
+        """Test TypeError raised by when.fields"""
+        self.assertRaises(TypeError, when.fields, [self.today])
+
+    def test_fields_valueerror(self):
+        """Test ValueError raised by when.fields"""
+        self.assertRaises(ValueError, when.fields, [self.now],
+                          fields=['fortnight'])
+
+    def test_floor(self):
+        """Test when.floor"""
+        value = datetime.datetime(2012, 2, 29, 12, 34, 56, 789)
+        self.assertEqual(when.floor(value, 'year', tz='UTC'),
+                         datetime.datetime(2012, 1, 1))
+        self.assertEqual(when.floor(value, 'month', tz='UTC'),
+                         datetime.datetime(2012, 2, 1))
+        self.assertEqual(when.floor(value, 'week', tz='UTC'),
+                         datetime.datetime(2012, 2, 27))
+        self.assertEqual(when.floor(value, 'day', tz='UTC'),
+                         datetime.datetime(2012, 2, 29))
+        self.assertEqual(when.floor(value, 'hour', tz='UTC'),
+                         datetime.datetime(2012, 2, 29, 12))
+        self.assertEqual(when.floor(value, 'second', tz='UTC'),
+                         datetime.datetime(2012, 2, 29, 12, 34, 56))
+
+        # Aware datetimes are rounded in their own time zone
+        tz = pytz.timezone('America/New_York')
+        value = pytz.utc.localize(datetime.datetime(2012, 3, 11, 12))
+        result = when.floor(value.astimezone(tz), 'day')
+        self.assertEqual(result,
+                         pytz.utc.localize(datetime.datetime(2012, 3, 11, 5)))
+        self.assertEqual(result.tzinfo.zone, 'America/New_York')
+        self.assertEqual(when.floor(value, 'day'), value.replace(hour=0))
+
+        # Each 1:30 on the night daylight saving time ends is rounded to
+        # the 1:00 before it
+        for hour in (5, 6):
+            value = pytz.utc.localize(datetime.datetime(2012, 11, 4, hour, 30))
+            self.assertEqual(
+                when.floor(value, 'hour', tz='America/New_York'),
+                pytz.utc.localize(datetime.datetime(2012, 11, 4, hour)))
+
+    def test_floor_typeerror(self):
+        """Test TypeError raised by when.floor"""
+        self.assertRaises(TypeError, when.floor, self.today, 'day')
+        self.assertRaises(TypeError, when.floor, 'today', 'day')
+
+    def test_floor_valueerror(self):
+        """Test ValueError raised by when.floor"""
+        self.assertRaises(ValueError, when.floor, self.now, 'fortnight')
+
+    def test_floor_many(self):
+        """Test when.floor_many"""
+        values = [datetime.datetime(2012, 2, 29, 12, 34),
+                  datetime.datetime(2012, 2, 29, 23, 59),
+                  datetime.datetime(2012, 3, 1, 0, 1)]
+        result = when.floor_many(values, 'day', tz='UTC')
+        self.assertTrue(isinstance(result, when.DatetimeColumn))
+        self.assertEqual(result.to_datetimes(),
+                         [datetime.datetime(2012, 2, 29),
+                          datetime.datetime(2012, 2, 29),
+                          datetime.datetime(2012, 3, 1)])
+
+        # Columns are rounded in the time zone they're shifted to
+        column = when.DatetimeColumn.from_datetimes(values, tz='UTC')
+        result = when.floor_many(column, 'day', tz='America/New_York')
+        self.assertEqual(result.to_datetimes(),
+                         [datetime.datetime(2012, 2, 29),
+                          datetime.datetime(2012, 2, 29),
+                          datetime.datetime(2012, 2, 29)])
+        self.assertEqual(result.zone, 'America/New_York')
+
+    def test_floor_many_typeerror(self):
+        """Test TypeError raised by when.floor_many"""
+        self.assertRaises(TypeError, when.floor_many, [self.today], 'day')
+
     def test_format(self):
         """Test when.format()"""
         now = when.now()
@@ -157,6 +790,101 @@ class WhenTest(unittest.TestCase):
         """Test TypeError raised by when.format()"""
         self.assertRaises(TypeError, when.format, 'a', '%a')
 
+    def test_format_locale(self):
+        """Test when.format() with a locale"""
+        value = pytz.utc.localize(datetime.datetime(2012, 3, 4, 15, 6, 7))
+        for format_string in ('%a %A %b %B %d %H %I %j %m %M %p %S %y %Y',
+                              '%c %x %X %z %Z', '%h %r', when.formats.DATE,
+                              when.formats.DATETIME, when.formats.TIME,
+                              when.formats.TIME_AMPM):
+            for item in (value, value.replace(tzinfo=None), value.date(),
+                         value.time()):
+                self.assertEqual(when.format(item, format_string, 'C'),
+                                 when.format(item, format_string))
+
+        # Locales are loaded once, without changing the current locale
+        current = locale.setlocale(locale.LC_TIME)
+        self.assertTrue(when._locale_names('C') is when._locale_names('C'))
+        self.assertEqual(locale.setlocale(locale.LC_TIME), current)
+
+        # Other threads never see the locale being loaded. The other
+        # thread reads the locale at every call made while loading it.
+        name = 'C.UTF-8'
+        when._LOCALE_NAMES.pop(name, None)
+        expected = time.strftime('%c', time.gmtime(0))
+        seen = set()
+        asked = threading.Event()
+        answered = threading.Event()
+        done = []
+
+        def read_locale():
+            while asked.wait() and not done:
+                asked.clear()
+                seen.add((locale.setlocale(locale.LC_TIME),
+                          time.strftime('%c', time.gmtime(0))))
+                answered.set()
+
+        def ask(frame, event, arg):
+            asked.set()
+            answered.wait()
+            answered.clear()
+
+        thread = threading.Thread(target=read_locale)
+        thread.start()
+        sys.setprofile(ask)
+        try:
+            when._locale_names(name)
+        except ValueError:
+            pass  # The locale isn't available here
+        finally:
+            sys.setprofile(None)
+            done.append(True)
+            asked.set()
+            thread.join()
+        self.assertEqual(seen, set([(current, expected)]))
+
+        names = list(when._locale_names('C'))
+        names[0] = ('lun', 'mar', 'mer', 'jeu', 'ven', 'sam', 'dim')
+        names[3] = ('janvier', 'février', 'mars', 'avril', 'mai', 'juin',
+                    'juillet', 'août', 'septembre', 'octobre', 'novembre',
+                    'décembre')
+        names[2] = ('janv.', 'févr.', 'mars', 'avr.', 'mai', 'juin',
+                    'juil.', 'août', 'sept.', 'oct.', 'nov.', 'déc.')
+        names[6] = '%d/%m/%Y'
+        names[8] = ''
+        when._LOCALE_NAMES['test'] = tuple(names)
+        try:
+            self.assertEqual(when.format(value, '%a %d %B', 'test'),
+                             'dim 04 mars')
+            # %h and %r come from the locale too, not the current one
+            self.assertEqual(when.format(value, '%h %r', 'test'),
+                             'mars 03:06:07 PM')
+            self.assertEqual(when.format(value.replace(month=2), '%h',
+                                         'test'), 'févr.')
+            self.assertEqual(when.format(value, when.formats.DATE, 'test'),
+                             '04/03/2012')
+            self.assertEqual(
+                when.Instant.from_datetime(value).format('%B', 'test'),
+                'mars')
+            column = when.DatetimeColumn.from_datetimes([value], tz='UTC')
+            self.assertEqual(column.format(when.formats.DATE, 'test'),
+                             ['04/03/2012'])
+        finally:
+            del when._LOCALE_NAMES['test']
+
+    def test_format_locale_valueerror(self):
+        """Test ValueError raised by when.format() with a locale"""
+        self.assertRaises(ValueError, when.format, self.now, '%c',
+                          'xx_XX.not-a-locale')
+
+        # Alternative representations would use the current locale
+        self.assertRaises(ValueError, when.format, self.now, '%Ey', 'C')
+        self.assertRaises(ValueError, when.format, self.now, '%Od', 'C')
+        column = when.DatetimeColumn.from_datetimes([self.utc], tz='UTC')
+        self.assertRaises(ValueError, column.format, '%EY', 'C')
+        self.assertEqual(column.format('%EY %Od'),
+                         [self.utc.strftime('%EY %Od')])
+
     def test_formats(self):
         """Test the iteration of the formats class"""
         for k in when.formats:
@@ -174,6 +902,58 @@ class WhenTest(unittest.TestCase):
             self.assertEqual(value, getattr(when._FormatsMetaClass, k))
             self.assertEqual(value, when._FormatsMetaClass.__dict__[k])
 
+    def test_from_epoch(self):
+        """Test when.from_epoch"""
+        self.assertEqual(when.from_epoch(1356998400, utc=True),
+                         datetime.datetime(2013, 1, 1))
+        self.assertEqual(when.from_epoch(1356998400123, unit='ms', utc=True),
+                         datetime.datetime(2013, 1, 1, 0, 0, 0, 123000))
+        self.assertEqual(when.from_epoch(1356998400.5, utc=True),
+                         datetime.datetime(2013, 1, 1, 0, 0, 0, 500000))
+        self.assertEqual(when.from_epoch(-1, unit='us', utc=True),
+                         datetime.datetime(1969, 12, 31, 23, 59, 59, 999999))
+        self.assertEqual(when.from_epoch(Integer(1356998400), utc=True),
+                         datetime.datetime(2013, 1, 1))
+
+        value = when.from_epoch(1356998400, tz='America/New_York')
+        self.assertEqual(value, datetime.datetime(2012, 12, 31, 19))
+        value = when.from_epoch(1356998400, tz='America/New_York', aware=True)
+        self.assertEqual(value.tzinfo.zone, 'America/New_York')
+        self.assertEqual(value,
+                         pytz.utc.localize(datetime.datetime(2013, 1, 1)))
+
+        # The system time zone is used by default
+        self.assertEqual(when.from_epoch(1356998400),
+                         when.shift(datetime.datetime(2013, 1, 1), 'UTC'))
+
+    def test_from_epoch_typeerror(self):
+        """Test TypeError raised by when.from_epoch"""
+        self.assertRaises(TypeError, when.from_epoch, '1356998400')
+        self.assertRaises(TypeError, when.from_epoch, True)
+
+    def test_from_epoch_valueerror(self):
+        """Test ValueError raised by when.from_epoch"""
+        self.assertRaises(ValueError, when.from_epoch, 0, unit='ns')
+        self.assertRaises(ValueError, when.from_epoch, 10 ** 20)
+        self.assertRaises(ValueError, when.from_epoch, float('inf'))
+        self.assertRaises(ValueError, when.from_epoch, float('nan'))
+        self.assertRaises(ValueError, when.from_epoch_many, [0, 10 ** 20])
+
+    def test_from_epoch_many(self):
+        """Test when.from_epoch_many"""
+        column = when.from_epoch_many([0, 1356998400], tz='Asia/Tokyo')
+        self.assertTrue(isinstance(column, when.DatetimeColumn))
+        self.assertEqual(column.zone, 'Asia/Tokyo')
+        self.assertEqual(column.to_datetimes(),
+                         [datetime.datetime(1970, 1, 1, 9),
+                          datetime.datetime(2013, 1, 1, 9)])
+        self.assertEqual(
+            list(when.from_epoch_many([1, 2], unit='ms').microseconds),
+            [1000, 2000])
+        self.assertEqual(
+            list(when.from_epoch_many([Integer(3)], unit='us').microseconds),
+            [3])
+
     def test_how_many_leap_days(self):
         """Test when.how_many_leap_days()"""
         # Tests with just years
@@ -262,6 +1042,435 @@ class WhenTest(unittest.TestCase):
         # from_date must be before to_date
         self.assertRaises(ValueError, when.how_many_leap_days, d1, d2)
 
+    def test_humanize(self):
+        """Test when.humanize"""
+        now = datetime.datetime(2012, 3, 31, 12)
+        for expected, kwargs in (('just now', {}),
+                                 ('1 second', {'seconds': 1}),
+                                 ('59 seconds', {'seconds': 59}),
+                                 ('3 hours', {'hours': 3, 'minutes': 59}),
+                                 ('1 day', {'days': 1}),
+                                 ('2 weeks', {'days': 20}),
+                                 ('1 month', {'months': 1}),
+                                 ('11 months', {'months': 11}),
+                                 ('1 year', {'years': 1, 'months': 11}),
+                                 ('10 years', {'years': 10})):
+            past = when._add_time(
+                now, **dict((k, -v) for k, v in kwargs.items()))
+            future = when._add_time(now, **kwargs)
+            if expected == 'just now':
+                self.assertEqual(when.humanize(past, now), expected)
+                continue
+            self.assertEqual(when.humanize(past, now), expected + ' ago')
+            self.assertEqual(when.humanize(future, now), 'in ' + expected)
+
+        # A month before March 31 is March 2, as with past(months=1)
+        self.assertEqual(when.humanize(datetime.datetime(2012, 3, 2, 12),
+                                       now), '1 month ago')
+        self.assertEqual(when.humanize(datetime.datetime(2012, 3, 2, 13),
+                                       now), '4 weeks ago')
+
+        # Smaller units than the granularity are just now
+        self.assertEqual(when.humanize(now, now - self.one_second,
+                                       granularity='minute'), 'just now')
+        self.assertEqual(when.humanize(now, now - self.one_day,
+                                       granularity='day'), 'in 1 day')
+
+        # Aware datetimes and instants work too, and now is the default
+        self.assertEqual(when.humanize(pytz.utc.localize(now),
+                                       pytz.utc.localize(now)), 'just now')
+        self.assertEqual(when.humanize(when.past(hours=2)), '2 hours ago')
+        self.assertEqual(when.humanize(when.Instant.now()), 'just now')
+
+    def test_humanize_typeerror(self):
+        """Test TypeError raised by when.humanize"""
+        self.assertRaises(TypeError, when.humanize, self.today)
+        self.assertRaises(TypeError, when.humanize, self.now, self.today)
+
+    def test_humanize_valueerror(self):
+        """Test ValueError raised by when.humanize"""
+        self.assertRaises(ValueError, when.humanize, self.now,
+                          granularity='fortnight')
+
+    def test_humanize_many(self):
+        """Test when.humanize_many"""
+        now = datetime.datetime(2012, 3, 31, 12)
+        values = [now - self.one_day, now, now + self.one_second * 90]
+        self.assertEqual(when.humanize_many(values, now),
+                         ['1 day ago', 'just now', 'in 1 minute'])
+
+        column = when.DatetimeColumn.from_datetimes(values, tz='Asia/Tokyo')
+        result = when.humanize_many(column, datetime.datetime(2012, 1, 15),
+                                    granularity='day')
+        self.assertEqual(result, ['in 2 months'] * 3)
+
+        # Equal descriptions are the same string
+        result = when.humanize_many([now, now], now + self.one_day)
+        self.assertTrue(result[0] is result[1])
+
+    def test_hybrid_logical_clock(self):
+        """Test when.HybridLogicalClock"""
+        start = when.to_epoch(datetime.datetime(2020, 1, 1), unit='ms',
+                              utc=True)
+        clocks = [start, start + 1000]
+        slow = when.HybridLogicalClock(lambda: clocks[0])
+        fast = when.HybridLogicalClock(lambda: clocks[1])
+
+        first = slow.now()
+        self.assertEqual(first, start << 16)
+        self.assertEqual(slow.now(), first + 1)
+        self.assertEqual(slow.decode(first),
+                         (datetime.datetime(2020, 1, 1), 0))
+
+        # Events received from a node that's ahead stay in order
+        sent = fast.now()
+        received = slow.update(sent)
+        self.assertTrue(received > sent)
+        self.assertEqual(slow.decode(received),
+                         (datetime.datetime(2020, 1, 1, 0, 0, 1), 1))
+        self.assertTrue(slow.now() > received)
+
+        # Events received from a node that's behind don't move the clock
+        clocks[0] += 5000
+        local = slow.now()
+        self.assertEqual(slow.update(fast.now()), local + 1)
+
+        # Timestamps can be any integer, like NumPy's
+        local = slow.now()
+        self.assertEqual(slow.update(Integer(fast.now())), local + 1)
+
+        # The counter moves on to the next millisecond when it runs out
+        clock = when.HybridLogicalClock(lambda: start)
+        stamps = [clock.now() for _ in range(1 << 16)]
+        self.assertEqual(clock.decode(stamps[-1]),
+                         (datetime.datetime(2020, 1, 1), 65535))
+        self.assertEqual(clock.decode(clock.now()),
+                         (datetime.datetime(2020, 1, 1, 0, 0, 0, 1000), 0))
+
+        # Simulated nodes with skewed clocks exchanging messages
+        random.seed(0)
+        now = [start]
+        nodes = [when.HybridLogicalClock(lambda skew=skew: now[0] + skew)
+                 for skew in (0, 250, -400)]
+        latest = [0] * len(nodes)
+        messages = []
+        for _ in range(2000):
+            now[0] += random.randint(0, 1)
+            node = random.randrange(len(nodes))
+            if messages and random.random() < 0.5:
+                message = messages.pop(random.randrange(len(messages)))
+                stamp = nodes[node].update(message)
+                self.assertTrue(stamp > message)
+            else:
+                stamp = nodes[node].now()
+                messages.append(stamp)
+            self.assertTrue(stamp > latest[node])
+            latest[node] = stamp
+
+    def test_hybrid_logical_clock_typeerror(self):
+        """Test TypeError raised by when.HybridLogicalClock"""
+        clock = when.HybridLogicalClock()
+        self.assertRaises(TypeError, clock.update, '1')
+        self.assertRaises(TypeError, clock.update, 1.5)
+
+    def test_hybrid_logical_clock_valueerror(self):
+        """Test ValueError raised by when.HybridLogicalClock"""
+        clock = when.HybridLogicalClock(
+            max_offset=datetime.timedelta(seconds=1))
+        self.assertRaises(ValueError, clock.update, -1)
+        self.assertRaises(ValueError, clock.update, 1 << 64)
+
+        ahead = when.to_epoch(when.now(utc=True), unit='ms', utc=True) + 60000
+        self.assertRaises(ValueError, clock.update, ahead << 16)
+
+    def test_id_generator(self):
+        """Test when.IdGenerator"""
+        epoch = datetime.datetime(2020, 1, 1)
+        start = when.to_epoch(epoch, unit='ms', utc=True)
+        clock = [start + 1000]
+        generator = when.IdGenerator(7, clock=lambda: clock[0])
+
+        first, second = generator.next_id(), generator.next_id()
+        self.assertEqual(first, (1000 << 22) | (7 << 12))
+        self.assertEqual(second, first + 1)
+        self.assertEqual(generator.decode(second),
+                         (datetime.datetime(2020, 1, 1, 0, 0, 1), 7, 1))
+
+        # Node ids can be any integer, like NumPy's
+        self.assertEqual(when.IdGenerator(Integer(7)).node_id, 7)
+
+        # Going back in time keeps the IDs increasing
+        clock[0] -= 500
+        third = generator.next_id()
+        self.assertEqual(third, second + 1)
+
+        # Running out of sequence numbers borrows the next millisecond
+        ids = generator.next_ids(5000)
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertTrue(ids[0] > third)
+        self.assertEqual(generator.decode(ids[-1])[0],
+                         datetime.datetime(2020, 1, 1, 0, 0, 1, 1000))
+
+        # The clock takes over again once it catches up
+        clock[0] = start + 2000
+        self.assertEqual(generator.decode(generator.next_id()),
+                         (datetime.datetime(2020, 1, 1, 0, 0, 2), 7, 0))
+
+        # IDs are unique across threads and nodes
+        results = []
+        generators = [when.IdGenerator(0), when.IdGenerator(1)]
+
+        def make_ids(generator):
+            results.extend(generator.next_id() for _ in range(2000))
+
+        threads = [threading.Thread(target=make_ids, args=(generator,))
+                   for generator in generators * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 8000)
+
+        # The default clock is the system clock
+        before = when.now(utc=True).replace(microsecond=0)
+        decoded = when.IdGenerator(1023).decode(generators[0].next_id())[0]
+        self.assertTrue(before <= decoded <= when.now(utc=True))
+
+    def test_id_generator_typeerror(self):
+        """Test TypeError raised by when.IdGenerator"""
+        self.assertRaises(TypeError, when.IdGenerator, '1')
+        self.assertRaises(TypeError, when.IdGenerator, 1, epoch=self.today)
+
+    def test_id_generator_valueerror(self):
+        """Test ValueError raised by when.IdGenerator"""
+        self.assertRaises(ValueError, when.IdGenerator, -1)
+        self.assertRaises(ValueError, when.IdGenerator, 1024)
+
+        generator = when.IdGenerator(1, clock=lambda: 0)
+        self.assertRaises(ValueError, generator.next_id)
+        self.assertRaises(ValueError, generator.next_ids, 2)
+
+    def test_instant(self):
+        """Test when.Instant"""
+        eastern = pytz.timezone('America/New_York')
+        value = datetime.datetime(2012, 3, 11, 3, 30)
+
+        instant = when.Instant.from_datetime(value, tz='America/New_York')
+        self.assertEqual(instant.zone, 'America/New_York')
+        self.assertEqual(instant.to_datetime(), value)
+        self.assertEqual(instant.to_datetime(aware=True),
+                         eastern.localize(value))
+        self.assertEqual(instant.microseconds, 1331451000000000)
+
+        # Aware datetimes keep their time zone
+        aware = eastern.localize(value)
+        self.assertEqual(when.Instant.from_datetime(aware), instant)
+        self.assertEqual(when.Instant.from_datetime(aware).zone,
+                         'America/New_York')
+
+        # Shifting matches shift()
+        shifted = instant.shift('Asia/Kolkata')
+        self.assertEqual(shifted, instant)
+        self.assertEqual(shifted.zone, 'Asia/Kolkata')
+        self.assertEqual(shifted.to_datetime(),
+                         when.shift(value, 'America/New_York', 'Asia/Kolkata'))
+        self.assertEqual(instant.format('%Y-%m-%d %H:%M %Z'),
+                         '2012-03-11 03:30 EDT')
+
+        # Zones are interned
+        self.assertTrue(instant.tzinfo is eastern)
+        self.assertFalse(hasattr(instant, '__dict__'))
+
+        # Sorting and hashing use the integer
+        earlier = when.Instant(instant.microseconds - 1, 'UTC')
+        self.assertEqual(sorted([shifted, earlier, instant]),
+                         [earlier, shifted, instant])
+        self.assertTrue(earlier < instant <= shifted)
+        self.assertEqual(len(set([instant, shifted, earlier])), 2)
+        self.assertNotEqual(instant, value)
+
+        self.assertEqual(pickle.loads(pickle.dumps(instant)), instant)
+        self.assertEqual(pickle.loads(pickle.dumps(instant)).zone,
+                         'America/New_York')
+
+        # Time zones without a name are pickled as their offset
+        for tz, name in (
+                (datetime.timezone(datetime.timedelta(hours=5, minutes=30)),
+                 '+05:30'),
+                (pytz.FixedOffset(-330), '-05:30')):
+            fixed = instant.shift(tz)
+            unpickled = pickle.loads(pickle.dumps(fixed))
+            self.assertEqual(unpickled, fixed)
+            self.assertEqual(unpickled.to_datetime(), fixed.to_datetime())
+            # They're shown by their offset too, which can be resolved
+            self.assertEqual(fixed.zone, name)
+            self.assertEqual(repr(fixed), 'when.Instant({0}, {1!r})'.format(
+                fixed.microseconds, fixed.zone))
+            self.assertEqual(when.Instant(fixed.microseconds,
+                                          when.timezone_object(fixed.zone)),
+                             fixed)
+            self.assertEqual(when.Instant(fixed.microseconds, fixed.zone)
+                             .to_datetime(), fixed.to_datetime())
+
+        # Naive datetimes can be in time zones pytz doesn't provide
+        tz = datetime.timezone(datetime.timedelta(hours=2))
+        fixed = when.Instant.from_datetime(value, tz=tz)
+        self.assertEqual(fixed.to_datetime(), value)
+        self.assertEqual(fixed.microseconds, 1331451000000000 - 6 * 3600000000)
+
+        # The UTC mode is respected
+        self.assertEqual(when.Instant.now(utc=True).zone, 'UTC')
+        instant = when.Instant.from_datetime(self.utc, utc=True)
+        self.assertEqual(instant.to_datetime(), self.utc)
+
+    def test_instant_typeerror(self):
+        """Test TypeError raised by when.Instant"""
+        self.assertRaises(TypeError, when.Instant.from_datetime, self.today)
+
+    def test_intern_datetime(self):
+        """Test when.intern_datetime()"""
+        offset = datetime.timedelta(hours=1)
+        first = datetime.datetime(2012, 1, 1,
+                                  tzinfo=datetime.timezone(offset))
+        second = datetime.datetime(2013, 6, 1,
+                                   tzinfo=datetime.timezone(offset))
+        self.assertFalse(first.tzinfo is second.tzinfo)
+
+        first = when.intern_datetime(first)
+        second = when.intern_datetime(second)
+        self.assertTrue(first.tzinfo is second.tzinfo)
+        self.assertEqual(second.utcoffset(), offset)
+
+        # Different offsets of a time zone aren't mixed up
+        tz = pytz.timezone('America/New_York')
+        winter = tz.localize(datetime.datetime(2012, 1, 1))
+        summer = tz.localize(datetime.datetime(2012, 7, 1))
+        self.assertEqual(when.intern_datetime(winter).tzname(), 'EST')
+        self.assertEqual(when.intern_datetime(summer).tzname(), 'EDT')
+
+        self.assertTrue(when.intern_datetime(self.now) is self.now)
+
+        # Shared time zones are forgotten once there are too many
+        for seconds in range(when._TZINFOS_MAX + 1):
+            tz = datetime.timezone(datetime.timedelta(seconds=seconds))
+            when.intern_datetime(datetime.datetime(2012, 1, 1, tzinfo=tz))
+        self.assertTrue(len(when._TZINFOS) <= when._TZINFOS_MAX)
+
+    def test_intern_datetime_typeerror(self):
+        """Test TypeError raised by when.intern_datetime()"""
+        self.assertRaises(TypeError, when.intern_datetime, self.today)
+        self.assertRaises(TypeError, when.intern_datetime, None)
+
+    def test_interval(self):
+        """Test when.Interval"""
+        start = datetime.datetime(2012, 3, 11, 1)
+        end = datetime.datetime(2012, 3, 11, 4)
+        interval = when.Interval(start, end, tz='America/New_York')
+
+        self.assertEqual(interval.start, start)
+        self.assertEqual(interval.end, end)
+        self.assertEqual(interval.zone, 'America/New_York')
+        # Daylight saving time started during the interval
+        self.assertEqual(interval.duration, datetime.timedelta(hours=2))
+
+        self.assertTrue(interval.contains(datetime.datetime(2012, 3, 11, 3)))
+        self.assertTrue(interval.contains(start))
+        self.assertFalse(interval.contains(end))
+        self.assertTrue(interval.contains(
+            when.Interval(start, start, tz='America/New_York')))
+
+        # Zones are handled like shift()
+        utc = interval.shift('UTC')
+        self.assertEqual(utc, interval)
+        self.assertEqual(utc.start, when.shift(start, 'America/New_York',
+                                               'UTC'))
+        other = when.Interval(datetime.datetime(2012, 3, 11, 8),
+                              datetime.datetime(2012, 3, 11, 9), tz='UTC')
+        self.assertFalse(interval.overlaps(other))
+        self.assertTrue(interval.overlaps(when.Interval(
+            other.start - self.one_second, other.end, tz='UTC')))
+
+        self.assertEqual(pickle.loads(pickle.dumps(interval)), interval)
+        self.assertEqual(pickle.loads(pickle.dumps(interval)).zone,
+                         'America/New_York')
+
+        # Time zones without a name are pickled as their offset
+        for tz in (datetime.timezone(datetime.timedelta(hours=5, minutes=30)),
+                   pytz.FixedOffset(-330)):
+            fixed = interval.shift(tz)
+            unpickled = pickle.loads(pickle.dumps(fixed))
+            self.assertEqual(unpickled, fixed)
+            self.assertEqual(unpickled.start, fixed.start)
+            self.assertEqual(unpickled.end, fixed.end)
+
+    def test_interval_typeerror(self):
+        """Test TypeError raised by when.Interval"""
+        self.assertRaises(TypeError, when.Interval, self.today, self.now)
+
+    def test_interval_valueerror(self):
+        """Test ValueError raised by when.Interval"""
+        self.assertRaises(ValueError, when.Interval, self.now,
+                          self.now - self.one_second)
+
+    def test_interval_index(self):
+        """Test when.IntervalIndex"""
+        def interval(start, end):
+            return when.Interval(datetime.datetime(2012, 1, 1, start),
+                                 datetime.datetime(2012, 1, 1, end), tz='UTC')
+
+        bookings = [interval(9, 10), interval(9, 12), interval(13, 14),
+                    interval(15, 17)]
+        index = when.IntervalIndex(bookings, items='abcd', tz='UTC')
+        self.assertEqual(len(index), 4)
+
+        self.assertEqual(index.overlapping(interval(10, 13)), ['b'])
+        self.assertEqual(index.overlapping(interval(8, 9)), [])
+        self.assertEqual(index.overlapping(interval(0, 23)), list('abcd'))
+        self.assertEqual(index.containing(datetime.datetime(2012, 1, 1, 9)),
+                         ['a', 'b'])
+        self.assertEqual(index.within(interval(9, 14)), ['a', 'b', 'c'])
+        # Empty intervals on the boundary are within, like contains()
+        empty = when.IntervalIndex([interval(14, 14), interval(9, 9)],
+                                   items='xy', tz='UTC')
+        self.assertTrue(interval(9, 14).contains(interval(14, 14)))
+        self.assertEqual(empty.within(interval(9, 14)), ['y', 'x'])
+        self.assertEqual(empty.within(interval(14, 14)), ['x'])
+        self.assertEqual(index.free(interval(8, 18)),
+                         [interval(8, 9), interval(12, 13), interval(14, 15),
+                          interval(17, 18)])
+        self.assertEqual(index.free(interval(8, 18),
+                                    datetime.timedelta(minutes=90)),
+                         [])
+        self.assertEqual(index.merged(), [interval(9, 12), interval(13, 14),
+                                          interval(15, 17)])
+
+        # Intervals added later are included in the next query
+        index.add(interval(12, 13), 'e')
+        self.assertEqual(index.merged(), [interval(9, 14), interval(15, 17)])
+        self.assertEqual(index.overlapping(interval(11, 13)), ['b', 'e'])
+
+        # Without items, the intervals are returned
+        index = when.IntervalIndex.from_sorted(bookings, tz='UTC')
+        self.assertEqual(index.overlapping(interval(10, 14)),
+                         [bookings[1], bookings[2]])
+
+    def test_interval_index_typeerror(self):
+        """Test TypeError raised by when.IntervalIndex"""
+        self.assertRaises(TypeError, when.IntervalIndex, [self.now])
+        self.assertRaises(TypeError, when.IntervalIndex.from_sorted,
+                          [self.now])
+
+        index = when.IntervalIndex()
+        self.assertRaises(TypeError, index.overlapping, self.now)
+
+    def test_interval_index_valueerror(self):
+        """Test ValueError raised by when.IntervalIndex"""
+        first = when.Interval(self.now, self.now)
+        second = when.Interval(self.now - self.one_second, self.now)
+        self.assertRaises(ValueError, when.IntervalIndex, [first], items=[])
+        self.assertRaises(ValueError, when.IntervalIndex.from_sorted,
+                          [first, second])
+
     def test_is_timezone_aware(self):
         """Test when.is_timezone_aware()"""
         naive = when.now()
@@ -300,6 +1509,99 @@ class WhenTest(unittest.TestCase):
         today = when.today()
         self.assertRaises(TypeError, when.is_timezone_aware, today)
 
+    def test_load_column(self):
+        """Test when.load_column()"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'timestamps')
+
+        column = when.DatetimeColumn([-1, 0, 1331451000000000],
+                                     tz='America/New_York')
+        when.save_column(path, column)
+
+        result = when.load_column(path)
+        self.assertEqual(result, column)
+        self.assertEqual(result.zone, 'America/New_York')
+        self.assertEqual(result[1:].format('%Y-%m-%d %H:%M'),
+                         ['1969-12-31 19:00', '2012-03-11 03:30'])
+
+        # The values are memory-mapped, not read
+        self.assertTrue(isinstance(result.microseconds, memoryview))
+        self.assertTrue(result.microseconds.readonly)
+
+        # Loaded columns can be saved again, even over their own file
+        when.save_column(path, result)
+        self.assertEqual(result, column)
+        self.assertEqual(when.load_column(path), column)
+        when.save_column(path, result[::2])
+        self.assertEqual(when.load_column(path), column[::2])
+        self.assertEqual(os.listdir(directory), ['timestamps'])
+
+        # Time zones without a name are saved as their offset
+        for tz in (datetime.timezone(datetime.timedelta(hours=5, minutes=30)),
+                   pytz.FixedOffset(-330)):
+            fixed = when.DatetimeColumn([0, 1331451000000000], tz=tz)
+            when.save_column(path, fixed)
+            result = when.load_column(path)
+            self.assertEqual(result, fixed)
+            self.assertEqual(result.zone, fixed.zone)
+            self.assertEqual(result.format('%H:%M'), fixed.format('%H:%M'))
+
+        when.save_column(path, column[:0])
+        self.assertEqual(len(when.load_column(path)), 0)
+
+    def test_load_column_valueerror(self):
+        """Test ValueError raised by when.load_column()"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'timestamps')
+
+        with open(path, 'wb') as f:
+            f.write(b'not a timestamp file')
+        self.assertRaises(ValueError, when.load_column, path)
+
+        when.save_column(path, when.DatetimeColumn([1, 2, 3], tz='UTC'))
+        with open(path, 'rb+') as f:
+            f.truncate(os.path.getsize(path) - 4)
+        self.assertRaises(ValueError, when.load_column, path)
+
+    def test_next_occurrences(self):
+        """Test when.next_occurrences()"""
+        daily = when.Recurrence(datetime.datetime(2012, 1, 1, 9), 'daily',
+                                tz='UTC')
+        eastern = when.Recurrence(datetime.datetime(2012, 1, 1, 9), 'daily',
+                                  tz='America/New_York')
+
+        value = pytz.UTC.localize(datetime.datetime(2013, 6, 1, 12))
+        self.assertEqual(when.next_occurrences([daily, eastern], value),
+                         [datetime.datetime(2013, 6, 2, 9),
+                          datetime.datetime(2013, 6, 1, 9)])
+
+    def test_next_transition(self):
+        """Test when.next_transition"""
+        # Transitions at the time given aren't included
+        value = datetime.datetime(2012, 3, 11, 3)
+        transition = when.next_transition('America/New_York', value)
+        self.assertEqual(transition.instant.to_datetime(aware=True),
+                         pytz.utc.localize(datetime.datetime(2012, 11, 4, 6)))
+        self.assertEqual(transition.before, datetime.timedelta(hours=-4))
+        self.assertEqual(transition.after, datetime.timedelta(hours=-5))
+        self.assertFalse(transition.dst)
+        self.assertEqual(transition.name, 'EST')
+        self.assertEqual(transition.zone, 'America/New_York')
+        self.assertEqual(pickle.loads(pickle.dumps(transition)), transition)
+        transition = when.next_transition(pytz.timezone('Europe/London'),
+                                          value)
+        unpickled = pickle.loads(pickle.dumps(transition))
+        self.assertEqual(unpickled, transition)
+        self.assertEqual(unpickled.zone, 'Europe/London')
+
+        self.assertEqual(when.next_transition('UTC', value), None)
+
+    def test_next_transition_typeerror(self):
+        """Test TypeError raised by when.next_transition"""
+        self.assertRaises(TypeError, when.next_transition, 'UTC', self.today)
+
     def test_now(self):
         """Test when.now()"""
         now = when.now()
@@ -313,6 +1615,363 @@ class WhenTest(unittest.TestCase):
         self.assertTrue(now - self.now < self.one_second)
         self.assertTrue(utc - self.utc < self.one_second)
 
+    def test_pack_datetime(self):
+        """Test when.pack_datetime()"""
+        tz = pytz.timezone('America/New_York')
+        # The second 1:30 AM on the day daylight saving time ends
+        value = tz.localize(datetime.datetime(2012, 11, 4, 1, 30),
+                            is_dst=False)
+        packed = when.pack_datetime(value)
+        self.assertEqual(len(packed), 8 + len('America/New_York'))
+
+        unpacked = when.unpack_datetime(packed)
+        self.assertEqual(unpacked, value)
+        self.assertEqual(unpacked.tzname(), 'EST')
+        self.assertEqual(unpacked.tzinfo.zone, 'America/New_York')
+
+        offset = datetime.timedelta(hours=-5, minutes=-30)
+        value = datetime.datetime(2012, 1, 1, 12,
+                                  tzinfo=datetime.timezone(offset))
+        unpacked = when.unpack_datetime(when.pack_datetime(value))
+        self.assertEqual(unpacked, value)
+        self.assertEqual(unpacked.utcoffset(), offset)
+
+        # Time zone naive datetimes stay naive
+        value = datetime.datetime(1900, 1, 1, 1, 1, 1, 5)
+        self.assertEqual(when.unpack_datetime(when.pack_datetime(value)),
+                         value)
+
+    def test_pack_datetime_typeerror(self):
+        """Test TypeError raised by when.pack_datetime()"""
+        self.assertRaises(TypeError, when.pack_datetime, self.today)
+        self.assertRaises(TypeError, when.pack_datetime, None)
+
+    def test_pack_datetime_valueerror(self):
+        """Test ValueError raised by when.pack_datetime()"""
+        offset = datetime.timedelta(hours=1, seconds=30)
+        value = datetime.datetime(2012, 1, 1,
+                                  tzinfo=datetime.timezone(offset))
+        self.assertRaises(ValueError, when.pack_datetime, value)
+
+    @unittest.skipIf(zoneinfo is None, 'zoneinfo is not available')
+    def test_pack_datetime_zoneinfo(self):
+        """Test when.pack_datetime() with zoneinfo time zones"""
+        tz = zoneinfo.ZoneInfo('Europe/Paris')
+        value = datetime.datetime(2012, 7, 1, 12, tzinfo=tz)
+        packed = when.pack_datetime(value)
+        self.assertEqual(len(packed), 8 + len('Europe/Paris'))
+
+        unpacked = when.unpack_datetime(packed)
+        self.assertEqual(unpacked, value)
+        self.assertEqual(unpacked.tzname(), 'CEST')
+        self.assertEqual(unpacked.tzinfo.zone, 'Europe/Paris')
+
+    def test_parse_duration(self):
+        """Test when.parse_duration()"""
+        self.assertEqual(when.parse_duration('1y2mo3w4d5h'),
+                         {'years': 1, 'months': 2, 'weeks': 3, 'days': 4,
+                          'hours': 5})
+        self.assertEqual(when.parse_duration('2h 30m'),
+                         {'hours': 2, 'minutes': 30})
+        self.assertEqual(when.parse_duration('1s500ms250us'),
+                         {'seconds': 1, 'milliseconds': 500,
+                          'microseconds': 250})
+        self.assertEqual(when.parse_duration('90 minutes, 1 hour 1h'),
+                         {'minutes': 90, 'hours': 2})
+
+        # The cached result can't be changed by the caller
+        when.parse_duration('1d')['days'] = 2
+        self.assertEqual(when.parse_duration('1d'), {'days': 1})
+
+        # future() and past() accept the string in place of years
+        value = when.future('2h30m', minutes=5, utc=True)
+        expected = self.utc + datetime.timedelta(hours=2, minutes=35)
+        self.assertTrue(value - expected < self.one_second)
+        value = when.past('1d500ms', utc=True)
+        expected = self.utc - datetime.timedelta(days=1, milliseconds=500)
+        self.assertTrue(value - expected < self.one_second)
+
+        # Durations of only milliseconds or microseconds aren't dropped
+        for duration, delta in (
+                ('750ms', datetime.timedelta(milliseconds=750)),
+                ('900ms', datetime.timedelta(milliseconds=900)),
+                ('250us', datetime.timedelta(microseconds=250))):
+            before = datetime.datetime.utcnow()
+            future = when.future(duration, utc=True)
+            past = when.past(duration, utc=True)
+            after = datetime.datetime.utcnow()
+            self.assertTrue(before + delta <= future <= after + delta)
+            self.assertTrue(before - delta <= past <= after - delta)
+
+    def test_parse_duration_typeerror(self):
+        """Test TypeError raised by when.parse_duration()"""
+        self.assertRaises(TypeError, when.parse_duration, 5)
+        self.assertRaises(TypeError, when.parse_duration, None)
+
+    def test_parse_duration_valueerror(self):
+        """Test ValueError raised by when.parse_duration()"""
+        self.assertRaises(ValueError, when.parse_duration, '')
+        self.assertRaises(ValueError, when.parse_duration, '5')
+        self.assertRaises(ValueError, when.parse_duration, '5x')
+        self.assertRaises(ValueError, when.parse_duration, '1h 2')
+        self.assertRaises(ValueError, when.parse_duration, '-1h')
+        self.assertRaises(ValueError, when.future, '1 fortnight')
+
+    def test_partition(self):
+        """Test when.partition()"""
+        start = datetime.datetime(2012, 3, 9, 12)
+        end = datetime.datetime(2012, 3, 13)
+        parts = list(when.partition(start, end, 'day', 'America/New_York'))
+        self.assertEqual([part.start for part in parts],
+                         [start] + [datetime.datetime(2012, 3, i)
+                                    for i in (10, 11, 12)])
+        self.assertEqual(parts[-1].end, end)
+        # The day daylight saving time starts is 23 hours long
+        self.assertEqual(parts[2].duration, datetime.timedelta(hours=23))
+        self.assertEqual(parts[2].shift(utc=True).start,
+                         datetime.datetime(2012, 3, 11, 5))
+
+        # With max_parts, whole days are balanced between the parts
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2013, 1, 1)
+        parts = list(when.partition(start, end, 'day', 'America/New_York',
+                                    max_parts=5))
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(parts[0].start, start)
+        self.assertEqual(parts[-1].end, end)
+        for first, second in zip(parts, parts[1:]):
+            self.assertEqual(first.end, second.start)
+            self.assertEqual(second.start.time(), datetime.time())
+        for part in parts:
+            self.assertTrue(abs(part.duration.days - 73) <= 1)
+
+        # Never more parts than units
+        parts = list(when.partition(start, end, 'month', utc=True,
+                                    max_parts=20))
+        self.assertEqual(len(parts), 12)
+
+        # The number of parts can be any integer, like NumPy's
+        parts = list(when.partition(start, end, 'month', utc=True,
+                                    max_parts=Integer(4)))
+        self.assertEqual(len(parts), 4)
+
+        self.assertEqual(list(when.partition(start, start, 'day')), [])
+
+    def test_partition_typeerror(self):
+        """Test TypeError raised by when.partition()"""
+        start = datetime.datetime(2012, 1, 1)
+        self.assertRaises(TypeError, when.partition, '2012', start, 'day')
+        self.assertRaises(TypeError, when.partition, start, start, 'day',
+                          max_parts=2.5)
+
+    def test_partition_valueerror(self):
+        """Test ValueError raised by when.partition()"""
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 2, 1)
+        self.assertRaises(ValueError, when.partition, end, start, 'day')
+        self.assertRaises(ValueError, when.partition, start, end, 'decade')
+        self.assertRaises(ValueError, when.partition, start, end, 'day',
+                          max_parts=0)
+
+    def test_range(self):
+        """Test when.range()"""
+        start = datetime.datetime(2011, 1, 31)
+        stop = datetime.datetime(2012, 1, 1)
+
+        result = when.range(start, stop, months=1)
+        expected = [when._add_time(start, months=i) for i in range(12)]
+        self.assertEqual(list(result), expected)
+        self.assertEqual(len(result), 12)
+        self.assertEqual(result[1], datetime.datetime(2011, 3, 3))
+        self.assertEqual(result[-1], datetime.datetime(2011, 12, 31))
+        self.assertEqual(list(reversed(result)), expected[::-1])
+        self.assertEqual(list(result[2:8:3]), expected[2:8:3])
+        self.assertEqual(len(result[::5]), 3)
+
+        # The default step is one day and stop is never included
+        result = when.range(self.today, self.today + 3 * self.one_day)
+        self.assertEqual(list(result), [self.today,
+                                        self.today + self.one_day,
+                                        self.today + 2 * self.one_day])
+
+        # Descending ranges
+        result = when.range(stop, start, months=-1, days=-1)
+        self.assertEqual(result[0], stop)
+        self.assertEqual(result[1], datetime.datetime(2011, 12, 1))
+        self.assertTrue(all(value > start for value in result))
+
+        # Empty ranges
+        self.assertEqual(len(when.range(stop, start)), 0)
+        self.assertEqual(list(when.range(start, start, hours=1)), [])
+
+        # Large ranges don't need to be produced to be measured
+        result = when.range(datetime.datetime(1, 1, 1),
+                            datetime.datetime(9999, 1, 1), seconds=1)
+        self.assertEqual(len(result), 315506361600)
+        self.assertEqual(result[-1],
+                         datetime.datetime(9998, 12, 31, 23, 59, 59))
+
+    def test_range_typeerror(self):
+        """Test TypeError raised by when.range()"""
+        self.assertRaises(TypeError, when.range, 'a', self.now)
+        self.assertRaises(TypeError, when.range, self.now, 'b')
+
+        # Dates, datetimes and times can't be mixed
+        self.assertRaises(TypeError, when.range, self.today, self.now)
+        self.assertRaises(TypeError, when.range, self.now, self.today)
+        self.assertRaises(TypeError, when.range, self.now.time(),
+                          self.now.time())
+        self.assertRaises(TypeError, when.range, self.today,
+                          self.now.time())
+        self.assertRaises(TypeError, when.range, self.now,
+                          pytz.utc.localize(self.now))
+
+    def test_range_valueerror(self):
+        """Test ValueError raised by when.range()"""
+        self.assertRaises(ValueError, when.range, self.now, self.now,
+                          months=1, days=-1)
+        self.assertRaises(ValueError, when.range, self.today,
+                          self.today + self.one_day, hours=1)
+        self.assertRaises(ValueError, when.range, self.today,
+                          self.today + self.one_day, days=1, seconds=1)
+
+    def test_recurrence(self):
+        """Test when.Recurrence"""
+        # The third Tuesday of every month
+        rule = when.Recurrence(datetime.datetime(2012, 1, 1, 9), 'monthly',
+                               weekday=1, nth=3, tz='America/New_York')
+        self.assertEqual(rule.next_after(datetime.datetime(2012, 1, 1)),
+                         datetime.datetime(2012, 1, 17, 9))
+        self.assertEqual(rule.next_after(datetime.datetime(2012, 1, 17, 9)),
+                         datetime.datetime(2012, 2, 21, 9))
+        self.assertEqual(rule.next_after(datetime.datetime(2099, 12, 31)),
+                         datetime.datetime(2100, 1, 19, 9))
+
+        # Aware values are shifted to the rule's time zone
+        value = pytz.UTC.localize(datetime.datetime(2012, 1, 17, 14, 30))
+        self.assertEqual(rule.next_after(value),
+                         datetime.datetime(2012, 2, 21, 9))
+
+        result = list(rule.between(datetime.datetime(2012, 1, 17, 9),
+                                   datetime.datetime(2012, 4, 17, 9)))
+        self.assertEqual(result, [datetime.datetime(2012, 1, 17, 9),
+                                  datetime.datetime(2012, 2, 21, 9),
+                                  datetime.datetime(2012, 3, 20, 9)])
+
+        # The last Friday of the month, skipping months without a fifth
+        rule = when.Recurrence(datetime.datetime(2012, 1, 1), 'monthly',
+                               weekday=4, nth=-1, tz='UTC')
+        self.assertEqual(rule.next_after(datetime.datetime(2012, 2, 1)),
+                         datetime.datetime(2012, 2, 24))
+        rule = when.Recurrence(datetime.datetime(2012, 1, 1), 'monthly',
+                               weekday=4, nth=5, tz='UTC')
+        self.assertEqual(rule.next_after(datetime.datetime(2012, 2, 1)),
+                         datetime.datetime(2012, 3, 30))
+
+        # Monthly rules follow the same rules as _add_time()
+        start = datetime.datetime(2011, 1, 31)
+        rule = when.Recurrence(start, 'monthly', tz='UTC')
+        for months in range(1, 13):
+            expected = when._add_time(start, months=months)
+            self.assertEqual(rule.next_after(expected - self.one_second),
+                             expected)
+
+        # Every other week on Wednesday
+        rule = when.Recurrence(datetime.datetime(2012, 1, 1, 12), 'weekly',
+                               interval=2, weekday=2, tz='UTC')
+        result = list(rule.between(datetime.datetime(2012, 1, 1),
+                                   datetime.datetime(2012, 2, 1)))
+        self.assertEqual(result, [datetime.datetime(2012, 1, 4, 12),
+                                  datetime.datetime(2012, 1, 18, 12)])
+
+        # Wall times skipped by daylight saving time are moved forward
+        rule = when.Recurrence(datetime.datetime(2012, 3, 1, 2, 30), 'daily',
+                               tz='America/New_York')
+        self.assertEqual(rule.next_after(datetime.datetime(2012, 3, 11)),
+                         datetime.datetime(2012, 3, 11, 3, 30))
+
+    def test_recurrence_typeerror(self):
+        """Test TypeError raised by when.Recurrence"""
+        self.assertRaises(TypeError, when.Recurrence, self.today, 'daily')
+
+        rule = when.Recurrence(self.now, 'daily')
+        self.assertRaises(TypeError, rule.next_after, self.today)
+
+    def test_recurrence_valueerror(self):
+        """Test ValueError raised by when.Recurrence"""
+        self.assertRaises(ValueError, when.Recurrence, self.now, 'hourly')
+        self.assertRaises(ValueError, when.Recurrence, self.now, 'daily',
+                          interval=0)
+        self.assertRaises(ValueError, when.Recurrence, self.now, 'weekly',
+                          weekday=7)
+        self.assertRaises(ValueError, when.Recurrence, self.now, 'weekly',
+                          weekday=1, nth=1)
+        self.assertRaises(ValueError, when.Recurrence, self.now, 'monthly',
+                          weekday=1)
+        self.assertRaises(ValueError, when.Recurrence, self.now, 'monthly',
+                          weekday=1, nth=6)
+
+    def test_resolve_timezone(self):
+        """Test when.resolve_timezone"""
+        new_york = pytz.timezone('America/New_York')
+        for name in ('America/New_York', 'america/new_york',
+                     'America/New York', ' AMERICA/NEW-YORK ', 'new_york',
+                     'New York'):
+            self.assertEqual(when.resolve_timezone(name), new_york)
+
+        # Common time zones are preferred for the last part of a name
+        self.assertEqual(when.resolve_timezone('buenos_aires'),
+                         pytz.timezone('America/Argentina/Buenos_Aires'))
+        self.assertEqual(when.resolve_timezone('utc'), pytz.utc)
+        self.assertEqual(when.resolve_timezone('+05:30'),
+                         pytz.FixedOffset(330))
+        self.assertEqual(when.resolve_timezone('-08:00'),
+                         pytz.FixedOffset(-480))
+
+        # Names are resolved wherever time zones are accepted
+        value = datetime.datetime(2012, 1, 1, 12)
+        self.assertEqual(when.shift(value, 'UTC', 'new york'),
+                         datetime.datetime(2012, 1, 1, 7))
+        self.assertEqual(when.timezone_object('london'),
+                         pytz.timezone('Europe/London'))
+
+    def test_resolve_timezone_typeerror(self):
+        """Test TypeError raised by when.resolve_timezone"""
+        self.assertRaises(TypeError, when.resolve_timezone, 5)
+
+    def test_resolve_timezone_unknowntimezoneerror(self):
+        """Test UnknownTimeZoneError raised by when.resolve_timezone"""
+        for name in ('America/Nowhere', 'eastern', 'new_yor', '+5x', '+25:00'):
+            self.assertRaises(pytz.UnknownTimeZoneError,
+                              when.resolve_timezone, name)
+
+    @unittest.skipIf(os.name != 'posix', 'file modes are POSIX')
+    def test_save_column(self):
+        """Test when.save_column()"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'timestamps')
+        column = when.DatetimeColumn([0, 1331451000000000], tz='UTC')
+
+        # New files get the permissions allowed by the umask
+        umask = os.umask(0o027)
+        try:
+            when.save_column(path, column)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+        # Saving over a file keeps its permissions
+        os.chmod(path, 0o604)
+        when.save_column(path, column[:1])
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o604)
+        self.assertEqual(when.load_column(path), column[:1])
+        self.assertEqual(os.listdir(directory), ['timestamps'])
+
+    def test_save_column_typeerror(self):
+        """Test TypeError raised by when.save_column()"""
+        self.assertRaises(TypeError, when.save_column, os.devnull, [self.now])
+
     def test_set_utc(self):
         """Test when.set_utc()"""
         when.set_utc()
@@ -384,6 +2043,208 @@ class WhenTest(unittest.TestCase):
 
         self.assertEqual(first, second)
 
+    def test_timing_wheel(self):
+        """Test when.TimingWheel"""
+        wheel = when.TimingWheel(resolution=datetime.timedelta(seconds=1),
+                                 slots=4, levels=2, utc=True)
+        start = when.now(utc=True).replace(microsecond=0)
+
+        # Deadlines go both inside and beyond what the wheels can hold.
+        timers = {}
+        for i in range(200):
+            seconds = random.randint(0, 60)
+            deadline = start + datetime.timedelta(seconds=seconds)
+            timers[i] = (deadline, wheel.add(deadline, i))
+        self.assertEqual(len(wheel), 200)
+
+        for i in range(0, 200, 3):
+            self.assertTrue(wheel.cancel(timers[i][1]))
+            self.assertFalse(wheel.cancel(timers[i][1]))
+            del timers[i]
+        self.assertEqual(len(wheel), len(timers))
+
+        value = start
+        while timers:
+            value += datetime.timedelta(seconds=random.randint(1, 7))
+            expired = wheel.advance(value)
+            expected = [i for i, (deadline, _) in timers.items()
+                        if deadline <= value]
+            self.assertEqual(sorted(expired), sorted(expected))
+            for i in expired:
+                # Deadlines never expire early
+                self.assertTrue(timers[i][0] <= value)
+                del timers[i]
+        self.assertEqual(len(wheel), 0)
+
+        # Deadlines that have already passed expire on the next advance
+        wheel.add(start, 'late')
+        self.assertEqual(wheel.advance(start), ['late'])
+
+    @unittest.skipIf(asyncio is None, 'asyncio is not available')
+    def test_timing_wheel_drivers(self):
+        """Test driving when.TimingWheel from a thread and an event loop"""
+        resolution = datetime.timedelta(milliseconds=10)
+        delay = datetime.timedelta(milliseconds=50)
+        wheel = when.TimingWheel(resolution=resolution)
+
+        done = threading.Event()
+        expired = []
+
+        def dispatch(items):
+            expired.append((items, when.now()))
+            done.set()
+
+        # The driver waits while the wheel is empty and is woken up by
+        # new deadlines.
+        wheel.start_thread(dispatch)
+        deadline = when.now() + delay
+        wheel.add(deadline, 'thread')
+        self.assertTrue(done.wait(5))
+        wheel.stop()
+        self.assertEqual(expired[0][0], ['thread'])
+        self.assertTrue(expired[0][1] >= deadline)
+
+        loop = asyncio.new_event_loop()
+        added = []
+
+        def add():
+            added.append(when.now() + delay)
+            wheel.add(added[0], 'loop')
+
+        def stop(items):
+            expired.append((items, when.now()))
+            loop.stop()
+
+        try:
+            wheel.start_loop(stop, loop=loop)
+            loop.call_later(0.02, add)
+            loop.call_later(5, loop.stop)
+            loop.run_forever()
+            wheel.stop()
+        finally:
+            loop.close()
+        self.assertEqual(expired[1][0], ['loop'])
+        self.assertTrue(expired[1][1] >= added[0])
+        self.assertEqual(len(wheel), 0)
+
+    def test_timing_wheel_typeerror(self):
+        """Test TypeError raised by when.TimingWheel"""
+        wheel = when.TimingWheel()
+        self.assertRaises(TypeError, wheel.add, self.today, 'a')
+
+    def test_timing_wheel_valueerror(self):
+        """Test ValueError raised by when.TimingWheel"""
+        self.assertRaises(ValueError, when.TimingWheel,
+                          resolution=datetime.timedelta(0))
+        self.assertRaises(ValueError, when.TimingWheel, slots=1)
+
+    @unittest.skipIf(asyncio is None, 'asyncio is not available')
+    def test_sleep_until(self):
+        """Test when.sleep_until()"""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        value = when.now() + datetime.timedelta(milliseconds=20)
+        future = when.sleep_until(value, 'done', loop=loop)
+        self.assertEqual(loop.run_until_complete(future), 'done')
+        tolerance = datetime.timedelta(milliseconds=1)
+        self.assertTrue(when.now() >= value - tolerance)
+
+        # Cancelling the wait cancels the deadline
+        future = when.sleep_until(when.future(seconds=10), loop=loop)
+        future.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(len(when._loop_deadlines(loop, False)), 0)
+
+    def test_time_index(self):
+        """Test when.TimeIndex"""
+        values = [datetime.datetime(2012, 1, 1, hour) for hour in (5, 1, 3)]
+        index = when.TimeIndex(values, items='cab', tz='UTC')
+        self.assertEqual(len(index), 3)
+        self.assertEqual(list(index), ['a', 'b', 'c'])
+
+        start = datetime.datetime(2012, 1, 1, 1)
+        end = datetime.datetime(2012, 1, 1, 5)
+        self.assertEqual(index.between(start, end), ['a', 'b'])
+        self.assertEqual(index.between(end, start), [])
+        self.assertEqual(index.before(start), None)
+        self.assertEqual(index.before(end), 'b')
+        self.assertEqual(index.after(start), 'b')
+        self.assertEqual(index.after(end), None)
+        self.assertEqual(index.nearest(datetime.datetime(2012, 1, 1, 2)), 'a')
+        self.assertEqual(index.nearest(datetime.datetime(2012, 1, 2)), 'c')
+
+        # Aware values are compared by the instant they represent
+        eastern = pytz.timezone('America/New_York')
+        self.assertEqual(index.after(eastern.localize(
+            datetime.datetime(2011, 12, 31, 21))), 'b')
+
+        # Added values are merged on the next query
+        index.add(datetime.datetime(2012, 1, 1, 2), 'x')
+        index.add(datetime.datetime(2012, 1, 1), 'y')
+        self.assertEqual(index.between(datetime.datetime(2012, 1, 1), end),
+                         ['y', 'a', 'x', 'b'])
+
+        # Without items, the values are returned as instants
+        column = when.DatetimeColumn.from_datetimes(values,
+                                                    tz='America/New_York')
+        index = when.TimeIndex(column)
+        self.assertEqual(index.zone, 'America/New_York')
+        self.assertEqual(index.nearest(values[2]).to_datetime(), values[2])
+        index.add(datetime.datetime(2012, 1, 1, 4))
+        self.assertEqual([instant.to_datetime().hour for instant in index],
+                         [1, 3, 4, 5])
+        index.add(datetime.datetime(2012, 1, 1, 2), 'item')
+        self.assertEqual(index.between(datetime.datetime(2012, 1, 1, 2),
+                                       datetime.datetime(2012, 1, 1, 4))[0],
+                         'item')
+
+        # Queries between additions see every value, before and after
+        # the recent values are merged into the index
+        keys = list(range(0, 20000, 4))
+        index = when.TimeIndex(when.DatetimeColumn(keys, tz='UTC'))
+        for key in range(1, 400, 2):
+            index.add(when.Instant(key, 'UTC'), key)
+            self.assertEqual(index.after(when.Instant(key - 1, 'UTC')), key)
+            self.assertEqual(index.before(when.Instant(key + 1, 'UTC')), key)
+        result = index.between(when.Instant(0, 'UTC'), when.Instant(8, 'UTC'))
+        self.assertEqual([getattr(item, 'microseconds', item)
+                          for item in result], [0, 1, 3, 4, 5, 7])
+        self.assertEqual(len(index), 5200)
+
+        empty = when.TimeIndex(tz='UTC')
+        self.assertEqual(empty.nearest(self.now), None)
+        self.assertEqual(empty.between(self.now, self.now), [])
+
+    def test_time_index_typeerror(self):
+        """Test TypeError raised by when.TimeIndex"""
+        self.assertRaises(TypeError, when.TimeIndex, [self.today])
+
+        index = when.TimeIndex([self.now])
+        self.assertRaises(TypeError, index.before, self.today)
+
+    def test_time_index_valueerror(self):
+        """Test ValueError raised by when.TimeIndex"""
+        self.assertRaises(ValueError, when.TimeIndex, [self.now], items=[])
+
+    def test_suggest_timezones(self):
+        """Test when.suggest_timezones"""
+        self.assertEqual(when.suggest_timezones('america/new_y'),
+                         ['America/New_York'])
+        self.assertEqual(when.suggest_timezones('York'), ['America/New_York'])
+        self.assertEqual(when.suggest_timezones('lon', limit=2),
+                         ['Europe/London', 'Arctic/Longyearbyen'])
+        self.assertEqual(when.suggest_timezones('xyz'), [])
+        self.assertEqual(len(when.suggest_timezones('a', limit=3)), 3)
+
+        # Whole names are ranked above parts of names
+        for name in when.suggest_timezones('us'):
+            self.assertTrue(name.startswith('US/'))
+
+    def test_suggest_timezones_typeerror(self):
+        """Test TypeError raised by when.suggest_timezones"""
+        self.assertRaises(TypeError, when.suggest_timezones, None)
+
     def test_timezone(self):
         """Test when.timezone()"""
         self.assertEqual(when.timezone(), self.timezone)
@@ -393,6 +2254,53 @@ class WhenTest(unittest.TestCase):
         local_timezone = pytz.timezone(self.timezone)
         self.assertEqual(when.timezone_object(), local_timezone)
 
+    def test_to_epoch(self):
+        """Test when.to_epoch"""
+        value = datetime.datetime(2013, 1, 1, 0, 0, 0, 123456)
+        self.assertEqual(when.to_epoch(value, utc=True), 1356998400)
+        self.assertEqual(when.to_epoch(value, unit='ms', utc=True),
+                         1356998400123)
+        self.assertEqual(when.to_epoch(value, unit='us', utc=True),
+                         1356998400123456)
+        self.assertEqual(when.to_epoch(value, 'America/New_York'),
+                         1357016400)
+        self.assertEqual(
+            when.to_epoch(datetime.datetime(1969, 12, 31, 23, 59, 59, 500000),
+                          utc=True), -1)
+
+        # Aware datetimes and instants don't need a time zone
+        aware = pytz.utc.localize(value)
+        self.assertEqual(when.to_epoch(aware), 1356998400)
+        self.assertEqual(when.to_epoch(when.Instant.from_datetime(aware)),
+                         1356998400)
+
+        # The system time zone is used by default
+        self.assertEqual(when.to_epoch(value),
+                         when.to_epoch(when.shift(value, to_tz='UTC'),
+                                       utc=True))
+
+    def test_to_epoch_typeerror(self):
+        """Test TypeError raised by when.to_epoch"""
+        self.assertRaises(TypeError, when.to_epoch, self.today)
+
+    def test_to_epoch_valueerror(self):
+        """Test ValueError raised by when.to_epoch"""
+        self.assertRaises(ValueError, when.to_epoch, self.now, unit='ns')
+
+    def test_to_epoch_many(self):
+        """Test when.to_epoch_many"""
+        values = [datetime.datetime(1970, 1, 1, 0, 0, 1, 500),
+                  datetime.datetime(2013, 1, 1)]
+        result = when.to_epoch_many(values, utc=True)
+        self.assertTrue(isinstance(result, array.array))
+        self.assertEqual(list(result), [1, 1356998400])
+        self.assertEqual(list(when.to_epoch_many(values, unit='us', utc=True)),
+                         [1000500, 1356998400000000])
+
+        column = when.DatetimeColumn.from_datetimes(values, tz='Asia/Tokyo')
+        self.assertEqual(list(when.to_epoch_many(column, unit='ms')),
+                         [-32399000, 1356966000000])
+
     def test_today(self):
         """Test when.today()"""
         self.assertEqual(when.today(), self.today)
@@ -401,14 +2309,136 @@ class WhenTest(unittest.TestCase):
         """Test when.tomorrow()"""
         self.assertEqual(when.tomorrow(), self.today + self.one_day)
 
+    def test_transitions(self):
+        """Test when.transitions"""
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2013, 1, 1)
+        spring, fall = when.transitions('America/New_York', start, end)
+        self.assertEqual(spring.instant.to_datetime(aware=True),
+                         pytz.utc.localize(datetime.datetime(2012, 3, 11, 7)))
+        self.assertEqual(spring.before, datetime.timedelta(hours=-5))
+        self.assertEqual(spring.after, datetime.timedelta(hours=-4))
+        self.assertTrue(spring.dst)
+        self.assertEqual(spring.name, 'EDT')
+        self.assertEqual(fall.name, 'EST')
+        self.assertEqual(
+            when.next_transition('America/New_York', spring.instant), fall)
+
+        # Transitions at the start are included, those at the end aren't
+        self.assertEqual(when.transitions('America/New_York', spring.instant,
+                                          fall.instant), [spring])
+        self.assertEqual(when.transitions('America/New_York', start, start),
+                         [])
+        self.assertEqual(when.transitions(pytz.utc, start, end), [])
+
+    def test_transitions_typeerror(self):
+        """Test TypeError raised by when.transitions"""
+        self.assertRaises(TypeError, when.transitions, 'UTC', self.today,
+                          self.now)
+
+    def test_transitions_valueerror(self):
+        """Test ValueError raised by when.transitions"""
+        self.assertRaises(ValueError, when.transitions, 'UTC', self.now,
+                          self.now - datetime.timedelta(days=1))
+
+    def test_transitions_many(self):
+        """Test when.transitions_many"""
+        # Naive datetimes are wall times in each time zone
+        start = datetime.datetime(2012, 3, 25)
+        end = datetime.datetime(2012, 3, 25, 1, 30)
+        zones = ['UTC', 'Europe/London', 'Europe/Berlin']
+        result = when.transitions_many(zones, start, end)
+        self.assertEqual(sorted(result), sorted(zones))
+        self.assertEqual(result['UTC'], [])
+        self.assertEqual(len(result['Europe/London']), 1)
+        self.assertEqual(result['Europe/Berlin'], [])
+        self.assertEqual(result['Europe/London'][0].name, 'BST')
+
+    def test_unpack_datetime_typeerror(self):
+        """Test TypeError raised by when.unpack_datetime()"""
+        self.assertRaises(TypeError, when.unpack_datetime, 'UTC')
+        self.assertRaises(TypeError, when.unpack_datetime, None)
+
+    def test_unpack_datetime_valueerror(self):
+        """Test ValueError raised by when.unpack_datetime()"""
+        self.assertRaises(ValueError, when.unpack_datetime, b'')
+        self.assertRaises(ValueError, when.unpack_datetime, b'\0' * 7)
+
     def test_unset_utc(self):
         """Test when.unset_utc()"""
         when.unset_utc()
         self.assertEqual(when._FORCE_UTC, False)
 
+    def test_world_clock(self):
+        """Test when.world_clock"""
+        at = pytz.utc.localize(datetime.datetime(2012, 7, 1, 12))
+        clock = when.world_clock(at)
+        self.assertEqual(sorted(clock), sorted(when.common_timezones()))
+        self.assertEqual(clock['UTC'], datetime.datetime(2012, 7, 1, 12))
+        self.assertEqual(clock['America/New_York'],
+                         datetime.datetime(2012, 7, 1, 8))
+        self.assertEqual(clock['Asia/Kolkata'],
+                         datetime.datetime(2012, 7, 1, 17, 30))
+
+        # Moving back in time rebuilds the index
+        clock = when.world_clock(at.replace(month=1))
+        self.assertEqual(clock['America/New_York'],
+                         datetime.datetime(2012, 1, 1, 7))
+
+    def test_world_clock_typeerror(self):
+        """Test TypeError raised by when.world_clock"""
+        self.assertRaises(TypeError, when.world_clock, self.today)
+
     def test_yesterday(self):
         """Test when.yesterday()"""
         self.assertEqual(when.yesterday(), self.today - self.one_day)
 
+    def test_zones_at_offset(self):
+        """Test when.zones_at_offset"""
+        winter = pytz.utc.localize(datetime.datetime(2012, 1, 1))
+        summer = pytz.utc.localize(datetime.datetime(2012, 7, 1))
+
+        self.assertEqual(when.zones_at_offset('+05:30', winter),
+                         ['Asia/Colombo', 'Asia/Kolkata'])
+        self.assertEqual(when.zones_at_offset('+0530', summer),
+                         ['Asia/Colombo', 'Asia/Kolkata'])
+
+        # The index is updated as time zones transition
+        offset = datetime.timedelta(hours=-4)
+        self.assertFalse('America/New_York' in
+                         when.zones_at_offset(offset, winter))
+        self.assertTrue('America/New_York' in
+                        when.zones_at_offset(offset, summer))
+        self.assertTrue('America/New_York' in
+                        when.zones_at_offset('-05', winter))
+
+    def test_zones_at_offset_typeerror(self):
+        """Test TypeError raised by when.zones_at_offset"""
+        self.assertRaises(TypeError, when.zones_at_offset, 330)
+        self.assertRaises(TypeError, when.zones_at_offset, '+05:30',
+                          self.today)
+
+    def test_zones_at_offset_valueerror(self):
+        """Test ValueError raised by when.zones_at_offset"""
+        for offset in ('05:30', '+5:30', '+05:3', 'UTC'):
+            self.assertRaises(ValueError, when.zones_at_offset, offset)
+
+    def test_zones_with_abbreviation(self):
+        """Test when.zones_with_abbreviation"""
+        winter = pytz.utc.localize(datetime.datetime(2012, 1, 1))
+        summer = pytz.utc.localize(datetime.datetime(2012, 7, 1))
+
+        self.assertTrue('America/New_York' in
+                        when.zones_with_abbreviation('EST', winter))
+        self.assertFalse('America/New_York' in
+                         when.zones_with_abbreviation('EST', summer))
+        self.assertTrue('America/New_York' in
+                        when.zones_with_abbreviation('EDT', summer))
+        self.assertEqual(when.zones_with_abbreviation('XYZ', summer), [])
+
+    def test_zones_with_abbreviation_typeerror(self):
+        """Test TypeError raised by when.zones_with_abbreviation"""
+        self.assertRaises(TypeError, when.zones_with_abbreviation, None)
+
 if __name__ == '__main__':
     unittest.main()
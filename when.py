@@ -8,19 +8,219 @@ __version__ = '0.4.0'
 # and it should be the only thing causing pylint to include the warning.
 # pylint: disable-msg=C0103
 
+import array
+import bisect
 import calendar
 import datetime
+import heapq
+import itertools
+import json
 import locale
+import mmap
+import numbers
 import os
 import random
+import re
+import struct
+import subprocess
+import sys
+import threading
+import time
+import weakref
 
 import pytz
 
+try:
+    import asyncio
+except ImportError:  # Python < 3.4
+    asyncio = None
+
+# ``range()`` is defined below and shadows the builtin within this module.
+_range = range
+
 # Some functions may take a parameter to designate a return value in UTC
 # instead of local time.  This will be used to force them to return UTC
 # regardless of the paramter's value.
 _FORCE_UTC = False
 
+# The Unix epoch, used to convert datetimes to and from integers.
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# The microseconds since the epoch of the first and last datetimes.
+_EPOCH_MIN = -62135596800000000
+_EPOCH_MAX = 253402300799999999
+
+# Time zones are interned so that compact values like `Instant` only
+# need to store a small integer to refer to them.
+_ZONE_IDS = {}
+_ZONES = []
+_ZONES_LOCK = threading.Lock()
+
+# The UTC offsets of the interned time zones, built as they are needed.
+_ZONE_TABLES = {}
+
+# The common time zones grouped by the offset and abbreviation they
+# currently use, built the first time they are needed.
+_ZONE_INDEX = None
+_ZONE_INDEX_LOCK = threading.Lock()
+
+# The names of all time zones indexed for lookups and suggestions,
+# built the first time a name isn't found by pytz.
+_ZONE_NAMES = None
+_ZONE_NAMES_LOCK = threading.Lock()
+
+# The time zones found by resolve_timezone(), keyed by the name they
+# were looked up with. They are forgotten once there are too many.
+_RESOLVED_ZONES = {}
+_RESOLVED_ZONES_MAX = 1024
+
+# The business calendar used by future() and past() when none is given,
+# with Saturday and Sunday as the weekend and no holidays.
+_BUSINESS_WEEK = None
+
+# Compiled format strings, keyed by the format string and locale.
+_FORMAT_CACHE = {}
+
+# The names and formats of locales used by format(), loaded once each.
+_LOCALE_NAMES = {}
+_LOCALE_LOCK = threading.Lock()
+
+# The script that reads the names and formats of a locale. It's run by
+# another Python process, so that the locale of this one never changes.
+_LOCALE_SCRIPT = """
+import calendar, datetime, json, locale, sys
+locale.setlocale(locale.LC_TIME, sys.argv[1])
+json.dump([list(calendar.day_abbr), list(calendar.day_name),
+           list(calendar.month_abbr)[1:], list(calendar.month_name)[1:],
+           [datetime.time(0).strftime('%p'),
+            datetime.time(12).strftime('%p')]]
+          + [locale.nl_langinfo(getattr(locale, name))
+             for name in ('D_T_FMT', 'D_FMT', 'T_FMT', 'T_FMT_AMPM')],
+          sys.stdout)
+"""
+
+# The number of microseconds in each unit of to_epoch() and
+# from_epoch().
+_EPOCH_UNITS = {
+    's': 1000000,
+    'ms': 1000,
+    'us': 1,
+}
+
+# The units of time between() can count. Years and months are counted
+# in months, the rest in microseconds.
+_CALENDAR_UNITS = {
+    'years': 12,
+    'months': 1,
+}
+_FIXED_UNITS = {
+    'weeks': 604800000000,
+    'days': 86400000000,
+    'hours': 3600000000,
+    'minutes': 60000000,
+    'seconds': 1000000,
+    'milliseconds': 1000,
+    'microseconds': 1,
+}
+
+# The units humanize() uses for times less than a month apart and the
+# number of microseconds in each, smallest first. The strings it
+# returns are interned in _HUMANIZED.
+_HUMANIZE_UNITS = (
+    ('second', 1000000),
+    ('minute', 60000000),
+    ('hour', 3600000000),
+    ('day', 86400000000),
+    ('week', 604800000000),
+)
+_HUMANIZE_GRANULARITIES = ('second', 'minute', 'hour', 'day', 'week',
+                           'month', 'year')
+_HUMANIZE_THRESHOLDS = [length for _, length in _HUMANIZE_UNITS]
+_HUMANIZED = {}
+
+# The units parse_duration() accepts and the keyword argument of
+# future() and past() each one is added to. Parsed durations are kept
+# in _DURATIONS, which is cleared when it reaches _DURATIONS_MAX.
+_DURATION_UNITS = {
+    'y': 'years', 'yr': 'years', 'yrs': 'years', 'year': 'years',
+    'years': 'years',
+    'mo': 'months', 'mos': 'months', 'month': 'months',
+    'months': 'months',
+    'w': 'weeks', 'wk': 'weeks', 'wks': 'weeks', 'week': 'weeks',
+    'weeks': 'weeks',
+    'd': 'days', 'day': 'days', 'days': 'days',
+    'h': 'hours', 'hr': 'hours', 'hrs': 'hours', 'hour': 'hours',
+    'hours': 'hours',
+    'm': 'minutes', 'min': 'minutes', 'mins': 'minutes',
+    'minute': 'minutes', 'minutes': 'minutes',
+    's': 'seconds', 'sec': 'seconds', 'secs': 'seconds',
+    'second': 'seconds', 'seconds': 'seconds',
+    'ms': 'milliseconds', 'msec': 'milliseconds',
+    'millisecond': 'milliseconds', 'milliseconds': 'milliseconds',
+    'us': 'microseconds', 'usec': 'microseconds',
+    'microsecond': 'microseconds', 'microseconds': 'microseconds',
+}
+_DURATION_PART = re.compile(r'\s*(\d+)\s*([a-z]+)\s*,?')
+_DURATIONS = {}
+_DURATIONS_MAX = 1024
+
+# The calendar fields that can be extracted by fields() and the array
+# typecodes they're returned in. Fields of the time of day are found by
+# dividing by a number of microseconds and taking a remainder.
+_FIELD_TYPES = {
+    'year': 'i',
+    'month': 'b',
+    'day': 'b',
+    'hour': 'b',
+    'minute': 'b',
+    'second': 'b',
+    'microsecond': 'i',
+    'weekday': 'b',
+    'iso_year': 'i',
+    'iso_week': 'b',
+    'quarter': 'b',
+    'day_of_year': 'h',
+}
+_TIME_FIELDS = {
+    'hour': (3600000000, 24),
+    'minute': (60000000, 60),
+    'second': (1000000, 60),
+    'microsecond': (1, 1000000),
+}
+
+# The length of the units of time that can be rounded with arithmetic.
+_WALL_UNITS = {
+    'day': 86400000000,
+    'hour': 3600000000,
+    'minute': 60000000,
+    'second': 1000000,
+}
+
+# The header of the files written by save_column(): a magic number, the
+# format version, the number of microseconds per stored unit, the length
+# of the name of the time zone and the number of values. The name of the
+# time zone follows, padded so that the values start on an 8-byte
+# boundary. The values are little-endian 64-bit integers.
+_COLUMN_HEADER = struct.Struct('<4sBxHIQ')
+_COLUMN_MAGIC = b'WHEN'
+_COLUMN_VERSION = 1
+
+# A datetime packed by pack_datetime() is its microseconds since the
+# epoch as a little-endian 64-bit integer followed by the name of its
+# time zone, which is empty for naive datetimes.
+_PACKED_DATETIME = struct.Struct('<q')
+
+# The shared tzinfo of each time zone, UTC offset, DST offset and
+# abbreviation seen by intern_datetime(). They are forgotten once there
+# are too many, which only happens with many unnamed time zones.
+_TZINFOS = {}
+_TZINFOS_MAX = 4096
+
+# The deadline groups shared by sleep_until() and call_at(), per loop.
+# Only weak references to the groups are kept, as they refer to their
+# loop. A group with deadlines is kept alive by its loop's timer.
+_LOOP_DEADLINES = weakref.WeakKeyDictionary()
+
 
 class _FormatsMetaClass(type):
     """Allows the formats class to be treated as an iterable.
@@ -68,6 +268,2826 @@ formats.__doc__ = """A set of predefined datetime formats.
     """
 
 
+class _DateRange(object):
+    """A lazy sequence of datetimes separated by a calendar-aware step.
+
+    Instances are created by :func:`range`. The ``n``-th item is always
+    calculated from the start of the range, exactly as
+    ``_add_time(start, months=n * months, ...)`` would calculate it, so
+    indexing, slicing, ``len()`` and ``reversed()`` never need to
+    produce the items that come before the one requested.
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, origin, delta, years, months, indices):
+        self._origin = origin
+        self._delta = delta
+        self._years = years
+        self._months = months
+        self._indices = indices
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _DateRange(self._origin, self._delta, self._years,
+                              self._months, self._indices[index])
+        return self._at(self._indices[index])
+
+    def __iter__(self):
+        for step in self._indices:
+            yield self._at(step)
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __repr__(self):
+        return '<when.range of {0} items starting at {1!r}>'.format(
+            len(self), self._origin)
+
+    def __reversed__(self):
+        for step in reversed(self._indices):
+            yield self._at(step)
+
+    def _at(self, step):
+        """Get the item ``step`` steps away from the start of the range."""
+
+        if not step:
+            return self._origin
+
+        return _add_time(self._origin + self._delta * step,
+                         years=self._years * step, months=self._months * step)
+
+
+class Recurrence(object):
+    """A recurrence rule compiled for direct next-occurrence lookups.
+
+    Occurrences are counted from ``start``, which also provides the time
+    of day. ``frequency`` is one of ``'daily'``, ``'weekly'``,
+    ``'monthly'`` or ``'yearly'`` and ``interval`` is the number of
+    those units between occurrences. Monthly and yearly occurrences are
+    calculated with ``_add_time()``, so a rule starting on January 31
+    behaves exactly like ``future(months=n)``.
+
+    ``weekday`` (``0`` is Monday) moves weekly occurrences to that day
+    of the week. Combined with ``nth`` it selects the ``nth`` weekday of
+    the month for monthly and yearly rules (``-1`` is the last one).
+    Months without such a day are skipped. "The third Tuesday of every
+    month at 09:00 in New York" is::
+
+        when.Recurrence(datetime.datetime(2012, 1, 1, 9), 'monthly',
+                        weekday=1, nth=3, tz='America/New_York')
+
+    All occurrences are time zone naive datetimes in the rule's time
+    zone, matching the values returned by ``shift()``. Wall times that
+    don't exist because of daylight saving time are moved forward using
+    the time zone. Naive datetimes passed to ``next_after()`` and
+    ``between()`` are assumed to be in the rule's time zone, aware ones
+    are shifted to it.
+
+    If no value is provided for ``tz``, the current system time zone
+    will be used. If the ``utc`` parameter is set to ``True`` or
+    ``set_utc()`` has been called, however, UTC will be used instead.
+
+    :param start: The first possible occurrence.
+    :type start: datetime.datetime.
+    :param frequency: The unit of time between occurrences.
+    :type frequency: str.
+    :param interval: The number of units between occurrences.
+    :type interval: int.
+    :param weekday: The day of the week of the occurrences.
+    :type weekday: int.
+    :param nth: Which ``weekday`` of the month to use.
+    :type nth: int.
+    :param tz: The time zone of the occurrences.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    _MONTHS = {'monthly': 1, 'yearly': 12}
+    _DAYS = {'daily': 1, 'weekly': 7}
+
+    def __init__(self, start, frequency, interval=1, weekday=None, nth=None,
+                 tz=None, utc=False):
+        if not isinstance(start, datetime.datetime):
+            message = "'{0}' object is not a valid datetime."
+            raise TypeError(message.format(type(start).__name__))
+
+        if frequency not in self._MONTHS and frequency not in self._DAYS:
+            message = "'{0}' is not a valid frequency."
+            raise ValueError(message.format(frequency))
+        if interval < 1:
+            raise ValueError("The value of 'interval' must be at least 1.")
+        if weekday is not None and not 0 <= weekday <= 6:
+            raise ValueError("The value of 'weekday' must be from 0 to 6.")
+        if nth is not None:
+            if frequency not in self._MONTHS or weekday is None:
+                message = ("'nth' can only be used with 'weekday' and a "
+                           "monthly or yearly frequency.")
+                raise ValueError(message)
+            if not (1 <= nth <= 5 or -5 <= nth <= -1):
+                raise ValueError("The value of 'nth' must be from 1 to 5 or "
+                                 "from -5 to -1.")
+        elif weekday is not None and frequency != 'weekly':
+            raise ValueError("'weekday' requires 'nth' unless the frequency "
+                             "is weekly.")
+
+        self.tz = _resolve_timezone(tz, utc)
+        if is_timezone_aware(start):
+            start = shift(start, to_tz=self.tz).replace(tzinfo=None)
+
+        if weekday is not None and frequency == 'weekly':
+            start += datetime.timedelta(days=(weekday - start.weekday()) % 7)
+
+        self.start = start
+        self.frequency = frequency
+        self.interval = interval
+        self.weekday = weekday
+        self.nth = nth
+
+        # Compile the rule into a step of days or months. Every
+        # occurrence can then be calculated directly from its index.
+        self._days = self._DAYS.get(frequency, 0) * interval
+        self._months = self._MONTHS.get(frequency, 0) * interval
+
+    def __repr__(self):
+        return '<when.Recurrence {0} every {1} from {2!r}>'.format(
+            self.frequency, self.interval, self.start)
+
+    def _occurrence(self, index):
+        """Get the wall time of an occurrence or ``None`` if skipped."""
+
+        start = self.start
+        if self._days:
+            return start + datetime.timedelta(days=self._days * index)
+
+        if self.nth is None:
+            return _add_time(start, months=self._months * index)
+
+        year, month = divmod(start.month - 1 + self._months * index, 12)
+        year, month = start.year + year, month + 1
+        first_weekday, days_in_month = calendar.monthrange(year, month)
+        if self.nth > 0:
+            day = (1 + (self.weekday - first_weekday) % 7
+                   + (self.nth - 1) * 7)
+        else:
+            last_weekday = (first_weekday + days_in_month - 1) % 7
+            day = (days_in_month - (last_weekday - self.weekday) % 7
+                   + (self.nth + 1) * 7)
+        if not 1 <= day <= days_in_month:
+            return None
+
+        value = start.replace(year=year, month=month, day=day)
+        return value if value >= start else None
+
+    def _index(self, value):
+        """Estimate the index of the occurrence nearest to a wall time."""
+
+        start = self.start
+        if self._days:
+            return (value - start).days // self._days
+
+        months = ((value.year - start.year) * 12 + value.month - start.month)
+        return months // self._months
+
+    def _localize(self, value):
+        """Get the actual wall time of an occurrence in the time zone."""
+
+        if not hasattr(self.tz, 'localize'):
+            return value
+        return self.tz.normalize(self.tz.localize(value)).replace(tzinfo=None)
+
+    def _wall_time(self, value):
+        if not isinstance(value, datetime.datetime):
+            message = "'{0}' object is not a valid datetime."
+            raise TypeError(message.format(type(value).__name__))
+
+        if is_timezone_aware(value):
+            # shift() returns `value` untouched when it's already in the
+            # rule's time zone.
+            return shift(value, to_tz=self.tz).replace(tzinfo=None)
+        return value
+
+    def _iter_from(self, value, inclusive):
+        """Get the occurrences starting at the first one after ``value``."""
+
+        # `_index()` can be off by one in either direction because of the
+        # way days are moved when a month is too short, so begin just
+        # before the estimate. Every occurrence is then calculated
+        # directly from its index.
+        index = max(0, self._index(value) - 1)
+        while True:
+            occurrence = self._occurrence(index)
+            index += 1
+            if occurrence is None:
+                continue
+            if occurrence > value or (inclusive and occurrence == value):
+                yield self._localize(occurrence)
+
+    def between(self, start, end):
+        """Get the occurrences from ``start`` up to, but not including,
+        ``end``.
+
+        :param start: The beginning of the period.
+        :type start: datetime.datetime.
+        :param end: The end of the period.
+        :type end: datetime.datetime.
+        :returns: generator -- the occurrences in the period.
+        :raises: TypeError
+        """
+
+        start = self._wall_time(start)
+        end = self._wall_time(end)
+
+        for occurrence in self._iter_from(start, inclusive=True):
+            if occurrence >= end:
+                break
+            yield occurrence
+
+    def next_after(self, value):
+        """Get the first occurrence after a datetime.
+
+        :param value: The datetime after which to look.
+        :type value: datetime.datetime.
+        :returns: datetime.datetime -- the next occurrence.
+        :raises: TypeError
+        """
+
+        return next(self._iter_from(self._wall_time(value), inclusive=False))
+
+
+class _Timer(object):
+    """A deadline scheduled in a :class:`TimingWheel`."""
+
+    __slots__ = ('tick', 'item', 'slot', 'level')
+
+    def __init__(self, tick, item):
+        self.tick = tick
+        self.item = item
+        self.slot = None
+        self.level = None
+
+
+class TimingWheel(object):
+    """A hierarchical timing wheel for large numbers of deadlines.
+
+    Deadlines are rounded up to multiples of ``resolution`` (so they
+    never expire early) and stored in ``levels`` wheels of ``slots``
+    slots each. Adding and cancelling a deadline is O(1) regardless of
+    how many are scheduled. Deadlines further in the future than the
+    wheels can hold are kept aside until the outermost wheel turns.
+
+    Deadlines are the datetimes returned by ``future()``. Time zone
+    naive datetimes are assumed to be in the current system time zone.
+    If the ``utc`` parameter is set to ``True`` or ``set_utc()`` has
+    been called, UTC will be assumed instead. Time zone aware datetimes
+    are also accepted.
+
+    The wheel can be advanced by hand with ``advance()`` or driven by
+    ``start_thread()`` or ``start_loop()``, which pass the expired items
+    to a ``dispatch`` callable in batches.
+
+    :param resolution: The precision of the deadlines.
+    :type resolution: datetime.timedelta.
+    :param slots: The number of slots in each wheel.
+    :type slots: int.
+    :param levels: The number of wheels.
+    :type levels: int.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :raises: ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, resolution=datetime.timedelta(milliseconds=1),
+                 slots=256, levels=4, utc=False):
+        self._resolution = (resolution.days * 86400000000
+                            + resolution.seconds * 1000000
+                            + resolution.microseconds)
+        if self._resolution <= 0:
+            raise ValueError("The value of 'resolution' must be positive.")
+        if slots < 2 or levels < 1:
+            raise ValueError("A timing wheel needs at least one wheel with "
+                             "two slots.")
+
+        self.resolution = resolution
+        self.utc = utc
+
+        self._slots = slots
+        self._spans = [slots ** level for level in _range(levels + 1)]
+        self._wheels = [[{} for _ in _range(slots)] for _ in _range(levels)]
+        self._counts = [0] * levels
+        self._overflow = {}
+        self._due = {}
+        self._current = self._tick(time.time() * 1000000)
+        self._lock = threading.RLock()
+        self._driver = None
+        self._wakeup = None
+        self._wake_tick = None
+
+    def __len__(self):
+        return sum(self._counts) + len(self._overflow) + len(self._due)
+
+    def _tick(self, microseconds):
+        return int(microseconds // self._resolution)
+
+    def _place(self, timer):
+        """Put a timer in the innermost wheel that can hold it."""
+
+        current, spans = self._current, self._spans
+        timer.level = None
+        if timer.tick <= current:
+            slot = self._due
+        else:
+            for level, wheel in enumerate(self._wheels):
+                # A wheel can hold every tick that differs from the
+                # current tick only in its digit and the ones below it.
+                span = spans[level + 1]
+                if timer.tick // span == current // span:
+                    slot = wheel[timer.tick // spans[level] % self._slots]
+                    self._counts[level] += 1
+                    timer.level = level
+                    break
+            else:
+                slot = self._overflow
+
+        slot[timer] = None
+        timer.slot = slot
+
+    def _next_tick(self):
+        """Get the first tick at which a timer can expire or move to
+        another wheel, or ``None`` if nothing is scheduled.
+        """
+
+        if self._due:
+            return self._current
+
+        current, spans, slots = self._current, self._spans, self._slots
+        for level, wheel in enumerate(self._wheels):
+            if not self._counts[level]:
+                continue
+            # Only the slots after the current one are occupied, or the
+            # timers in them would be in an inner wheel.
+            start = current // spans[level + 1] * spans[level + 1]
+            for digit in _range(current // spans[level] % slots + 1, slots):
+                if wheel[digit]:
+                    return start + digit * spans[level]
+
+        if self._overflow:
+            return (current // spans[-1] + 1) * spans[-1]
+        return None
+
+    def _wait(self):
+        """Get the number of seconds until the next timer can expire,
+        or ``None`` if nothing is scheduled.
+        """
+
+        with self._lock:
+            tick = self._wake_tick = self._next_tick()
+        if tick is None:
+            return None
+        delay = tick * self._resolution - time.time() * 1000000
+        return max(delay, 0) / 1000000.0
+
+    def _expire(self, target):
+        """Turn the wheels up to ``target`` and collect expired timers."""
+
+        spans, slots, counts = self._spans, self._slots, self._counts
+        levels = len(self._wheels)
+        expired = []
+        while self._current < target:
+            if not any(counts) and not self._overflow:
+                break
+
+            # Nothing can expire before the innermost occupied wheel
+            # reaches its next slot, so skip directly to it.
+            level = 0
+            while level < levels and not counts[level]:
+                level += 1
+            tick = (self._current // spans[level] + 1) * spans[level]
+            if tick > target:
+                break
+            self._current = tick
+
+            # Cascade from the outermost wheel inwards so that timers
+            # moving down more than one wheel end up in the right slot.
+            if tick % spans[levels] == 0:
+                overflow = list(self._overflow)
+                self._overflow.clear()
+                for timer in overflow:
+                    self._place(timer)
+            for level in _range(levels - 1, 0, -1):
+                if tick % spans[level] == 0:
+                    slot = self._wheels[level][tick // spans[level] % slots]
+                    timers = list(slot)
+                    slot.clear()
+                    counts[level] -= len(timers)
+                    for timer in timers:
+                        self._place(timer)
+
+            slot = self._wheels[0][tick % slots]
+            if slot:
+                counts[0] -= len(slot)
+                expired.extend(slot)
+                slot.clear()
+
+        self._current = max(self._current, target)
+
+        expired.extend(self._due)
+        self._due.clear()
+        for timer in expired:
+            timer.slot = None
+        return [timer.item for timer in expired]
+
+    def add(self, deadline, item):
+        """Schedule an item to expire at a deadline.
+
+        :param deadline: When the item should expire.
+        :type deadline: datetime.datetime.
+        :param item: The value to return once the deadline has passed.
+        :returns: a handle that can be passed to ``cancel()``.
+        :raises: TypeError
+        """
+
+        if not isinstance(deadline, datetime.datetime):
+            message = "'{0}' object is not a valid datetime."
+            raise TypeError(message.format(type(deadline).__name__))
+
+        microseconds = _epoch_microseconds(deadline, self.utc)
+        # Round up so that deadlines never expire early.
+        timer = _Timer(-(-microseconds // self._resolution), item)
+        with self._lock:
+            self._place(timer)
+            # Wake the driver if it's waiting for a later deadline.
+            wakeup = self._wakeup
+            if self._wake_tick is None or timer.tick < self._wake_tick:
+                self._wake_tick = timer.tick
+            else:
+                wakeup = None
+        if wakeup is not None:
+            wakeup()
+        return timer
+
+    def advance(self, to=None):
+        """Turn the wheel and get the items whose deadlines have passed.
+
+        :param to: The time to advance to. Defaults to the current time.
+        :type to: datetime.datetime.
+        :returns: list -- the expired items.
+        """
+
+        if to is None:
+            target = self._tick(time.time() * 1000000)
+        else:
+            target = self._tick(_epoch_microseconds(to, self.utc))
+
+        with self._lock:
+            return self._expire(target)
+
+    def cancel(self, timer):
+        """Cancel a scheduled item.
+
+        :param timer: The handle returned by ``add()``.
+        :returns: bool -- whether the item was still scheduled.
+        """
+
+        with self._lock:
+            slot = timer.slot
+            if slot is None:
+                return False
+
+            del slot[timer]
+            timer.slot = None
+            if timer.level is not None:
+                self._counts[timer.level] -= 1
+            return True
+
+    def start_loop(self, dispatch, loop=None):
+        """Advance the wheel from an asyncio event loop.
+
+        The wheel is advanced whenever its next deadline may have
+        passed and ``dispatch`` is called with each non-empty batch of
+        expired items. Nothing is scheduled with the loop while the
+        wheel is empty. Items can be added from other threads.
+
+        :param dispatch: The callable that receives expired items.
+        :param loop: The event loop. Defaults to the current loop.
+        :type loop: asyncio.AbstractEventLoop.
+        """
+
+        if loop is None:
+            loop = asyncio.get_event_loop()
+
+        handle = [None]
+
+        def turn():
+            handle[0] = None
+            expired = self.advance()
+            if expired:
+                dispatch(expired)
+            delay = self._wait()
+            if delay is not None:
+                handle[0] = loop.call_later(delay, turn)
+
+        def reschedule():
+            if self._wakeup is not wakeup:
+                return  # Stopped
+            if handle[0] is not None:
+                handle[0].cancel()
+            handle[0] = loop.call_soon(turn)
+
+        def wakeup():
+            loop.call_soon_threadsafe(reschedule)
+
+        def stop():
+            if handle[0] is not None:
+                handle[0].cancel()
+
+        self.stop()
+        self._wakeup = wakeup
+        self._driver = stop
+        handle[0] = loop.call_soon(turn)
+
+    def start_thread(self, dispatch):
+        """Advance the wheel from a background thread.
+
+        The wheel is advanced whenever its next deadline may have
+        passed and ``dispatch`` is called in the background thread with
+        each non-empty batch of expired items. The thread waits without
+        waking up while the wheel is empty.
+
+        :param dispatch: The callable that receives expired items.
+        """
+
+        stopped = threading.Event()
+        changed = threading.Event()
+
+        def run():
+            while not stopped.is_set():
+                expired = self.advance()
+                if expired:
+                    dispatch(expired)
+                changed.wait(self._wait())
+                changed.clear()
+
+        def stop():
+            stopped.set()
+            changed.set()
+
+        self.stop()
+        thread = threading.Thread(target=run, name='when.TimingWheel')
+        thread.daemon = True
+        self._wakeup = changed.set
+        self._driver = stop
+        thread.start()
+
+    def stop(self):
+        """Stop advancing the wheel from a thread or event loop."""
+
+        driver, self._driver = self._driver, None
+        self._wakeup = None
+        if driver is not None:
+            driver()
+
+
+class _Deadlines(object):
+    """A group of wall clock deadlines sharing one event loop timer.
+
+    Instances are created by :func:`deadlines`. Each datetime is mapped
+    to the loop's monotonic clock once, when it is added, and the group
+    only ever keeps a single timer scheduled with the loop, for its
+    earliest deadline.
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, loop, utc):
+        self._loop = loop
+        self.utc = utc
+
+        self._heap = []
+        self._cancelled = 0
+        self._counter = itertools.count()
+        self._handle = None
+        self._handle_when = None
+        self._resolution = time.get_clock_info('monotonic').resolution
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def _cancel(self):
+        """Count a cancelled entry, removing the cancelled entries from
+        the heap once they make up more than half of it.
+        """
+
+        self._cancelled += 1
+        if self._cancelled * 2 > len(self._heap):
+            # Compact in place, as _run() may be iterating over the heap.
+            self._heap[:] = [entry for entry in self._heap
+                             if entry[2] is not None]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _loop_time(self, value):
+        """Map a wall clock datetime to the loop's clock."""
+
+        if not isinstance(value, datetime.datetime):
+            message = "'{0}' object is not a valid datetime."
+            raise TypeError(message.format(type(value).__name__))
+
+        remaining = _epoch_microseconds(value, self.utc) / 1000000.0
+        return self._loop.time() + remaining - time.time()
+
+    def _run(self):
+        self._handle = None
+
+        heap = self._heap
+        now = self._loop.time() + self._resolution
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            _, _, callback, args, _ = entry
+            entry[4] = None
+            if callback is None:
+                self._cancelled -= 1
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                self._loop.call_exception_handler({
+                    'message': 'Exception in when deadline callback',
+                    'exception': e,
+                })
+
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)[4] = None
+            self._cancelled -= 1
+        if heap:
+            self._schedule(heap[0][0])
+
+    def _schedule(self, when):
+        if self._handle is not None:
+            if self._handle_when <= when:
+                return
+            self._handle.cancel()
+
+        self._handle = self._loop.call_at(when, self._run)
+        self._handle_when = when
+
+    def call_at(self, value, callback, *args):
+        """Call a function once a datetime has passed.
+
+        :param value: When to call ``callback``.
+        :type value: datetime.datetime.
+        :param callback: The function to call.
+        :returns: a handle with a ``cancel()`` method.
+        :raises: TypeError
+        """
+
+        # The last item is the group while the entry is in its heap.
+        entry = [self._loop_time(value), next(self._counter), callback, args,
+                 self]
+        heapq.heappush(self._heap, entry)
+        self._schedule(entry[0])
+        return _DeadlineHandle(entry)
+
+    def close(self):
+        """Cancel all of the deadlines in the group."""
+
+        for entry in self._heap:
+            entry[2] = entry[3] = entry[4] = None
+        del self._heap[:]
+        self._cancelled = 0
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def sleep_until(self, value, result=None):
+        """Get a future that completes once a datetime has passed.
+
+        :param value: When to complete the future.
+        :type value: datetime.datetime.
+        :param result: The result of the future.
+        :returns: asyncio.Future -- the future.
+        :raises: TypeError
+        """
+
+        try:
+            future = self._loop.create_future()
+        except AttributeError:  # Python < 3.5.2
+            future = asyncio.Future(loop=self._loop)
+        handle = self.call_at(value, _set_future_result, future, result)
+
+        def cleanup(future):
+            if future.cancelled():
+                handle.cancel()
+
+        future.add_done_callback(cleanup)
+        return future
+
+
+class _DeadlineHandle(object):
+    """A deadline added to a group created by :func:`deadlines`."""
+
+    __slots__ = ('_entry',)
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    def cancel(self):
+        """Cancel the deadline."""
+
+        entry = self._entry
+        if entry[2] is None:
+            return
+        entry[2] = entry[3] = None
+        if entry[4] is not None:
+            entry[4]._cancel()
+
+    def cancelled(self):
+        """Check if the deadline was cancelled.
+
+        :returns: bool -- if the deadline was cancelled.
+        """
+
+        return self._entry[2] is None
+
+
+class Instant(object):
+    """A compact, time zone aware point in time.
+
+    An ``Instant`` only stores the number of microseconds since the Unix
+    epoch and the interned id of its time zone, making it much smaller
+    than a ``datetime`` with a ``tzinfo``. Comparisons, hashing and
+    sorting only use the integer, so instants in different time zones
+    compare by the point in time they represent.
+
+    If no value is provided for ``tz``, the current system time zone
+    will be used. If the ``utc`` parameter is set to ``True`` or
+    ``set_utc()`` has been called, however, UTC will be used instead.
+
+    :param microseconds: The number of microseconds since the epoch.
+    :type microseconds: int.
+    :param tz: The time zone of the instant.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+
+    .. versionadded:: 0.5.0
+    """
+
+    __slots__ = ('_microseconds', '_zone')
+
+    def __init__(self, microseconds, tz=None, utc=False):
+        self._microseconds = int(microseconds)
+        self._zone = _zone_id(_resolve_timezone(tz, utc))
+
+    @classmethod
+    def _from_zone_id(cls, microseconds, zone):
+        instant = cls.__new__(cls)
+        instant._microseconds = microseconds
+        instant._zone = zone
+        return instant
+
+    @classmethod
+    def from_datetime(cls, value, tz=None, utc=False):
+        """Get the instant of a datetime.
+
+        Time zone aware datetimes keep their time zone. Time zone naive
+        datetimes are assumed to be in the time zone specified by
+        ``tz``, defaulting like the ``from_tz`` parameter of
+        ``shift()``.
+
+        :param value: A datetime object.
+        :type value: datetime.datetime.
+        :param tz: The time zone of ``value`` if it's naive.
+        :type tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.Instant -- the instant.
+        :raises: TypeError
+        """
+
+        if not isinstance(value, datetime.datetime):
+            message = "'{0}' object is not a valid datetime."
+            raise TypeError(message.format(type(value).__name__))
+
+        if is_timezone_aware(value):
+            tz = value.tzinfo
+            # Use the time zone rather than the offset-specific tzinfo
+            # pytz attaches to localized datetimes.
+            if getattr(tz, 'zone', None):
+                tz = pytz.timezone(tz.zone)
+        else:
+            tz = _resolve_timezone(tz, utc)
+            if hasattr(tz, 'localize'):
+                value = tz.localize(value)
+            else:
+                value = value.replace(tzinfo=tz)
+
+        return cls._from_zone_id(_epoch_microseconds(value), _zone_id(tz))
+
+    @classmethod
+    def now(cls, tz=None, utc=False):
+        """Get the current instant.
+
+        :param tz: The time zone of the instant.
+        :type tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.Instant -- the current instant.
+        """
+
+        return cls(int(time.time() * 1000000), tz, utc)
+
+    @property
+    def microseconds(self):
+        """The number of microseconds since the Unix epoch."""
+
+        return self._microseconds
+
+    @property
+    def tzinfo(self):
+        """The time zone of the instant."""
+
+        return _ZONES[self._zone]
+
+    @property
+    def zone(self):
+        """The name of the time zone of the instant.
+
+        Time zones without a name are named by their UTC offset, like
+        ``'+05:30'``, which ``resolve_timezone()`` accepts.
+        """
+
+        try:
+            return _zone_name(self._zone)
+        except ValueError:  # The offset isn't a whole number of minutes
+            return str(_ZONES[self._zone])
+
+    def format(self, format_string, locale=None):
+        """Get a formatted version of the instant in its time zone.
+
+        This is the same as ``when.format(instant.to_datetime(), ...)``.
+
+        :param format_string: A string specifying formatting the
+                              directives or to use.
+        :type format_string: str.
+        :param locale: The name of the locale to use instead of the
+                       current one.
+        :type locale: str.
+        :returns: str -- the formatted instant.
+        """
+
+        return format(self.to_datetime(aware=True), format_string, locale)
+
+    def shift(self, to_tz=None, utc=False):
+        """Get the same instant in another time zone.
+
+        :param to_tz: The time zone to shift to.
+        :type to_tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.Instant -- the shifted instant.
+        """
+
+        zone = _zone_id(_resolve_timezone(to_tz, utc))
+        return self._from_zone_id(self._microseconds, zone)
+
+    def to_datetime(self, aware=False):
+        """Get the datetime of the instant in its time zone.
+
+        By default the datetime is time zone naive, like the datetimes
+        returned by ``shift()``.
+
+        :param aware: Whether or not to return a time zone aware
+                      datetime.
+        :type aware: bool.
+        :returns: datetime.datetime -- the datetime.
+        """
+
+        value = _from_epoch_microseconds(self._microseconds,
+                                         _ZONES[self._zone])
+        return value if aware else value.replace(tzinfo=None)
+
+    def __eq__(self, other):
+        if not isinstance(other, Instant):
+            return NotImplemented
+        return self._microseconds == other._microseconds
+
+    def __ne__(self, other):
+        if not isinstance(other, Instant):
+            return NotImplemented
+        return self._microseconds != other._microseconds
+
+    def __lt__(self, other):
+        if not isinstance(other, Instant):
+            return NotImplemented
+        return self._microseconds < other._microseconds
+
+    def __le__(self, other):
+        if not isinstance(other, Instant):
+            return NotImplemented
+        return self._microseconds <= other._microseconds
+
+    def __gt__(self, other):
+        if not isinstance(other, Instant):
+            return NotImplemented
+        return self._microseconds > other._microseconds
+
+    def __ge__(self, other):
+        if not isinstance(other, Instant):
+            return NotImplemented
+        return self._microseconds >= other._microseconds
+
+    def __hash__(self):
+        return hash(self._microseconds)
+
+    def __reduce__(self):
+        return (Instant, (self._microseconds, _zone_name(self._zone)))
+
+    def __repr__(self):
+        return 'when.Instant({0}, {1!r})'.format(self._microseconds, self.zone)
+
+
+class _ZoneNames(object):
+    """The names of all time zones, indexed by normalized keys.
+
+    Keys are lowercase, with spaces and hyphens replaced by underscores.
+    Besides its full name, each time zone can be found by the last part
+    of its name, like ``'new_york'``, unless another common time zone
+    shares it. For suggestions, every part of a name and every word of
+    its last part is also kept in a sorted list so that all of the keys
+    starting with a prefix can be found with ``bisect``.
+    """
+
+    def __init__(self):
+        common = common_timezones_set()
+        self.exact = {}
+
+        aliases = {}
+        entries = []
+        for name in all_timezones():
+            key = _normalize_zone_name(name)
+            self.exact[key] = name
+            # Suggestions are ranked by what matched, then common time
+            # zones first, then the shortest names.
+            rank = (name not in common, len(name), name)
+            entries.append((key, (0,) + rank))
+
+            parts = key.split('/')
+            aliases.setdefault(parts[-1], []).append(name)
+            for part in _range(1, len(parts)):
+                entries.append(('/'.join(parts[part:]), (1,) + rank))
+            for word in parts[-1].split('_')[1:]:
+                entries.append((word, (2,) + rank))
+
+        for key, names in aliases.items():
+            preferred = [name for name in names if name in common] or names
+            if len(preferred) == 1:
+                self.exact.setdefault(key, preferred[0])
+
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ranks = [rank for _, rank in entries]
+
+    def lookup(self, name):
+        """Get the full name of a time zone, or ``None``."""
+
+        return self.exact.get(_normalize_zone_name(name))
+
+    def suggest(self, prefix, limit):
+        """Get the best ranked names with keys starting with a prefix."""
+
+        prefix = _normalize_zone_name(prefix)
+        first = bisect.bisect_left(self.keys, prefix)
+        if prefix:
+            end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            last = bisect.bisect_left(self.keys, end, first)
+        else:
+            last = len(self.keys)
+
+        best = {}
+        for rank in itertools.islice(self.ranks, first, last):
+            name = rank[-1]
+            if name not in best or rank < best[name]:
+                best[name] = rank
+        return [rank[-1] for rank in heapq.nsmallest(limit, best.values())]
+
+
+class _ZoneTable(object):
+    """The UTC offsets of a time zone, indexed by when they take effect.
+
+    ``starts`` holds the microsecond since the epoch at which each
+    offset starts to be used. The first offset is used for everything
+    before the first transition. This allows the offset of any number of
+    values to be looked up with ``bisect`` instead of building a
+    ``datetime`` for each one.
+    """
+
+    __slots__ = ('tz', 'starts', 'offsets', 'dsts', 'names')
+
+    def __init__(self, tz):
+        self.tz = tz
+
+        transitions = getattr(tz, '_utc_transition_times', None)
+        if transitions:
+            # pytz time zones with daylight saving time or historical
+            # changes. The first transition is always datetime.min.
+            info = tz._transition_info
+            self.starts = [-2 ** 63] + [_naive_microseconds(value)
+                                        for value in transitions[1:]]
+            self.offsets = [_timedelta_microseconds(i[0]) for i in info]
+            self.dsts = [bool(i[1]) for i in info]
+            self.names = [i[2] for i in info]
+        elif (hasattr(tz, '_utcoffset')
+                or isinstance(tz, getattr(datetime, 'timezone', ()))):
+            # UTC, fixed offset pytz time zones and datetime.timezone.
+            value = datetime.datetime(2000, 1, 1, tzinfo=tz)
+            self.starts = [-2 ** 63]
+            self.offsets = [_timedelta_microseconds(tz.utcoffset(value))]
+            self.dsts = [False]
+            self.names = [tz.tzname(value)]
+        else:
+            message = "'{0}' time zones are not supported."
+            raise TypeError(message.format(type(tz).__name__))
+
+    def index(self, microseconds):
+        """Get the index of the offset in use at an instant."""
+
+        return bisect.bisect_right(self.starts, microseconds) - 1
+
+    def offset(self, microseconds):
+        """Get the UTC offset in use at an instant."""
+
+        return self.offsets[bisect.bisect_right(self.starts, microseconds) - 1]
+
+    def candidates(self, wall):
+        """Get the indexes of the offsets a wall time can be in.
+
+        Wall times repeated when clocks are turned back have two
+        candidates, earliest instant first. Wall times skipped when
+        clocks are turned forward have a single candidate, the offset
+        from before the transition, which moves them forward.
+        """
+
+        starts, offsets = self.starts, self.offsets
+        if len(offsets) == 1:
+            return [0]
+
+        # Every candidate period starts within a day of the wall time.
+        first = max(0, bisect.bisect_right(starts, wall - 86400000000) - 1)
+        last = bisect.bisect_right(starts, wall + 86400000000)
+        found = []
+        for index in _range(first, last):
+            instant = wall - offsets[index]
+            end = starts[index + 1] if index + 1 < len(starts) else 2 ** 63
+            if starts[index] <= instant < end:
+                found.append(index)
+            elif (not found and index > first and instant < starts[index]
+                    and wall - offsets[index - 1] >= starts[index]):
+                # The wall time was skipped by this transition.
+                return [index - 1]
+        return found or [first]
+
+    def to_utc(self, wall):
+        """Get the instant of a wall time.
+
+        Ambiguous and nonexistent wall times are resolved the same way
+        as ``localize()`` resolves them by default: the standard time
+        offset is preferred, the later instant is used when both or
+        neither of the offsets are standard time, and wall times skipped
+        by a transition use the offset from before the transition.
+        """
+
+        if len(self.offsets) == 1:
+            return wall - self.offsets[0]
+
+        found = self.candidates(wall)
+        if len(found) > 1:
+            standard = [index for index in found if not self.dsts[index]]
+            found = standard or found
+        return wall - self.offsets[found[-1]]
+
+
+class _ZoneIndex(object):
+    """The common time zones grouped by the UTC offset and abbreviation
+    they use at an instant.
+
+    The index is valid from the latest start of the periods the time
+    zones are in until the earliest transition after them. Moving it
+    forward past that only updates the time zones that have
+    transitioned, which are kept in a heap by the end of their periods.
+    Moving it backward rebuilds it.
+    """
+
+    def __init__(self):
+        self.names = list(common_timezones())
+        self.tables = [_zone_table(_zone_id(pytz.timezone(name)))
+                       for name in self.names]
+        self.start = self.end = None
+
+    def move(self, microseconds):
+        """Move the index to an instant."""
+
+        if self.start is None or microseconds < self.start:
+            self._rebuild(microseconds)
+        elif microseconds >= self.end:
+            self._advance(microseconds)
+
+    def _add(self, position, microseconds):
+        table = self.tables[position]
+        index = table.index(microseconds)
+        self.current[position] = index
+
+        name = self.names[position]
+        self.offsets.setdefault(table.offsets[index], set()).add(name)
+        self.abbreviations.setdefault(table.names[index], set()).add(name)
+
+        self.start = max(self.start, table.starts[index])
+        if index + 1 < len(table.starts):
+            heapq.heappush(self.heap, (table.starts[index + 1], position))
+
+    def _advance(self, microseconds):
+        heap = self.heap
+        while heap and heap[0][0] <= microseconds:
+            position = heapq.heappop(heap)[1]
+            table, index = self.tables[position], self.current[position]
+
+            name = self.names[position]
+            for groups, key in ((self.offsets, table.offsets[index]),
+                                (self.abbreviations, table.names[index])):
+                groups[key].discard(name)
+                if not groups[key]:
+                    del groups[key]
+
+            self._add(position, microseconds)
+
+        self.end = heap[0][0] if heap else 2 ** 63
+        self.sorted = {}
+
+    def _rebuild(self, microseconds):
+        self.current = [None] * len(self.names)
+        self.offsets = {}
+        self.abbreviations = {}
+        self.heap = []
+        self.start = -2 ** 63
+
+        for position in _range(len(self.names)):
+            self._add(position, microseconds)
+
+        self.end = self.heap[0][0] if self.heap else 2 ** 63
+        self.sorted = {}
+
+    def zones(self, key):
+        """Get the sorted names of the time zones using an offset or an
+        abbreviation.
+        """
+
+        try:
+            names = self.sorted[key]
+        except KeyError:
+            if isinstance(key, str):
+                groups = self.abbreviations
+            else:
+                groups = self.offsets
+            names = self.sorted[key] = sorted(groups.get(key, ()))
+        return list(names)
+
+
+class DatetimeColumn(object):
+    """An array of instants in a single time zone.
+
+    The instants are stored as 64-bit integers counting microseconds
+    since the Unix epoch. The methods of the column work on those
+    integers directly, looking up UTC offsets in a table of the time
+    zone's transitions, so no ``datetime`` objects are created for the
+    individual values.
+
+    The values can be shared with other libraries without copying them
+    through ``to_buffer()``, ``from_buffer()``, ``to_arrow()`` and
+    ``from_arrow()``. On Python 3.12 and newer, the column also supports
+    the buffer protocol directly, e.g. ``memoryview(column)``.
+
+    Items of the column are :class:`Instant` objects. Slicing returns a
+    new column. ``<``, ``<=``, ``>`` and ``>=`` compare every value in
+    the column to a datetime, an :class:`Instant` or another column and
+    return a list of ``bool``; ``==`` compares entire columns.
+
+    If no value is provided for ``tz``, the current system time zone
+    will be used. If the ``utc`` parameter is set to ``True`` or
+    ``set_utc()`` has been called, however, UTC will be used instead.
+
+    :param microseconds: The number of microseconds since the epoch of
+                         each value.
+    :type microseconds: iterable of int.
+    :param tz: The time zone of the column.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, microseconds=(), tz=None, utc=False):
+        if (isinstance(microseconds, array.array)
+                and microseconds.typecode == 'q'):
+            self._data = microseconds
+        else:
+            self._data = array.array('q', microseconds)
+        self._zone = _zone_id(_resolve_timezone(tz, utc))
+
+    def __buffer__(self, flags):
+        return memoryview(self._data)
+
+    @classmethod
+    def _from_zone_id(cls, data, zone):
+        column = cls.__new__(cls)
+        column._data = data
+        column._zone = zone
+        return column
+
+    @classmethod
+    def from_arrow(cls, values):
+        """Get a column from a ``pyarrow`` timestamp array.
+
+        Arrays with a unit of microseconds share their memory with the
+        column. Other units are converted. Arrays without a time zone
+        are assumed to be in UTC.
+
+        :param values: The timestamps.
+        :type values: pyarrow.TimestampArray.
+        :returns: when.DatetimeColumn -- the column.
+        :raises: TypeError, ValueError
+        """
+
+        import pyarrow
+
+        if isinstance(values, pyarrow.ChunkedArray):
+            values = values.combine_chunks()
+        if not pyarrow.types.is_timestamp(values.type):
+            message = "'{0}' is not a timestamp type."
+            raise TypeError(message.format(values.type))
+        if values.null_count:
+            raise ValueError('Timestamps must not be null.')
+
+        tz = values.type.tz or pytz.UTC
+        if not isinstance(tz, datetime.tzinfo) and tz[0] in '+-':
+            # Arrow allows fixed offsets as time zones.
+            hours, minutes = tz[1:].split(':')
+            minutes = int(hours) * 60 + int(minutes)
+            tz = pytz.FixedOffset(-minutes if tz[0] == '-' else minutes)
+        if values.type.unit != 'us':
+            values = values.cast(pyarrow.timestamp('us', tz=values.type.tz))
+
+        data = memoryview(values.buffers()[1]).cast('B').cast('q')
+        data = data[values.offset:values.offset + len(values)]
+        return cls._from_zone_id(data, _zone_id(_resolve_timezone(tz)))
+
+    @classmethod
+    def from_buffer(cls, buffer, tz=None, utc=False):
+        """Get a column that shares the memory of a buffer.
+
+        The buffer must hold native 64-bit integers counting
+        microseconds since the Unix epoch, such as an ``array('q')``,
+        a ``bytearray`` or a NumPy ``int64`` array. Writing to the
+        buffer changes the values in the column.
+
+        :param buffer: An object supporting the buffer protocol.
+        :param tz: The time zone of the column.
+        :type tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.DatetimeColumn -- the column.
+        :raises: TypeError, ValueError
+        """
+
+        data = memoryview(buffer)
+        if data.format != 'q':
+            data = data.cast('B').cast('q')
+        return cls._from_zone_id(data, _zone_id(_resolve_timezone(tz, utc)))
+
+    @classmethod
+    def from_datetimes(cls, values, tz=None, utc=False):
+        """Get a column from datetimes.
+
+        Time zone naive datetimes are assumed to be in the time zone of
+        the column. Time zone aware datetimes are converted to it.
+
+        :param values: The datetimes.
+        :type values: iterable of datetime.datetime.
+        :param tz: The time zone of the column.
+        :type tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.DatetimeColumn -- the column.
+        :raises: TypeError
+        """
+
+        zone = _zone_id(_resolve_timezone(tz, utc))
+        table = _zone_table(zone)
+
+        data = array.array('q')
+        for value in values:
+            if not isinstance(value, datetime.datetime):
+                message = "'{0}' object is not a valid datetime."
+                raise TypeError(message.format(type(value).__name__))
+            if value.tzinfo is None:
+                data.append(table.to_utc(_naive_microseconds(value)))
+            else:
+                data.append(_epoch_microseconds(value))
+
+        return cls._from_zone_id(data, zone)
+
+    @property
+    def microseconds(self):
+        """The number of microseconds since the epoch of each value."""
+
+        return self._data
+
+    @property
+    def tzinfo(self):
+        """The time zone of the column."""
+
+        return _ZONES[self._zone]
+
+    @property
+    def zone(self):
+        """The name of the time zone of the column."""
+
+        return Instant._from_zone_id(0, self._zone).zone
+
+    def _walls(self):
+        """Get the wall time of each value, in microseconds."""
+
+        table = _zone_table(self._zone)
+        if len(table.offsets) == 1:
+            offset = table.offsets[0]
+            return [value + offset for value in self._data]
+
+        starts, offsets = table.starts, table.offsets
+        bisect_right = bisect.bisect_right
+        return [value + offsets[bisect_right(starts, value) - 1]
+                for value in self._data]
+
+    def _compare(self, other, compare):
+        if isinstance(other, DatetimeColumn):
+            if len(other) != len(self):
+                raise ValueError('Columns must have the same length.')
+            return [compare(a, b) for a, b in zip(self._data, other._data)]
+
+        other = _instant_microseconds(other, self._zone)
+        return [compare(value, other) for value in self._data]
+
+    def __eq__(self, other):
+        if not isinstance(other, DatetimeColumn):
+            return NotImplemented
+        return self._data == other._data
+
+    def __ne__(self, other):
+        if not isinstance(other, DatetimeColumn):
+            return NotImplemented
+        return self._data != other._data
+
+    __hash__ = None
+
+    def __lt__(self, other):
+        return self._compare(other, lambda a, b: a < b)
+
+    def __le__(self, other):
+        return self._compare(other, lambda a, b: a <= b)
+
+    def __gt__(self, other):
+        return self._compare(other, lambda a, b: a > b)
+
+    def __ge__(self, other):
+        return self._compare(other, lambda a, b: a >= b)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._from_zone_id(self._data[index], self._zone)
+        return Instant._from_zone_id(self._data[index], self._zone)
+
+    def __iter__(self):
+        zone = self._zone
+        for value in self._data:
+            yield Instant._from_zone_id(value, zone)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return '<when.DatetimeColumn of {0} values in {1}>'.format(
+            len(self), self.zone)
+
+    def add(self, years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
+            seconds=0, milliseconds=0, microseconds=0):
+        """Add units of time to every value.
+
+        The units are added to the wall time of each value in the
+        column's time zone, exactly as ``_add_time()`` adds them to the
+        datetimes returned by ``shift()``.
+
+        :returns: when.DatetimeColumn -- a new column.
+        """
+
+        delta = (((weeks * 7 + days) * 24 + hours) * 60 + minutes) * 60
+        delta = ((delta + seconds) * 1000000 + milliseconds * 1000
+                 + microseconds)
+        months += years * 12
+
+        table = _zone_table(self._zone)
+        walls = self._walls()
+        if months:
+            walls = [_add_months(wall + delta, months) for wall in walls]
+        elif delta:
+            walls = [wall + delta for wall in walls]
+
+        data = array.array('q', [table.to_utc(wall) for wall in walls])
+        return self._from_zone_id(data, self._zone)
+
+    def floor(self, unit):
+        """Round every value down to the start of a unit of time.
+
+        The start of the unit is found in the column's time zone. Weeks
+        start on Monday.
+
+        :param unit: One of ``'year'``, ``'month'``, ``'week'``,
+                     ``'day'``, ``'hour'``, ``'minute'`` or
+                     ``'second'``.
+        :type unit: str.
+        :returns: when.DatetimeColumn -- a new column.
+        :raises: ValueError
+        """
+
+        return self._from_zone_id(_round(self._data, unit, self._zone),
+                                  self._zone)
+
+    def format(self, format_string, locale=None):
+        """Get a formatted version of every value.
+
+        This is equivalent to calling ``when.format()`` for the aware
+        datetime of each value, but the common directives are rendered
+        directly from the integers.
+
+        :param format_string: A string specifying formatting the
+                              directives or to use.
+        :type format_string: str.
+        :param locale: The name of the locale to use instead of the
+                       current one.
+        :type locale: str.
+        :returns: list -- the formatted values.
+        :raises: ValueError
+        """
+
+        names = None if locale is None else _locale_names(locale)
+        render = _compile_format(_expand_format(format_string, names), names)
+        table = _zone_table(self._zone)
+        starts, offsets, names = table.starts, table.offsets, table.names
+        bisect_right = bisect.bisect_right
+
+        results = []
+        for value in self._data:
+            index = bisect_right(starts, value) - 1
+            results.append(render(value + offsets[index], offsets[index],
+                                  names[index]))
+        return results
+
+    def searchsorted(self, value, side='left'):
+        """Find where a value would be inserted to keep the column
+        sorted.
+
+        The column must already be sorted.
+
+        :param value: The value to look for.
+        :type value: datetime.datetime, when.Instant.
+        :param side: ``'left'`` to get the position before any equal
+                     values, ``'right'`` to get the position after them.
+        :type side: str.
+        :returns: int -- the position.
+        :raises: TypeError, ValueError
+        """
+
+        if side not in ('left', 'right'):
+            raise ValueError("The value of 'side' must be 'left' or 'right'.")
+
+        value = _instant_microseconds(value, self._zone)
+        if side == 'left':
+            return bisect.bisect_left(self._data, value)
+        return bisect.bisect_right(self._data, value)
+
+    def shift_to(self, to_tz=None, utc=False):
+        """Get the same instants in another time zone.
+
+        Only the time zone of the column changes. The new column shares
+        its values with this one.
+
+        :param to_tz: The time zone to shift to.
+        :type to_tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.DatetimeColumn -- the shifted column.
+        """
+
+        zone = _zone_id(_resolve_timezone(to_tz, utc))
+        return self._from_zone_id(self._data, zone)
+
+    def to_arrow(self):
+        """Get a ``pyarrow`` array of ``timestamp[us, tz]`` values.
+
+        The array shares its memory with the column whenever the column
+        is contiguous in memory.
+
+        :returns: pyarrow.TimestampArray -- the timestamps.
+        """
+
+        import pyarrow
+
+        tz = _ZONES[self._zone]
+        zone = getattr(tz, 'zone', None)
+        if not zone:
+            offset = _zone_table(self._zone).offsets[0] // 60000000
+            zone = '{0}{1:02d}:{2:02d}'.format('-' if offset < 0 else '+',
+                                               *divmod(abs(offset), 60))
+
+        data = self._data
+        if isinstance(data, memoryview) and not data.contiguous:
+            data = array.array('q', data)
+        return pyarrow.Array.from_buffers(pyarrow.timestamp('us', tz=zone),
+                                          len(data),
+                                          [None, pyarrow.py_buffer(data)])
+
+    def to_buffer(self):
+        """Get a ``memoryview`` of the values of the column.
+
+        The values are native 64-bit integers counting microseconds
+        since the Unix epoch. The view shares the column's memory.
+
+        :returns: memoryview -- the values.
+        """
+
+        return memoryview(self._data)
+
+    def to_datetimes(self, aware=False):
+        """Get the datetime of every value in the column's time zone.
+
+        By default the datetimes are time zone naive, like the datetimes
+        returned by ``shift()``. Use ``aware=True`` to keep the
+        difference between the wall times repeated when daylight saving
+        time ends.
+
+        :param aware: Whether or not to return time zone aware
+                      datetimes.
+        :type aware: bool.
+        :returns: list -- the datetimes.
+        """
+
+        if aware:
+            tz = _ZONES[self._zone]
+            return [_from_epoch_microseconds(value, tz)
+                    for value in self._data]
+
+        return [_EPOCH + datetime.timedelta(microseconds=wall)
+                for wall in self._walls()]
+
+
+class TimeIndex(object):
+    """A sorted index of items by time.
+
+    The index is built from datetimes, :class:`Instant` objects or a
+    :class:`DatetimeColumn`. Each one can be associated with an item,
+    which is what the queries return. Without items, the queries return
+    the values as :class:`Instant` objects. ``between()``,
+    ``before()``, ``after()`` and ``nearest()`` take O(log n) time.
+
+    Values added with ``add()`` are collected and sorted into a run of
+    recent values the next time the index is queried, and queries
+    search both runs. The recent values are only merged into the main
+    run once there are more than about the square root of its length of
+    them, so adding values one at a time between queries takes
+    O(sqrt n) amortized time rather than O(n).
+
+    Time zone naive datetimes, both in the index and in queries, are
+    assumed to be in the time zone of the index. If no value is provided
+    for ``tz``, the current system time zone will be used. If the
+    ``utc`` parameter is set to ``True`` or ``set_utc()`` has been
+    called, however, UTC will be used instead.
+
+    :param values: The times of the items.
+    :type values: iterable of datetime.datetime, when.Instant or
+                  when.DatetimeColumn.
+    :param items: The items, in the same order as ``values``.
+    :type items: iterable.
+    :param tz: The time zone of the index.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, values=(), items=None, tz=None, utc=False):
+        if isinstance(values, DatetimeColumn) and tz is None and not utc:
+            self._column = DatetimeColumn._from_zone_id(array.array('q'),
+                                                        values._zone)
+        else:
+            self._column = DatetimeColumn(tz=tz, utc=utc)
+
+        if isinstance(values, DatetimeColumn):
+            keys = array.array('q', values.microseconds)
+        else:
+            keys = array.array('q', [self._key(value) for value in values])
+
+        if items is not None:
+            items = list(items)
+            if len(items) != len(keys):
+                message = "'values' and 'items' must have the same length."
+                raise ValueError(message)
+
+        # Each run is a pair of keys and items. Without items, the items
+        # are the values themselves and the lists of items are None.
+        self._run = (array.array('q'), None if items is None else [])
+        self._recent = (array.array('q'), None if items is None else [])
+        self._pending = (keys, items)
+
+    def __iter__(self):
+        self._merge()
+        return iter(self._combine([(run, 0, len(run[0]))
+                                   for run in (self._run, self._recent)]))
+
+    def __len__(self):
+        return len(self._run[0]) + len(self._recent[0]) + len(self._pending[0])
+
+    def __repr__(self):
+        return '<when.TimeIndex of {0} items in {1}>'.format(
+            len(self), self.zone)
+
+    @property
+    def zone(self):
+        """The name of the time zone of the index."""
+
+        return self._column.zone
+
+    def _combine(self, slices):
+        """Get the items of slices of runs, in the order of their keys.
+
+        Items with the same key keep the order of the runs.
+        """
+
+        slices = [(run, start, stop) for run, start, stop in slices
+                  if start < stop]
+        if not slices:
+            return []
+        if len(slices) == 1:
+            return self._slice(*slices[0])
+
+        pairs = []
+        for run, start, stop in slices:
+            pairs.extend(zip(run[0][start:stop],
+                             self._slice(run, start, stop)))
+        pairs.sort(key=lambda pair: pair[0])
+        return [pair[1] for pair in pairs]
+
+    def _key(self, value):
+        return _instant_microseconds(value, self._column._zone)
+
+    def _merge(self):
+        """Sort the values added since the last query into the run of
+        recent values, and merge that into the main run once it's grown
+        past the square root of the main run's length.
+        """
+
+        if self._pending[0]:
+            self._recent = self._merge_runs(self._recent, self._pending)
+            self._pending = (array.array('q'),
+                             None if self._pending[1] is None else [])
+
+        if len(self._recent[0]) ** 2 > max(len(self._run[0]), 4096):
+            self._run = self._merge_runs(self._run, self._recent)
+            self._recent = (array.array('q'),
+                            None if self._recent[1] is None else [])
+
+    @staticmethod
+    def _merge_runs(run, other):
+        """Merge a sorted run with another run.
+
+        The sort used by ``sorted()`` finds and merges runs, so this is
+        linear in the size of ``run`` plus n log n in the size of
+        ``other``. Values from ``run`` come first when keys are equal.
+        """
+
+        keys, items = run
+        other_keys, other_items = other
+        if items is None:
+            return array.array('q', sorted(keys + other_keys)), None
+
+        pairs = sorted(itertools.chain(zip(keys, items),
+                                       zip(other_keys, other_items)),
+                       key=lambda pair: pair[0])
+        return (array.array('q', [pair[0] for pair in pairs]),
+                [pair[1] for pair in pairs])
+
+    def _query(self, search):
+        """Get the key and position of the item found by ``search`` in
+        each run that has one, for the queries to choose between.
+        """
+
+        self._merge()
+        found = []
+        for run in (self._run, self._recent):
+            index = search(run[0])
+            if 0 <= index < len(run[0]):
+                found.append((run[0][index], run, index))
+        return found
+
+    def _slice(self, run, start, stop):
+        keys, items = run
+        if items is not None:
+            return items[start:stop]
+
+        zone = self._column._zone
+        return [Instant._from_zone_id(key, zone) for key in keys[start:stop]]
+
+    def add(self, value, item=None):
+        """Add a value to the index.
+
+        :param value: The time of the item.
+        :type value: datetime.datetime, when.Instant.
+        :param item: The item. Defaults to the value as an
+                     :class:`Instant`.
+        :raises: TypeError
+        """
+
+        key = self._key(value)
+        if item is not None and self._run[1] is None:
+            # Until now the items were the values themselves.
+            self._run, self._recent, self._pending = [
+                (keys, self._slice((keys, None), 0, len(keys)))
+                for keys, _ in (self._run, self._recent, self._pending)]
+
+        keys, items = self._pending
+        keys.append(key)
+        if items is not None:
+            if item is None:
+                item = Instant._from_zone_id(key, self._column._zone)
+            items.append(item)
+
+    def after(self, value):
+        """Get the first item after a time.
+
+        :param value: The time.
+        :type value: datetime.datetime, when.Instant.
+        :returns: the item, or ``None`` if there isn't one.
+        :raises: TypeError
+        """
+
+        key = self._key(value)
+        found = self._query(lambda keys: bisect.bisect_right(keys, key))
+        if not found:
+            return None
+        # min() keeps the first of equal keys, which is in the main run.
+        _, run, index = min(found, key=lambda candidate: candidate[0])
+        return self._slice(run, index, index + 1)[0]
+
+    def before(self, value):
+        """Get the last item before a time.
+
+        :param value: The time.
+        :type value: datetime.datetime, when.Instant.
+        :returns: the item, or ``None`` if there isn't one.
+        :raises: TypeError
+        """
+
+        key = self._key(value)
+        found = self._query(lambda keys: bisect.bisect_left(keys, key) - 1)
+        if not found:
+            return None
+        # Of equal keys, the last one is in the run of recent values.
+        _, run, index = max(reversed(found),
+                            key=lambda candidate: candidate[0])
+        return self._slice(run, index, index + 1)[0]
+
+    def between(self, start, end):
+        """Get the items from ``start`` up to, but not including,
+        ``end``.
+
+        :param start: The beginning of the period.
+        :type start: datetime.datetime, when.Instant.
+        :param end: The end of the period.
+        :type end: datetime.datetime, when.Instant.
+        :returns: list -- the items, in order.
+        :raises: TypeError
+        """
+
+        self._merge()
+        start, end = self._key(start), self._key(end)
+        slices = []
+        for run in (self._run, self._recent):
+            first = bisect.bisect_left(run[0], start)
+            slices.append((run, first, bisect.bisect_left(run[0], end, first)))
+        return self._combine(slices)
+
+    def nearest(self, value):
+        """Get the item closest to a time.
+
+        When two items are equally close, the earlier one is returned.
+
+        :param value: The time.
+        :type value: datetime.datetime, when.Instant.
+        :returns: the item, or ``None`` if the index is empty.
+        :raises: TypeError
+        """
+
+        key = self._key(value)
+
+        def search(keys):
+            index = bisect.bisect_left(keys, key)
+            if index == len(keys) or (index and key - keys[index - 1]
+                                      <= keys[index] - key):
+                index -= 1
+            return index
+
+        found = self._query(search)
+        if not found:
+            return None
+        # Of equal keys, the last one before the time and the first one
+        # after it are closest, as they would be in a single run.
+        _, run, index = min(found, key=lambda candidate: (
+            abs(candidate[0] - key), candidate[0],
+            (candidate[0] < key) == (candidate[1] is self._run)))
+        return self._slice(run, index, index + 1)[0]
+
+
+class Interval(object):
+    """A period of time from ``start`` up to, but not including, ``end``.
+
+    Like :class:`Instant`, an interval only stores microseconds since
+    the Unix epoch and an interned time zone. Time zone naive datetimes
+    are assumed to be in the time zone specified by ``tz``, defaulting
+    like the ``from_tz`` parameter of ``shift()``. Time zone aware
+    datetimes and :class:`Instant` objects can also be used.
+
+    :param start: The beginning of the interval.
+    :type start: datetime.datetime, when.Instant.
+    :param end: The end of the interval.
+    :type end: datetime.datetime, when.Instant.
+    :param tz: The time zone of the interval.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    __slots__ = ('_start', '_end', '_zone')
+
+    def __init__(self, start, end, tz=None, utc=False):
+        self._zone = _zone_id(_resolve_timezone(tz, utc))
+        self._start = _instant_microseconds(start, self._zone)
+        self._end = _instant_microseconds(end, self._zone)
+
+        if self._end < self._start:
+            message = ("The value of 'start' must not be after the value of "
+                       "'end'.")
+            raise ValueError(message)
+
+    @classmethod
+    def _from_zone_id(cls, start, end, zone):
+        interval = cls.__new__(cls)
+        interval._start = start
+        interval._end = end
+        interval._zone = zone
+        return interval
+
+    @property
+    def duration(self):
+        """The length of the interval as a ``datetime.timedelta``."""
+
+        return datetime.timedelta(microseconds=self._end - self._start)
+
+    @property
+    def end(self):
+        """The end of the interval, like the datetimes returned by
+        ``shift()``.
+        """
+
+        return Instant._from_zone_id(self._end, self._zone).to_datetime()
+
+    @property
+    def start(self):
+        """The beginning of the interval, like the datetimes returned by
+        ``shift()``.
+        """
+
+        return Instant._from_zone_id(self._start, self._zone).to_datetime()
+
+    @property
+    def zone(self):
+        """The name of the time zone of the interval."""
+
+        return Instant._from_zone_id(0, self._zone).zone
+
+    def contains(self, value):
+        """Check if the interval contains a time or another interval.
+
+        :param value: The time or interval.
+        :type value: datetime.datetime, when.Instant, when.Interval.
+        :returns: bool -- if ``value`` is within the interval.
+        :raises: TypeError
+        """
+
+        if isinstance(value, Interval):
+            return self._start <= value._start and value._end <= self._end
+
+        value = _instant_microseconds(value, self._zone)
+        return self._start <= value < self._end
+
+    def overlaps(self, other):
+        """Check if the interval overlaps another interval.
+
+        :param other: The other interval.
+        :type other: when.Interval.
+        :returns: bool -- if the intervals share any time.
+        """
+
+        return self._start < other._end and other._start < self._end
+
+    def shift(self, to_tz=None, utc=False):
+        """Get the same interval in another time zone.
+
+        :param to_tz: The time zone to shift to.
+        :type to_tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.Interval -- the shifted interval.
+        """
+
+        zone = _zone_id(_resolve_timezone(to_tz, utc))
+        return self._from_zone_id(self._start, self._end, zone)
+
+    def __eq__(self, other):
+        if not isinstance(other, Interval):
+            return NotImplemented
+        return (self._start, self._end) == (other._start, other._end)
+
+    def __ne__(self, other):
+        if not isinstance(other, Interval):
+            return NotImplemented
+        return (self._start, self._end) != (other._start, other._end)
+
+    def __lt__(self, other):
+        if not isinstance(other, Interval):
+            return NotImplemented
+        return (self._start, self._end) < (other._start, other._end)
+
+    def __hash__(self):
+        return hash((self._start, self._end))
+
+    def __reduce__(self):
+        return (Interval, (Instant._from_zone_id(self._start, self._zone),
+                           Instant._from_zone_id(self._end, self._zone),
+                           _zone_name(self._zone)))
+
+    def __repr__(self):
+        return '<when.Interval {0!r} to {1!r} in {2}>'.format(
+            self.start, self.end, self.zone)
+
+
+class IntervalIndex(object):
+    """An index of intervals for overlap queries.
+
+    The intervals are kept sorted by their start. An implicit balanced
+    tree over that order records the latest end in each subtree, so
+    queries skip every subtree that ends before the query begins. This
+    makes ``overlapping()`` and ``containing()`` take O(log n + k) time
+    for typical data, where k is the number of results.
+
+    Each interval can be associated with an item, which is what the
+    queries return. Without items, the queries return the intervals.
+    Intervals added with ``add()`` are merged into the index the next
+    time it's queried.
+
+    The time zone of the index is used for time zone naive datetimes in
+    queries and for the intervals returned by ``free()`` and
+    ``merged()``. If no value is provided for ``tz``, the current system
+    time zone will be used. If the ``utc`` parameter is set to ``True``
+    or ``set_utc()`` has been called, however, UTC will be used instead.
+
+    :param intervals: The intervals.
+    :type intervals: iterable of when.Interval.
+    :param items: The items, in the same order as ``intervals``.
+    :type items: iterable.
+    :param tz: The time zone of the index.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, intervals=(), items=None, tz=None, utc=False):
+        self._zone = _zone_id(_resolve_timezone(tz, utc))
+        self._starts = array.array('q')
+        self._ends = array.array('q')
+        self._max_ends = array.array('q')
+        self._items = []
+        self._pending = []
+
+        intervals = list(intervals)
+        items = intervals if items is None else list(items)
+        if len(items) != len(intervals):
+            message = "'intervals' and 'items' must have the same length."
+            raise ValueError(message)
+        for interval, item in zip(intervals, items):
+            self.add(interval, item)
+
+    @classmethod
+    def from_sorted(cls, intervals, items=None, tz=None, utc=False):
+        """Build an index from intervals already sorted by start.
+
+        This skips sorting the intervals, building the index in linear
+        time.
+
+        :param intervals: The intervals, sorted.
+        :type intervals: iterable of when.Interval.
+        :param items: The items, in the same order as ``intervals``.
+        :type items: iterable.
+        :param tz: The time zone of the index.
+        :type tz: datetime.tzinfo, str.
+        :param utc: Whether or not to use UTC instead of local time.
+        :type utc: bool.
+        :returns: when.IntervalIndex -- the index.
+        :raises: TypeError, ValueError
+        """
+
+        index = cls(tz=tz, utc=utc)
+        intervals = list(intervals)
+        items = intervals if items is None else list(items)
+        if len(items) != len(intervals):
+            message = "'intervals' and 'items' must have the same length."
+            raise ValueError(message)
+
+        previous = None
+        for interval in intervals:
+            if not isinstance(interval, Interval):
+                message = "'{0}' object is not a valid interval."
+                raise TypeError(message.format(type(interval).__name__))
+            if previous is not None and interval._start < previous:
+                raise ValueError('The intervals must be sorted by start.')
+            previous = interval._start
+            index._starts.append(interval._start)
+            index._ends.append(interval._end)
+
+        index._items = items
+        index._build()
+        return index
+
+    def __len__(self):
+        return len(self._starts) + len(self._pending)
+
+    def __repr__(self):
+        return '<when.IntervalIndex of {0} intervals>'.format(len(self))
+
+    def _build(self):
+        """Record the latest end of every subtree of the implicit tree.
+
+        The subtree of the positions ``[low, high)`` is rooted at
+        ``(low + high) // 2``, which is where its latest end is stored.
+        """
+
+        ends = self._ends
+        max_ends = self._max_ends = array.array('q', ends)
+
+        def build(low, high):
+            if low >= high:
+                return -2 ** 63
+            middle = (low + high) // 2
+            latest = max(ends[middle], build(low, middle),
+                         build(middle + 1, high))
+            max_ends[middle] = latest
+            return latest
+
+        build(0, len(ends))
+
+    def _merge(self):
+        if not self._pending:
+            return
+
+        entries = sorted(self._pending, key=lambda entry: entry[:2])
+        entries = sorted(itertools.chain(
+            zip(self._starts, self._ends, self._items), entries),
+            key=lambda entry: entry[:2])
+
+        self._starts = array.array('q', [entry[0] for entry in entries])
+        self._ends = array.array('q', [entry[1] for entry in entries])
+        self._items = [entry[2] for entry in entries]
+        self._pending = []
+        self._build()
+
+    def _overlapping(self, start, end):
+        """Get the positions of the intervals overlapping ``[start, end)``."""
+
+        starts, ends, max_ends = self._starts, self._ends, self._max_ends
+        # Only the intervals starting before `end` can overlap.
+        limit = bisect.bisect_left(starts, end)
+        positions = []
+
+        def search(low, high):
+            # Skip subtrees past `limit` or ending before `start`.
+            if low >= min(high, limit) or max_ends[(low + high) // 2] <= start:
+                return
+            middle = (low + high) // 2
+            search(low, middle)
+            if middle < limit and ends[middle] > start:
+                positions.append(middle)
+            search(middle + 1, high)
+
+        search(0, len(starts))
+        return positions
+
+    def _to_interval(self, value):
+        if not isinstance(value, Interval):
+            message = "'{0}' object is not a valid interval."
+            raise TypeError(message.format(type(value).__name__))
+        return value
+
+    def add(self, interval, item=None):
+        """Add an interval to the index.
+
+        :param interval: The interval.
+        :type interval: when.Interval.
+        :param item: The item. Defaults to the interval.
+        :raises: TypeError
+        """
+
+        interval = self._to_interval(interval)
+        self._pending.append((interval._start, interval._end,
+                              interval if item is None else item))
+
+    def containing(self, value):
+        """Get the items whose intervals contain a time.
+
+        :param value: The time.
+        :type value: datetime.datetime, when.Instant.
+        :returns: list -- the items, ordered by the start of their
+                  intervals.
+        :raises: TypeError
+        """
+
+        self._merge()
+        value = _instant_microseconds(value, self._zone)
+        return [self._items[position]
+                for position in self._overlapping(value, value + 1)]
+
+    def free(self, interval, duration=None):
+        """Get the gaps between the intervals during a period.
+
+        :param interval: The period to search.
+        :type interval: when.Interval.
+        :param duration: The shortest gap to include.
+        :type duration: datetime.timedelta.
+        :returns: list -- the gaps, as intervals in the time zone of the
+                  index.
+        :raises: TypeError
+        """
+
+        self._merge()
+        interval = self._to_interval(interval)
+        shortest = 1 if duration is None else max(
+            1, _timedelta_microseconds(duration))
+
+        gaps = []
+        current = interval._start
+        for position in self._overlapping(interval._start, interval._end):
+            start = self._starts[position]
+            if start - current >= shortest:
+                gaps.append(Interval._from_zone_id(current, start, self._zone))
+            current = max(current, self._ends[position])
+        if interval._end - current >= shortest:
+            gaps.append(Interval._from_zone_id(current, interval._end,
+                                               self._zone))
+        return gaps
+
+    def merged(self):
+        """Get the union of the intervals in the index.
+
+        Overlapping and adjacent intervals are merged into one.
+
+        :returns: list -- the merged intervals, in the time zone of the
+                  index.
+        """
+
+        self._merge()
+        merged = []
+        for start, end in zip(self._starts, self._ends):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [Interval._from_zone_id(start, end, self._zone)
+                for start, end in merged]
+
+    def overlapping(self, interval):
+        """Get the items whose intervals overlap an interval.
+
+        :param interval: The interval.
+        :type interval: when.Interval.
+        :returns: list -- the items, ordered by the start of their
+                  intervals.
+        :raises: TypeError
+        """
+
+        self._merge()
+        interval = self._to_interval(interval)
+        return [self._items[position] for position in
+                self._overlapping(interval._start, interval._end)]
+
+    def within(self, interval):
+        """Get the items whose intervals are within an interval.
+
+        :param interval: The interval.
+        :type interval: when.Interval.
+        :returns: list -- the items, ordered by the start of their
+                  intervals.
+        :raises: TypeError
+        """
+
+        self._merge()
+        interval = self._to_interval(interval)
+        first = bisect.bisect_left(self._starts, interval._start)
+        # Empty intervals starting at the end are within it too.
+        last = bisect.bisect_right(self._starts, interval._end, first)
+        return [self._items[position] for position in _range(first, last)
+                if self._ends[position] <= interval._end]
+
+
+class Transition(object):
+    """A change of the UTC offset, daylight saving time or abbreviation
+    used in a time zone.
+
+    Transitions are returned by ``transitions()`` and
+    ``next_transition()`` and only store the interned id of their time
+    zone and their position in its cached table of transitions.
+
+    .. versionadded:: 0.5.0
+    """
+
+    __slots__ = ('_zone', '_index')
+
+    @classmethod
+    def _from_zone_id(cls, zone, index):
+        transition = cls.__new__(cls)
+        transition._zone = zone
+        transition._index = index
+        return transition
+
+    @property
+    def after(self):
+        """The UTC offset used from the transition on."""
+
+        offset = _zone_table(self._zone).offsets[self._index]
+        return datetime.timedelta(microseconds=offset)
+
+    @property
+    def before(self):
+        """The UTC offset used until the transition."""
+
+        offset = _zone_table(self._zone).offsets[self._index - 1]
+        return datetime.timedelta(microseconds=offset)
+
+    @property
+    def dst(self):
+        """Whether or not daylight saving time is used from the transition
+        on.
+        """
+
+        return _zone_table(self._zone).dsts[self._index]
+
+    @property
+    def instant(self):
+        """The :class:`Instant` at which the transition happens."""
+
+        start = _zone_table(self._zone).starts[self._index]
+        return Instant._from_zone_id(start, self._zone)
+
+    @property
+    def name(self):
+        """The abbreviation used from the transition on."""
+
+        return _zone_table(self._zone).names[self._index]
+
+    @property
+    def zone(self):
+        """The name of the time zone of the transition."""
+
+        return Instant._from_zone_id(0, self._zone).zone
+
+    def __eq__(self, other):
+        if not isinstance(other, Transition):
+            return NotImplemented
+        return (self._zone, self._index) == (other._zone, other._index)
+
+    def __ne__(self, other):
+        if not isinstance(other, Transition):
+            return NotImplemented
+        return (self._zone, self._index) != (other._zone, other._index)
+
+    def __hash__(self):
+        return hash((self._zone, self._index))
+
+    def __reduce__(self):
+        start = _zone_table(self._zone).starts[self._index]
+        return (next_transition,
+                (_zone_name(self._zone),
+                 Instant._from_zone_id(start - 1, self._zone)))
+
+    def __repr__(self):
+        return '<when.Transition at {0!r} in {1}: {2} to {3}>'.format(
+            self.instant.to_datetime(), self.zone, self.before, self.after)
+
+
+class BusinessCalendar(object):
+    """Business days: every day except weekends and holidays.
+
+    Days are counted with ordinals (see ``datetime.date.toordinal()``).
+    For each year that is used, the calendar stores the number of
+    business days before it and a running count of the business days in
+    it, a bitmap of the year with prefix sums. Counting or adding
+    business days then only takes a lookup per value instead of a loop
+    over the days in between.
+
+    :param holidays: The days that aren't business days.
+    :type holidays: iterable of datetime.date.
+    :param weekend: The days of the week that aren't business days, from
+                    0 for Monday to 6 for Sunday.
+    :type weekend: iterable of int.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, holidays=(), weekend=(5, 6)):
+        weekend = set(weekend)
+        if not weekend <= set(_range(7)):
+            raise ValueError("The days of 'weekend' must be from 0 to 6.")
+        if len(weekend) == 7:
+            raise ValueError('A business calendar needs at least one '
+                             'business day each week.')
+
+        # The number of business days in a week before each day of it.
+        self._week = [0]
+        for day in _range(7):
+            self._week.append(self._week[-1] + (day not in weekend))
+        self._weekend = weekend
+
+        ordinals = set()
+        for holiday in holidays:
+            ordinals.add(self._ordinal(holiday))
+        # Holidays on the weekend don't change the count.
+        self._holidays = sorted(ordinal for ordinal in ordinals
+                                if (ordinal - 1) % 7 not in weekend)
+
+        self._years = {}
+
+    def add_business_days(self, value, days):
+        """Add business days to a date.
+
+        The result is the business day that is ``days`` business days
+        after ``value``, or before it if ``days`` is negative. Adding 0
+        business days moves days that aren't business days forward to
+        the next business day. The time of datetimes is kept.
+
+        :param value: The date.
+        :type value: datetime.date, datetime.datetime.
+        :param days: The number of business days to add.
+        :type days: int.
+        :returns: datetime.date, datetime.datetime -- the calculated
+                  date.
+        :raises: TypeError
+        """
+
+        ordinal = self._ordinal(value)
+        if days > 0:
+            index = self._count(ordinal + 1) + days - 1
+        else:
+            index = self._count(ordinal) + days
+        return value + datetime.timedelta(days=self._find(index) - ordinal)
+
+    def add_business_days_many(self, values, days):
+        """Add business days to many dates.
+
+        :param values: The dates.
+        :type values: iterable of datetime.date or datetime.datetime.
+        :param days: The number of business days to add to all of the
+                     dates, or to each of them.
+        :type days: int, iterable of int.
+        :returns: list -- the calculated dates.
+        :raises: TypeError, ValueError
+        """
+
+        if isinstance(days, int):
+            return [self.add_business_days(value, days) for value in values]
+
+        values, days = list(values), list(days)
+        if len(values) != len(days):
+            raise ValueError("'values' and 'days' must have the same length.")
+        return [self.add_business_days(value, count)
+                for value, count in zip(values, days)]
+
+    def business_days_between(self, start, end):
+        """Count the business days from ``start`` up to, but not
+        including, ``end``.
+
+        :param start: The first date.
+        :type start: datetime.date, datetime.datetime.
+        :param end: The last date.
+        :type end: datetime.date, datetime.datetime.
+        :returns: int -- the number of business days, negative if
+                  ``end`` is before ``start``.
+        :raises: TypeError
+        """
+
+        return (self._count(self._ordinal(end))
+                - self._count(self._ordinal(start)))
+
+    def business_days_between_many(self, starts, ends):
+        """Count the business days between many pairs of dates.
+
+        :param starts: The first dates.
+        :type starts: iterable of datetime.date or datetime.datetime.
+        :param ends: The last dates.
+        :type ends: iterable of datetime.date or datetime.datetime.
+        :returns: list -- the number of business days between each pair.
+        :raises: TypeError, ValueError
+        """
+
+        starts, ends = list(starts), list(ends)
+        if len(starts) != len(ends):
+            raise ValueError("'starts' and 'ends' must have the same length.")
+        return [self.business_days_between(start, end)
+                for start, end in zip(starts, ends)]
+
+    def is_business_day(self, value):
+        """Check if a date is a business day.
+
+        :param value: The date.
+        :type value: datetime.date, datetime.datetime.
+        :returns: bool -- if ``value`` is a business day.
+        :raises: TypeError
+        """
+
+        ordinal = self._ordinal(value)
+        first, _, counts = self._year(datetime.date.fromordinal(ordinal).year)
+        return counts[ordinal - first + 1] > counts[ordinal - first]
+
+    def _count(self, ordinal):
+        """Count the business days before an ordinal."""
+
+        first, before, counts = self._year(
+            datetime.date.fromordinal(ordinal).year)
+        return before + counts[ordinal - first]
+
+    def _find(self, index):
+        """Get the ordinal of a business day from the number of business
+        days before it.
+        """
+
+        # Estimate the year without holidays, then with the holidays
+        # before the estimate, and step from there.
+        estimate = self._weekday_ordinal(index)
+        estimate = self._weekday_ordinal(
+            index + bisect.bisect_left(self._holidays, estimate))
+        year = datetime.date.fromordinal(
+            min(max(estimate, 1), datetime.date.max.toordinal())).year
+
+        while True:
+            first, before, counts = self._year(year)
+            if index < before:
+                year -= 1
+            elif index >= before + counts[-1]:
+                year += 1
+            else:
+                break
+        return first + bisect.bisect_right(counts, index - before) - 1
+
+    def _ordinal(self, value):
+        if not isinstance(value, datetime.date):
+            message = "'{0}' object is not a valid date."
+            raise TypeError(message.format(type(value).__name__))
+        return value.toordinal()
+
+    def _weekday_count(self, ordinal):
+        """Count the days before an ordinal that aren't on the weekend."""
+
+        # Ordinal 1 is a Monday.
+        weeks, day = divmod(ordinal - 1, 7)
+        return weeks * self._week[7] + self._week[day]
+
+    def _weekday_ordinal(self, index):
+        """Get the ordinal of the day with ``index`` days before it that
+        aren't on the weekend.
+        """
+
+        weeks, index = divmod(index, self._week[7])
+        return 1 + weeks * 7 + bisect.bisect_right(self._week, index) - 1
+
+    def _year(self, year):
+        """Get the first ordinal of a year, the number of business days
+        before it and the running count of business days in it.
+        """
+
+        try:
+            return self._years[year]
+        except KeyError:
+            pass
+
+        first = datetime.date(year, 1, 1).toordinal()
+        length = 366 if calendar.isleap(year) else 365
+        holidays = self._holidays
+        holiday = bisect.bisect_left(holidays, first)
+        before = self._weekday_count(first) - holiday
+
+        counts = array.array('H', [0])
+        count = 0
+        for ordinal in _range(first, first + length):
+            if holiday < len(holidays) and holidays[holiday] == ordinal:
+                holiday += 1
+            elif (ordinal - 1) % 7 not in self._weekend:
+                count += 1
+            counts.append(count)
+
+        result = self._years[year] = (first, before, counts)
+        return result
+
+
+class HybridLogicalClock(object):
+    """A hybrid logical clock for ordering events across nodes.
+
+    Timestamps are 64-bit integers made of the number of milliseconds
+    since the Unix epoch (48 bits) and a logical counter (16 bits). They
+    stay close to the physical clock, but a timestamp made after
+    receiving another one with ``update()`` is always greater than it,
+    even if the clocks of the nodes are skewed. When the counter runs
+    out, the next millisecond is used.
+
+    :param clock: A function returning the number of milliseconds since
+                  the Unix epoch. Defaults to the system clock used by
+                  ``now()``.
+    :type clock: callable.
+    :param max_offset: The most that received timestamps may be ahead of
+                       the physical clock. Defaults to no limit.
+    :type max_offset: datetime.timedelta.
+
+    .. versionadded:: 0.5.0
+    """
+
+    LOGICAL_BITS = 16
+    PHYSICAL_BITS = 48
+
+    def __init__(self, clock=None, max_offset=None):
+        self._clock = clock or (lambda: int(time.time() * 1000))
+        self._max_offset = None
+        if max_offset is not None:
+            self._max_offset = _timedelta_microseconds(max_offset) // 1000
+        self._lock = threading.Lock()
+        self._physical = 0
+        self._logical = 0
+
+    def decode(self, timestamp):
+        """Get the parts of a timestamp.
+
+        :param timestamp: The timestamp.
+        :type timestamp: int.
+        :returns: tuple -- the naive UTC datetime of the physical part of
+                  the timestamp and its logical counter.
+        """
+
+        milliseconds = timestamp >> self.LOGICAL_BITS
+        return (_EPOCH + datetime.timedelta(milliseconds=milliseconds),
+                timestamp & ((1 << self.LOGICAL_BITS) - 1))
+
+    def now(self):
+        """Get a timestamp for an event on this node.
+
+        :returns: int -- the timestamp.
+        """
+
+        physical = self._clock()
+        with self._lock:
+            if physical > self._physical:
+                self._physical, self._logical = physical, 0
+            else:
+                self._logical += 1
+            return self._timestamp()
+
+    def update(self, remote):
+        """Get a timestamp for receiving an event from another node.
+
+        :param remote: The timestamp of the event.
+        :type remote: int.
+        :returns: int -- the timestamp, which is greater than both
+                  ``remote`` and every timestamp from this clock so far.
+        :raises: TypeError, ValueError
+        """
+
+        if (isinstance(remote, bool)
+                or not isinstance(remote, numbers.Integral)):
+            message = "'{0}' object is not a valid timestamp."
+            raise TypeError(message.format(type(remote).__name__))
+        remote = int(remote)
+        if not 0 <= remote < 1 << (self.PHYSICAL_BITS + self.LOGICAL_BITS):
+            raise ValueError('The timestamp is outside of the range of the '
+                             'clock.')
+
+        physical = self._clock()
+        remote_physical = remote >> self.LOGICAL_BITS
+        remote_logical = remote & ((1 << self.LOGICAL_BITS) - 1)
+        if (self._max_offset is not None
+                and remote_physical - physical > self._max_offset):
+            raise ValueError('The timestamp is too far ahead of the clock.')
+
+        with self._lock:
+            latest = max(self._physical, remote_physical, physical)
+            if latest == self._physical == remote_physical:
+                self._logical = max(self._logical, remote_logical) + 1
+            elif latest == self._physical:
+                self._logical += 1
+            elif latest == remote_physical:
+                self._physical, self._logical = latest, remote_logical + 1
+            else:
+                self._physical, self._logical = latest, 0
+            return self._timestamp()
+
+    def _timestamp(self):
+        """Get the current timestamp, moving to the next millisecond if
+        the counter has run out.
+        """
+
+        if self._logical >> self.LOGICAL_BITS:
+            self._physical, self._logical = self._physical + 1, 0
+        return (self._physical << self.LOGICAL_BITS) | self._logical
+
+
+class IdGenerator(object):
+    """Unique, time ordered 64-bit IDs, like Twitter's Snowflake IDs.
+
+    Each ID packs the number of milliseconds since ``epoch`` (41 bits,
+    enough for 69 years), ``node_id`` (10 bits) and a sequence number
+    (12 bits) that counts the IDs made in the same millisecond, so IDs
+    from different nodes never collide and IDs from the same generator
+    always increase.
+
+    When the clock goes backward, the generator keeps using the latest
+    millisecond it has seen. When all 4096 sequence numbers of a
+    millisecond are used, the next millisecond is used early instead of
+    waiting for it. Either way, the timestamps of the IDs catch up with
+    the clock once it passes them again.
+
+    :param node_id: The id of the node making IDs, from 0 to 1023.
+    :type node_id: int.
+    :param epoch: The start of the timestamps, in UTC if naive. Defaults
+                  to January 1, 2020.
+    :type epoch: datetime.datetime.
+    :param clock: A function returning the number of milliseconds since
+                  the Unix epoch. Defaults to the system clock used by
+                  ``now()``.
+    :type clock: callable.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    NODE_BITS = 10
+    SEQUENCE_BITS = 12
+    TIMESTAMP_BITS = 41
+
+    def __init__(self, node_id, epoch=None, clock=None):
+        if (isinstance(node_id, bool)
+                or not isinstance(node_id, numbers.Integral)):
+            message = "'{0}' object is not a valid node id."
+            raise TypeError(message.format(type(node_id).__name__))
+        node_id = int(node_id)
+        if not 0 <= node_id < 1 << self.NODE_BITS:
+            raise ValueError("The value of 'node_id' must be from 0 to "
+                             "{0}.".format((1 << self.NODE_BITS) - 1))
+
+        if epoch is None:
+            epoch = datetime.datetime(2020, 1, 1)
+        if not isinstance(epoch, datetime.datetime):
+            message = "'{0}' object is not a valid datetime."
+            raise TypeError(message.format(type(epoch).__name__))
+
+        self.node_id = node_id
+        self._node = node_id << self.SEQUENCE_BITS
+        self._epoch = _epoch_microseconds(epoch, utc=True) // 1000
+        self._clock = clock or (lambda: int(time.time() * 1000))
+        self._lock = threading.Lock()
+        self._last = -1
+        self._sequence = 0
+
+    def decode(self, value):
+        """Get the parts of an ID.
+
+        :param value: The ID.
+        :type value: int.
+        :returns: tuple -- the naive UTC datetime the ID was made at, its
+                  node id and its sequence number.
+        """
+
+        shift = self.NODE_BITS + self.SEQUENCE_BITS
+        milliseconds = (value >> shift) + self._epoch
+        node_id = (value >> self.SEQUENCE_BITS) & ((1 << self.NODE_BITS) - 1)
+        sequence = value & ((1 << self.SEQUENCE_BITS) - 1)
+        return (_EPOCH + datetime.timedelta(milliseconds=milliseconds),
+                node_id, sequence)
+
+    def next_id(self):
+        """Get a new ID.
+
+        :returns: int -- the ID.
+        :raises: ValueError
+        """
+
+        with self._lock:
+            now = self._clock() - self._epoch
+            if now > self._last:
+                self._last, self._sequence = now, 0
+            if not 0 <= self._last < 1 << self.TIMESTAMP_BITS:
+                raise ValueError('The clock is outside of the range of the '
+                                 'IDs.')
+
+            value = ((self._last << (self.NODE_BITS + self.SEQUENCE_BITS))
+                     | self._node | self._sequence)
+
+            self._sequence += 1
+            if self._sequence == 1 << self.SEQUENCE_BITS:
+                self._last, self._sequence = self._last + 1, 0
+            return value
+
+    def next_ids(self, count):
+        """Get many new IDs at once.
+
+        The IDs are reserved while holding the lock once, so this is
+        much faster than calling ``next_id()`` for each of them.
+
+        :param count: The number of IDs.
+        :type count: int.
+        :returns: list -- the IDs, in increasing order.
+        :raises: ValueError
+        """
+
+        sequences = 1 << self.SEQUENCE_BITS
+        shift = self.NODE_BITS + self.SEQUENCE_BITS
+
+        with self._lock:
+            now = self._clock() - self._epoch
+            if now > self._last:
+                self._last, self._sequence = now, 0
+
+            ids = []
+            while count > 0:
+                if not 0 <= self._last < 1 << self.TIMESTAMP_BITS:
+                    raise ValueError('The clock is outside of the range '
+                                     'of the IDs.')
+
+                used = min(count, sequences - self._sequence)
+                first = (self._last << shift) | self._node | self._sequence
+                ids.extend(_range(first, first + used))
+                count -= used
+
+                self._sequence += used
+                if self._sequence == sequences:
+                    self._last, self._sequence = self._last + 1, 0
+            return ids
+
+
+def _add_months(wall, months):
+    """Add months to a wall time in microseconds.
+
+    Days that don't exist in the destination month are handled the same
+    way as ``_add_time()`` handles them.
+    """
+
+    days, time_of_day = divmod(wall, 86400000000)
+    year, month, day = _civil_from_days(days)
+    more_years, month = divmod(month - 1 + months, 12)
+    year, month = year + more_years, month + 1
+    days_in_month = _days_in_month(year, month)
+    if day > days_in_month:
+        day -= days_in_month
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+    return _days_from_civil(year, month, day) * 86400000000 + time_of_day
+
+
 def _add_time(value, years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
               seconds=0, milliseconds=0, microseconds=0):
     """Adds units of time to a datetime.
@@ -107,7 +3127,8 @@ def _add_time(value, years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
 
     # If any of the standard timedelta values are used, use timedelta
     # for them.
-    if seconds or minutes or hours or days or weeks:
+    if (microseconds or milliseconds or seconds or minutes or hours or days
+            or weeks):
         delta = datetime.timedelta(weeks=weeks, days=days, hours=hours,
                                    minutes=minutes, seconds=seconds,
                                    milliseconds=milliseconds,
@@ -169,26 +3190,844 @@ def _add_time(value, years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
     return value
 
 
-def _is_date_type(value):
-    # Acceptible types must be or extend:
-    #    datetime.date
-    #    datetime.time
-    return isinstance(value, (datetime.date, datetime.time))
+def _between_unit(unit):
+    """Get the number of months or microseconds in a unit of
+    ``between()``.
+    """
 
+    if unit not in _CALENDAR_UNITS and unit not in _FIXED_UNITS:
+        raise ValueError("'{0}' is not a valid unit.".format(unit))
+    return _CALENDAR_UNITS.get(unit), _FIXED_UNITS.get(unit)
 
-def all_timezones():
-    """Get a list of all time zones.
 
-    This is a wrapper for ``pytz.all_timezones``.
+def _business_week():
+    """Get the calendar used when no business calendar is given."""
 
-    :returns: list -- all time zones.
-    """
+    global _BUSINESS_WEEK
 
-    return pytz.all_timezones
+    if _BUSINESS_WEEK is None:
+        _BUSINESS_WEEK = BusinessCalendar()
+    return _BUSINESS_WEEK
 
 
-def all_timezones_set():
-    """Get a set of all time zones.
+def _calendar_between(start, end, months):
+    """Count the whole calendar units between two wall times.
+
+    Units of ``months`` months are added to ``start`` like
+    ``_add_time()`` adds them. The difference of the years and months is
+    the most there can be, and it's too many by at most a couple when
+    adding them overflows into the next month or the day or time of
+    ``end`` is earlier. Going back in time is counted as the negative of
+    going forward.
+    """
+
+    if end < start:
+        return -_calendar_between(end, start, months)
+
+    first = _civil_from_days(start // 86400000000)
+    last = _civil_from_days(end // 86400000000)
+    count = ((last[0] - first[0]) * 12 + last[1] - first[1]) // months
+    while count > 0 and _add_months(start, count * months) > end:
+        count -= 1
+    return count
+
+
+def _civil_from_days(days):
+    """Get the year, month and day of a number of days since the epoch.
+
+    This is the inverse of ``_days_from_civil()``. Both use integer
+    arithmetic on the proleptic Gregorian calendar, see
+    http://howardhinnant.github.io/date_algorithms.html.
+    """
+
+    days += 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524
+                   - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4
+                                - year_of_era // 100)
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = shifted_month + 3 if shifted_month < 10 else shifted_month - 9
+    return year_of_era + era * 400 + (month <= 2), month, day
+
+
+def _civil_fields(days):
+    """Get the calendar fields of a number of days since the epoch."""
+
+    year, month, day = _civil_from_days(days)
+    weekday = (days + 3) % 7  # The epoch was a Thursday.
+
+    # The ISO year is the year of the Thursday of the ISO week.
+    thursday = days - weekday + 3
+    iso_year = _civil_from_days(thursday)[0]
+    iso_week = (thursday - _days_from_civil(iso_year, 1, 1)) // 7 + 1
+
+    return {
+        'year': year,
+        'month': month,
+        'day': day,
+        'weekday': weekday,
+        'iso_year': iso_year,
+        'iso_week': iso_week,
+        'quarter': (month + 2) // 3,
+        'day_of_year': days - _days_from_civil(year, 1, 1) + 1,
+    }
+
+
+def _column(values, tz=None, utc=False):
+    """Get a ``DatetimeColumn`` of values in a time zone.
+
+    Columns are shifted to ``tz`` if it's provided. Other values are
+    converted with ``DatetimeColumn.from_datetimes()``.
+    """
+
+    if isinstance(values, DatetimeColumn):
+        if tz or utc:
+            return values.shift_to(tz, utc)
+        return values
+
+    return DatetimeColumn.from_datetimes(values, tz, utc)
+
+
+def _compile_format(format_string, names=None):
+    """Get a function that formats wall times like ``strftime()``.
+
+    The returned function takes the wall time in microseconds since the
+    epoch, the UTC offset in microseconds, or ``None`` for naive values,
+    and the name of the time zone. Common directives are rendered from
+    integers with the names of a locale, defaulting to the current one.
+    Anything else is passed to ``strftime()``, which uses the current
+    locale, so the ``%E`` and ``%O`` modifiers raise ``ValueError`` when
+    the names of another locale are given.
+    """
+
+    current = names is None
+    names = names or _locale_names()
+    key = (format_string, names, current)
+    try:
+        return _FORMAT_CACHE[key]
+    except KeyError:
+        pass
+
+    pieces = _parse_format(format_string, names)
+    if not current:
+        for literal, directive in pieces:
+            if not literal and directive[0] in ('E', 'O'):
+                message = "'%{0}' can't be used with a locale."
+                raise ValueError(message.format(directive))
+    abdays, days, abmonths, months, ampm = names[:5]
+
+    def render(wall, offset, tzname):
+        day_number, time_of_day = divmod(wall, 86400000000)
+        year, month, day = _civil_from_days(day_number)
+        seconds, microsecond = divmod(time_of_day, 1000000)
+        minutes, second = divmod(seconds, 60)
+        hour, minute = divmod(minutes, 60)
+        weekday = (day_number + 3) % 7
+        year_day = day_number - _days_from_civil(year, 1, 1)
+
+        output = []
+        for literal, directive in pieces:
+            if literal:
+                output.append(directive)
+            elif directive == 'Y':
+                output.append(str(year))
+            elif directive == 'm':
+                output.append('%02d' % month)
+            elif directive == 'd':
+                output.append('%02d' % day)
+            elif directive == 'H':
+                output.append('%02d' % hour)
+            elif directive == 'M':
+                output.append('%02d' % minute)
+            elif directive == 'S':
+                output.append('%02d' % second)
+            elif directive == 'f':
+                output.append('%06d' % microsecond)
+            elif directive == 'y':
+                output.append('%02d' % (year % 100))
+            elif directive == 'I':
+                output.append('%02d' % ((hour + 11) % 12 + 1))
+            elif directive == 'p':
+                output.append(ampm[hour >= 12])
+            elif directive == 'a':
+                output.append(abdays[weekday])
+            elif directive == 'A':
+                output.append(days[weekday])
+            elif directive in ('b', 'h'):
+                output.append(abmonths[month - 1])
+            elif directive == 'B':
+                output.append(months[month - 1])
+            elif directive == 'j':
+                output.append('%03d' % (year_day + 1))
+            elif directive == 'w':
+                output.append(str((weekday + 1) % 7))
+            elif directive == 'U':
+                output.append('%02d' % ((year_day + 7 - (weekday + 1) % 7)
+                                        // 7))
+            elif directive == 'W':
+                output.append('%02d' % ((year_day + 7 - weekday) // 7))
+            elif directive == 'z' and offset is None:
+                output.append('')
+            elif directive == 'z':
+                sign = '-' if offset < 0 else '+'
+                minutes, seconds = divmod(abs(offset) // 1000000, 60)
+                text = '{0}{1:02d}{2:02d}'.format(sign, *divmod(minutes, 60))
+                output.append(text + ('{0:02d}'.format(seconds)
+                                      if seconds else ''))
+            elif directive == 'Z':
+                output.append(tzname or '')
+            else:
+                value = datetime.datetime(year, month, day, hour, minute,
+                                          second, microsecond)
+                output.append(value.strftime('%' + directive))
+        return ''.join(output)
+
+    if len(_FORMAT_CACHE) >= 256:
+        _FORMAT_CACHE.clear()
+    _FORMAT_CACHE[key] = render
+    return render
+
+
+def _days_from_civil(year, month, day):
+    """Get the number of days since the epoch of a year, month and day."""
+
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = (year_of_era * 365 + year_of_era // 4 - year_of_era // 100
+                  + day_of_year)
+    return era * 146097 + day_of_era - 719468
+
+
+def _days_in_month(year, month):
+    if month == 2 and calendar.isleap(year):
+        return 29
+    return calendar.mdays[month]
+
+
+def _duration_amounts(years, months, weeks, days, hours, minutes, seconds,
+                      milliseconds, microseconds):
+    """Get the keyword arguments of ``_add_time()`` for future() or past().
+
+    ``years`` can be a string understood by ``parse_duration()``, in
+    which case its amounts are added to the other units.
+    """
+
+    amounts = {
+        'years': years, 'months': months, 'weeks': weeks, 'days': days,
+        'hours': hours, 'minutes': minutes, 'seconds': seconds,
+        'milliseconds': milliseconds, 'microseconds': microseconds,
+    }
+    if isinstance(years, str):
+        amounts['years'] = 0
+        for unit, amount in parse_duration(years).items():
+            amounts[unit] += amount
+    return amounts
+
+
+def _epoch_microseconds(value, utc=False):
+    """Get the number of microseconds between the Unix epoch and a datetime.
+
+    Time zone naive datetimes are assumed to be in the current system
+    time zone. If the ``utc`` parameter is set to ``True`` or
+    ``set_utc()`` has been called, UTC will be assumed instead. This
+    matches the datetimes returned by ``now()`` and ``future()``.
+    """
+
+    if is_timezone_naive(value):
+        tz = _resolve_timezone(None, utc)
+        # Naive UTC values don't need an offset.
+        if tz is pytz.UTC:
+            delta = value.replace(tzinfo=None) - _EPOCH
+            return ((delta.days * 86400 + delta.seconds) * 1000000
+                    + delta.microseconds)
+        if hasattr(tz, 'localize'):
+            value = tz.localize(value)
+        else:
+            value = value.replace(tzinfo=tz)
+
+    delta = value.replace(tzinfo=None) - value.utcoffset() - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _epoch_unit(unit):
+    """Get the number of microseconds in a unit of ``to_epoch()``."""
+
+    try:
+        return _EPOCH_UNITS[unit]
+    except KeyError:
+        raise ValueError("'{0}' is not a valid unit.".format(unit))
+
+
+def _expand_format(format_string, names=None):
+    """Get the format string of a value of ``formats`` in a locale.
+
+    Without the names of a locale, the current locale is used. Other
+    format strings are returned unchanged.
+    """
+
+    if format_string not in formats:
+        return format_string
+    if names is None:
+        return locale.nl_langinfo(getattr(locale, format_string))
+
+    index = {'D_T_FMT': 5, 'D_FMT': 6, 'T_FMT': 7, 'T_FMT_AMPM': 8}
+    return names[index[format_string]]
+
+
+def _from_epoch(value, scale):
+    """Get the number of microseconds in a number of units since the
+    epoch.
+    """
+
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        message = "'{0}' object is not a valid timestamp."
+        raise TypeError(message.format(type(value).__name__))
+    if isinstance(value, numbers.Integral):
+        value = int(value)
+    # NaN fails the comparison too.
+    if not _EPOCH_MIN <= value * scale <= _EPOCH_MAX:
+        raise ValueError('The timestamp is outside of the range of '
+                         'datetimes.')
+    return int(round(value * scale))
+
+
+def _from_epoch_microseconds(microseconds, tz):
+    """Get the time zone aware datetime for a number of microseconds
+    since the Unix epoch.
+    """
+
+    value = _EPOCH + datetime.timedelta(microseconds=microseconds)
+    return tz.fromutc(value.replace(tzinfo=tz))
+
+
+def _humanize(value, wall, now, now_wall, granularity):
+    """Describe how far one time is from another.
+
+    Both times are given in microseconds since the epoch and as wall
+    times in the same time zone. ``granularity`` is the index of the
+    smallest unit to use in ``_HUMANIZE_GRANULARITIES``.
+    """
+
+    elapsed = abs(now - value)
+    index = bisect.bisect_right(_HUMANIZE_THRESHOLDS, elapsed) - 1
+
+    count = unit = None
+    if elapsed >= 28 * 86400000000:
+        # Months and years are counted on the calendar from now, like
+        # past() and future() count them.
+        if value > now:
+            months = _calendar_between(now_wall, wall, 1)
+        else:
+            first = _civil_from_days(wall // 86400000000)
+            last = _civil_from_days(now_wall // 86400000000)
+            months = (last[0] - first[0]) * 12 + last[1] - first[1] + 1
+            while months > 0 and _add_months(now_wall, -months) < wall:
+                months -= 1
+        if months >= 12:
+            count, unit = months // 12, 'year'
+        elif months and granularity <= 5:
+            count, unit = months, 'month'
+    if unit is None and granularity <= index:
+        unit, length = _HUMANIZE_UNITS[index]
+        count = elapsed // length
+
+    key = (count, unit, value > now)
+    try:
+        return _HUMANIZED[key]
+    except KeyError:
+        pass
+
+    if unit is None:
+        text = 'just now'
+    else:
+        text = '{0} {1}{2}'.format(count, unit, '' if count == 1 else 's')
+        text = 'in ' + text if value > now else text + ' ago'
+    _HUMANIZED[key] = text
+    return text
+
+
+def _humanize_granularity(granularity):
+    """Get the index of a granularity of ``humanize()``."""
+
+    try:
+        return _HUMANIZE_GRANULARITIES.index(granularity)
+    except ValueError:
+        raise ValueError("'{0}' is not a valid granularity."
+                         .format(granularity))
+
+
+def _instant_microseconds(value, zone):
+    """Get the number of microseconds since the epoch of a datetime or
+    an ``Instant``.
+
+    Time zone naive datetimes are assumed to be in the interned time
+    zone ``zone``.
+    """
+
+    if isinstance(value, Instant):
+        return value._microseconds
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return _zone_table(zone).to_utc(_naive_microseconds(value))
+        return _epoch_microseconds(value)
+
+    message = "'{0}' object is not a valid datetime."
+    raise TypeError(message.format(type(value).__name__))
+
+
+def _is_date_type(value):
+    # Acceptible types must be or extend:
+    #    datetime.date
+    #    datetime.time
+    return isinstance(value, (datetime.date, datetime.time))
+
+
+def _locale_names(name=None):
+    """Get the names and formats used by ``strftime()`` in a locale.
+
+    Without a name, the current locale is used. Other locales are only
+    loaded once, holding ``_LOCALE_LOCK``: their names are read by
+    ``_LOCALE_SCRIPT`` in another Python process, because switching
+    ``LC_TIME`` here would change it for every thread.
+    """
+
+    if name is None:
+        return (tuple(calendar.day_abbr), tuple(calendar.day_name),
+                tuple(calendar.month_abbr)[1:], tuple(calendar.month_name)[1:],
+                (datetime.time(0).strftime('%p'),
+                 datetime.time(12).strftime('%p')),
+                locale.nl_langinfo(locale.D_T_FMT),
+                locale.nl_langinfo(locale.D_FMT),
+                locale.nl_langinfo(locale.T_FMT),
+                locale.nl_langinfo(locale.T_FMT_AMPM))
+
+    try:
+        return _LOCALE_NAMES[name]
+    except KeyError:
+        pass
+
+    with _LOCALE_LOCK:
+        if name not in _LOCALE_NAMES:
+            command = [sys.executable, '-E', '-c', _LOCALE_SCRIPT, name]
+            try:
+                output = subprocess.check_output(command,
+                                                 stderr=subprocess.DEVNULL)
+            except (OSError, subprocess.CalledProcessError):
+                raise ValueError("'{0}' is not an available locale."
+                                 .format(name))
+            names = json.loads(output.decode('ascii'))
+            _LOCALE_NAMES[name] = (tuple(tuple(group) for group in names[:5])
+                                   + tuple(names[5:]))
+        return _LOCALE_NAMES[name]
+
+
+def _loop_deadlines(loop, utc):
+    """Get the shared deadline group of an event loop."""
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    # Groups are shared per loop and per UTC mode, so that the datetimes
+    # are interpreted the same way for every deadline in a group.
+    key = _FORCE_UTC or bool(utc)
+    groups = _LOOP_DEADLINES.setdefault(loop, {})
+    group = groups[key]() if key in groups else None
+    if group is None:
+        group = _Deadlines(loop, key)
+        groups[key] = weakref.ref(group)
+    return group
+
+
+def _naive_microseconds(value):
+    """Get the wall time of a datetime in microseconds since the epoch,
+    ignoring its time zone.
+    """
+
+    delta = value.replace(tzinfo=None) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _parse_offset(offset):
+    """Get the number of microseconds in a UTC offset.
+
+    Offsets can be ``datetime.timedelta`` objects or strings like
+    ``'+05:30'``, ``'-0800'`` or ``'+01'``.
+    """
+
+    if isinstance(offset, datetime.timedelta):
+        return _timedelta_microseconds(offset)
+    if not isinstance(offset, str):
+        message = "'{0}' object is not a valid offset."
+        raise TypeError(message.format(type(offset).__name__))
+
+    digits = offset[1:].replace(':', '')
+    if (offset[:1] not in ('+', '-') or len(digits) not in (2, 4)
+            or not digits.isdigit()):
+        raise ValueError("'{0}' is not a valid offset.".format(offset))
+
+    minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+    if offset[0] == '-':
+        minutes = -minutes
+    return minutes * 60000000
+
+
+def _normalize_zone_name(name):
+    """Get the key of a time zone name for ``_ZoneNames``."""
+
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def _open_temporary(path):
+    """Create a new file next to a path, to be moved over it later.
+
+    The file gets the permissions of the file at ``path``, or the
+    permissions a new file gets from the umask if there is none.
+    """
+
+    directory, name = os.path.split(path)
+    while True:
+        temporary = os.path.join(directory, '.{0}.{1:016x}.tmp'.format(
+            name, random.getrandbits(64)))
+        try:
+            fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                         | getattr(os, 'O_BINARY', 0), 0o666)
+        except FileExistsError:
+            continue
+        break
+
+    try:
+        os.chmod(temporary, os.stat(path).st_mode & 0o7777)
+    except FileNotFoundError:
+        pass
+    except BaseException:
+        os.close(fd)
+        os.remove(temporary)
+        raise
+    return fd, temporary
+
+
+def _parse_format(format_string, names):
+    """Split a format string into literals and directives.
+
+    ``%c``, ``%x``, ``%X`` and ``%r`` are expanded to the locale's
+    formats. The ``%E`` and ``%O`` modifiers are kept with the directive
+    they modify.
+    """
+
+    # Like strftime(), %r falls back to the C locale's 12-hour format.
+    expansions = {'c': names[5], 'x': names[6], 'X': names[7],
+                  'r': names[8] or '%I:%M:%S %p'}
+    pieces = []
+    index = 0
+    while index < len(format_string):
+        character = format_string[index]
+        if character == '%' and index + 1 < len(format_string):
+            directive = format_string[index + 1]
+            index += 2
+            if directive == '%':
+                pieces.append((True, '%'))
+            elif directive in expansions:
+                pieces.extend(_parse_format(expansions[directive], names))
+            elif directive in ('E', 'O') and index < len(format_string):
+                pieces.append((False, directive + format_string[index]))
+                index += 1
+            else:
+                pieces.append((False, directive))
+        else:
+            pieces.append((True, character))
+            index += 1
+    return pieces
+
+
+def _partition(start, end, unit, zone, max_parts):
+    """Generate the intervals of ``partition()``.
+
+    Without ``max_parts`` every boundary of ``unit`` between ``start``
+    and ``end`` is used. Otherwise the range is split evenly and each cut
+    is moved to the nearest boundary, so only ``max_parts`` boundaries
+    are ever looked up, however long the range is.
+    """
+
+    if max_parts is None:
+        while start < end:
+            boundary = min(_round([start + 1], unit, zone, up=True)[0], end)
+            yield Interval._from_zone_id(start, boundary, zone)
+            start = boundary
+        return
+
+    first, total = start, end - start
+    for part in itertools.islice(itertools.count(1), max_parts):
+        cut = end
+        if part < max_parts:
+            target = first + total * part // max_parts
+            below = _round([target], unit, zone)[0]
+            above = _round([target], unit, zone, up=True)[0]
+            cut = below if target - below <= above - target else above
+        if start < cut <= end:
+            yield Interval._from_zone_id(start, cut, zone)
+            start = cut
+
+
+def _query_zones(at):
+    """Get the index of common time zones, moved to an instant.
+
+    ``at`` defaults to now. Time zone naive datetimes are assumed to be
+    in the current system time zone, or in UTC if ``set_utc()`` has
+    been called. The index must only be used while ``_ZONE_INDEX_LOCK``
+    is held.
+    """
+
+    global _ZONE_INDEX
+
+    if at is None:
+        microseconds = int(time.time() * 1000000)
+    else:
+        microseconds = _instant_microseconds(at, _zone_id(_resolve_timezone()))
+
+    if _ZONE_INDEX is None:
+        _ZONE_INDEX = _ZoneIndex()
+    _ZONE_INDEX.move(microseconds)
+    return _ZONE_INDEX, microseconds
+
+
+def _resolve_timezone(tz=None, utc=False):
+    """Get the ``tzinfo`` for a time zone parameter.
+
+    ``tz`` can either be the name of a time zone or a
+    ``datetime.tzinfo`` object. If no value is provided, the current
+    system time zone will be used. If the ``utc`` parameter is set to
+    ``True`` or ``set_utc()`` has been called, however, UTC will be used
+    instead.
+    """
+
+    if not tz:
+        if _FORCE_UTC or utc:
+            return pytz.UTC
+        return timezone_object()  # Use the system's time zone
+
+    if isinstance(tz, datetime.tzinfo):
+        return tz
+
+    # This will raise pytz.UnknownTimeZoneError
+    return resolve_timezone(tz)
+
+
+def _round(data, unit, zone, up=False):
+    """Round microseconds since the epoch to boundaries of a unit of time
+    in an interned time zone.
+
+    The boundaries are where the wall time starts a new unit. Each
+    boundary is converted to an instant only once, however many values
+    share it, and values on either side of a transition are rounded to
+    the boundaries that really exist around them, so days on which
+    daylight saving time starts or ends are 23 or 25 hours long.
+    """
+
+    table = _zone_table(zone)
+    starts, offsets = table.starts, table.offsets
+    floor, step = _wall_floor(unit), _wall_step(unit)
+    bisect_right = bisect.bisect_right
+
+    instants = {}
+
+    def boundaries(wall):
+        try:
+            return instants[wall]
+        except KeyError:
+            result = instants[wall] = [wall - offsets[index] for index
+                                       in table.candidates(wall)]
+            return result
+
+    rounded = array.array('q')
+    for value in data:
+        wall = floor(value + offsets[bisect_right(starts, value) - 1])
+        candidates = boundaries(wall)
+        if not up:
+            # A repeated wall time is only a boundary for the values
+            # after it.
+            earlier = [c for c in candidates if c <= value]
+            rounded.append(earlier[-1] if earlier else candidates[0])
+            continue
+
+        later = [c for c in candidates if c >= value]
+        if not later:
+            later = boundaries(step(wall))
+        rounded.append(later[0])
+
+    return rounded
+
+
+def _round_value(value, unit, tz, utc, up):
+    """Round a single datetime for ``floor()`` and ``ceil()``."""
+
+    if not isinstance(value, datetime.datetime):
+        message = "'{0}' object is not a valid datetime."
+        raise TypeError(message.format(type(value).__name__))
+
+    aware = is_timezone_aware(value)
+    if aware and not tz:
+        tz = getattr(value.tzinfo, 'zone', None) or value.tzinfo
+    zone = _zone_id(_resolve_timezone(tz, utc))
+
+    rounded = _round([_instant_microseconds(value, zone)], unit, zone, up)[0]
+    return Instant._from_zone_id(rounded, zone).to_datetime(aware=aware)
+
+
+def _set_future_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _timedelta_microseconds(value):
+    return (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+
+
+def _transitions(zone, start, end):
+    """Get the transitions of an interned time zone between two times."""
+
+    start = _instant_microseconds(start, zone)
+    end = _instant_microseconds(end, zone)
+    if end < start:
+        message = ("The value of 'start' must not be after the value of "
+                   "'end'.")
+        raise ValueError(message)
+
+    starts = _zone_table(zone).starts
+    first = bisect.bisect_left(starts, start, 1)
+    last = bisect.bisect_left(starts, end, first)
+    return [Transition._from_zone_id(zone, index)
+            for index in _range(first, last)]
+
+
+def _truncate(microseconds, unit):
+    """Divide a number of microseconds, rounding toward zero."""
+
+    if microseconds < 0:
+        return -(-microseconds // unit)
+    return microseconds // unit
+
+
+def _wall_floor(unit):
+    """Get a function rounding wall times down to the start of a unit."""
+
+    if unit in _WALL_UNITS:
+        size = _WALL_UNITS[unit]
+        return lambda wall: wall - wall % size
+
+    if unit == 'week':
+        # The epoch was a Thursday.
+        return lambda wall: (wall - (wall + 3 * 86400000000)
+                             % (7 * 86400000000))
+
+    if unit == 'month':
+        def floor(wall):
+            year, month, _ = _civil_from_days(wall // 86400000000)
+            return _days_from_civil(year, month, 1) * 86400000000
+        return floor
+
+    if unit == 'year':
+        def floor(wall):
+            year, _, _ = _civil_from_days(wall // 86400000000)
+            return _days_from_civil(year, 1, 1) * 86400000000
+        return floor
+
+    message = "'{0}' is not a valid unit."
+    raise ValueError(message.format(unit))
+
+
+def _wall_step(unit):
+    """Get a function moving a boundary of a unit to the next one."""
+
+    if unit in _WALL_UNITS:
+        size = _WALL_UNITS[unit]
+        return lambda wall: wall + size
+
+    if unit == 'week':
+        return lambda wall: wall + 7 * 86400000000
+
+    if unit in ('month', 'year'):
+        months = 1 if unit == 'month' else 12
+        return lambda wall: _add_months(wall, months)
+
+    message = "'{0}' is not a valid unit."
+    raise ValueError(message.format(unit))
+
+
+def _zone_names():
+    """Get the index of time zone names."""
+
+    global _ZONE_NAMES
+
+    with _ZONE_NAMES_LOCK:
+        if _ZONE_NAMES is None:
+            _ZONE_NAMES = _ZoneNames()
+    return _ZONE_NAMES
+
+
+def _zone_id(tz):
+    """Get the interned id of a time zone."""
+
+    key = getattr(tz, 'zone', None) or tz
+    try:
+        return _ZONE_IDS[key]
+    except KeyError:
+        with _ZONES_LOCK:
+            if key not in _ZONE_IDS:
+                _ZONES.append(tz)
+                _ZONE_IDS[key] = len(_ZONES) - 1
+            return _ZONE_IDS[key]
+
+
+def _zone_name(zone):
+    """Get a name of an interned time zone that ``_resolve_timezone()``
+    can find the time zone by again.
+
+    Time zones without a name, like ``datetime.timezone``, are named by
+    their UTC offset, like ``'+05:30'``.
+    """
+
+    tz = _ZONES[zone]
+    name = getattr(tz, 'zone', None) or getattr(tz, 'key', None)
+    if name:
+        return name
+
+    offset = _zone_table(zone).offsets[0]
+    if offset % 60000000:
+        message = "The UTC offset of '{0}' isn't a whole number of minutes."
+        raise ValueError(message.format(tz))
+    sign = '-' if offset < 0 else '+'
+    return '{0}{1:02d}:{2:02d}'.format(sign,
+                                       *divmod(abs(offset) // 60000000, 60))
+
+
+def _zone_table(zone):
+    """Get the table of UTC offsets of an interned time zone."""
+
+    try:
+        return _ZONE_TABLES[zone]
+    except KeyError:
+        table = _ZONE_TABLES[zone] = _ZoneTable(_ZONES[zone])
+        return table
+
+
+def all_timezones():
+    """Get a list of all time zones.
+
+    This is a wrapper for ``pytz.all_timezones``.
+
+    :returns: list -- all time zones.
+    """
+
+    return pytz.all_timezones
+
+
+def all_timezones_set():
+    """Get a set of all time zones.
 
     This is a wrapper for ``pytz.all_timezones_set``.
 
@@ -198,6 +4037,206 @@ def all_timezones_set():
     return pytz.all_timezones_set
 
 
+def bucket(values, unit, tz=None, utc=False):
+    """Group times into the units of time they fall in.
+
+    The units start where ``floor()`` rounds to and are found in the
+    time zone specified by ``tz``, so on days when daylight saving time
+    starts or ends, day buckets are 23 or 25 hours long. Time zone naive
+    datetimes are assumed to be in that time zone. If no value is
+    provided for ``tz``, the current system time zone will be used. If
+    the ``utc`` parameter is set to ``True`` or ``set_utc()`` has been
+    called, however, UTC will be used instead.
+
+    :param values: The times to group.
+    :type values: when.DatetimeColumn, iterable of datetime.datetime.
+    :param unit: One of ``'year'``, ``'month'``, ``'week'``, ``'day'``,
+                 ``'hour'``, ``'minute'`` or ``'second'``.
+    :type unit: str.
+    :param tz: The time zone of the units.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: list -- a pair of the :class:`Interval` of each unit and
+              the positions in ``values`` of the times in it, in order.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    column = _column(values, tz, utc)
+    starts = _round(column._data, unit, column._zone)
+
+    positions = {}
+    for position, start in enumerate(starts):
+        positions.setdefault(start, []).append(position)
+
+    keys = sorted(positions)
+    ends = _round([key + 1 for key in keys], unit, column._zone, up=True)
+    return [(Interval._from_zone_id(key, end, column._zone), positions[key])
+            for key, end in zip(keys, ends)]
+
+
+def between(start, end, unit='days'):
+    """Count the whole units of time from one time to another.
+
+    Years and months are counted on the calendar: the result is the
+    largest number of them that can be added to ``start`` the same way
+    ``future()`` adds them without passing ``end``. The count is found
+    from the difference of the years and months instead of adding one
+    unit at a time. Other units are counted in elapsed time. Counts are
+    negative when ``end`` is before ``start`` and are rounded toward
+    zero.
+
+    Dates are treated as midnight. Time zone aware datetimes are
+    compared on the calendar of the time zone of ``start``.
+
+    :param start: The first time.
+    :type start: datetime.datetime, datetime.date.
+    :param end: The second time.
+    :type end: datetime.datetime, datetime.date.
+    :param unit: One of ``'years'``, ``'months'``, ``'weeks'``,
+                 ``'days'``, ``'hours'``, ``'minutes'``, ``'seconds'``,
+                 ``'milliseconds'`` or ``'microseconds'``.
+    :type unit: str.
+    :returns: int -- the number of units.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    months, microseconds = _between_unit(unit)
+
+    values = []
+    for value in (start, end):
+        if not isinstance(value, datetime.date):
+            message = "'{0}' object is not a valid date."
+            raise TypeError(message.format(type(value).__name__))
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.combine(value, datetime.time())
+        values.append(value)
+    start, end = values
+
+    if is_timezone_aware(start) != is_timezone_aware(end):
+        raise TypeError("Can't compare time zone naive and aware datetimes.")
+
+    if is_timezone_aware(start):
+        tz = getattr(start.tzinfo, 'zone', None) or start.tzinfo
+        table = _zone_table(_zone_id(_resolve_timezone(tz)))
+        instants = [_epoch_microseconds(start), _epoch_microseconds(end)]
+        walls = [value + table.offset(value) for value in instants]
+    else:
+        walls = instants = [_naive_microseconds(start),
+                            _naive_microseconds(end)]
+
+    if months:
+        return _calendar_between(walls[0], walls[1], months)
+    return _truncate(instants[1] - instants[0], microseconds)
+
+
+def between_many(starts, ends, unit='days', tz=None, utc=False):
+    """Count the whole units of time between many pairs of times.
+
+    This works like ``between()``. The ends are compared on the calendar
+    of the time zone specified by ``tz``. Time zone naive datetimes are
+    assumed to be in that time zone. If no value is provided for ``tz``,
+    the time zone of a :class:`DatetimeColumn` of starts or the current
+    system time zone will be used. If the ``utc`` parameter is set to
+    ``True`` or ``set_utc()`` has been called, however, UTC will be used
+    instead.
+
+    :param starts: The first times.
+    :type starts: when.DatetimeColumn, iterable of datetime.datetime.
+    :param ends: The second times.
+    :type ends: when.DatetimeColumn, iterable of datetime.datetime.
+    :param unit: One of ``'years'``, ``'months'``, ``'weeks'``,
+                 ``'days'``, ``'hours'``, ``'minutes'``, ``'seconds'``,
+                 ``'milliseconds'`` or ``'microseconds'``.
+    :type unit: str.
+    :param tz: The time zone of the calendar.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: array.array -- the number of units between each pair.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    months, microseconds = _between_unit(unit)
+
+    starts = _column(starts, tz, utc)
+    ends = _column(ends, tz or starts.tzinfo, utc)
+    if len(starts) != len(ends):
+        raise ValueError("'starts' and 'ends' must have the same length.")
+
+    if months:
+        return array.array('q', [
+            _calendar_between(start, end, months)
+            for start, end in zip(starts._walls(), ends._walls())])
+    return array.array('q', [
+        _truncate(end - start, microseconds)
+        for start, end in zip(starts._data, ends._data)])
+
+
+def call_at(value, callback, *args, **kwargs):
+    """Call a function from an asyncio event loop once a datetime has
+    passed.
+
+    ``value`` can be any datetime returned by ``now()``, ``future()`` or
+    ``shift()``. Time zone naive datetimes are assumed to be in the
+    current system time zone. If the ``utc`` keyword argument is set to
+    ``True`` or ``set_utc()`` has been called, UTC will be assumed
+    instead. The datetime is mapped to the loop's clock once and the
+    callback shares a single loop timer with all of the other
+    ``call_at()`` and ``sleep_until()`` calls for the loop.
+
+    :param value: When to call ``callback``.
+    :type value: datetime.datetime.
+    :param callback: The function to call with ``args``.
+    :param loop: The event loop. Defaults to the current loop.
+    :type loop: asyncio.AbstractEventLoop.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: a handle with a ``cancel()`` method.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    loop = kwargs.pop('loop', None)
+    utc = kwargs.pop('utc', False)
+    if kwargs:
+        message = "call_at() got an unexpected keyword argument '{0}'"
+        raise TypeError(message.format(sorted(kwargs)[0]))
+
+    return _loop_deadlines(loop, utc).call_at(value, callback, *args)
+
+
+def ceil(value, unit, tz=None, utc=False):
+    """Round a datetime up to the start of a unit of time.
+
+    This is the inverse of ``floor()``. Values already at the start of a
+    unit are returned unchanged.
+
+    :param value: A datetime object.
+    :type value: datetime.datetime.
+    :param unit: One of ``'year'``, ``'month'``, ``'week'``, ``'day'``,
+                 ``'hour'``, ``'minute'`` or ``'second'``.
+    :type unit: str.
+    :param tz: The time zone in which to round.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: datetime.datetime -- the rounded datetime.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    return _round_value(value, unit, tz, utc, up=True)
+
+
 def common_timezones():
     """Get a list of common time zones.
 
@@ -220,6 +4259,29 @@ def common_timezones_set():
     return pytz.common_timezones_set
 
 
+def deadlines(loop=None, utc=False):
+    """Get a new group of deadlines for an asyncio event loop.
+
+    The group has ``call_at()`` and ``sleep_until()`` methods that work
+    like the functions of the same name. All of the deadlines in the
+    group share a single loop timer, and ``close()`` cancels all of them
+    at once.
+
+    :param loop: The event loop. Defaults to the current loop.
+    :type loop: asyncio.AbstractEventLoop.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: the group of deadlines.
+
+    .. versionadded:: 0.5.0
+    """
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    return _Deadlines(loop, _FORCE_UTC or utc)
+
+
 def ever():
     """Get a random datetime.
 
@@ -250,7 +4312,132 @@ def ever():
                              microsecond=microsecond)
 
 
-def format(value, format_string):
+def fields(values, tz=None, fields=None, utc=False):
+    """Get calendar fields of many times as arrays of integers.
+
+    The fields are calculated with integer arithmetic on the number of
+    days since the epoch, once for each day the values are on, instead
+    of with a ``datetime`` for each value. The available fields are
+    ``'year'``, ``'month'``, ``'day'``, ``'hour'``, ``'minute'``,
+    ``'second'``, ``'microsecond'``, ``'weekday'`` (0 for Monday to 6
+    for Sunday), ``'iso_year'``, ``'iso_week'``, ``'quarter'`` and
+    ``'day_of_year'``.
+
+    The fields are of the wall times in the time zone specified by
+    ``tz``, found the same way as for ``shift()``. Time zone naive
+    datetimes are assumed to be in that time zone. If no value is
+    provided for ``tz``, the time zone of a :class:`DatetimeColumn` or
+    the current system time zone will be used. If the ``utc`` parameter
+    is set to ``True`` or ``set_utc()`` has been called, however, UTC
+    will be used instead.
+
+    :param values: The times.
+    :type values: when.DatetimeColumn, iterable of datetime.datetime.
+    :param tz: The time zone of the fields.
+    :type tz: datetime.tzinfo, str.
+    :param fields: The names of the fields to get. Defaults to all of
+                   them.
+    :type fields: iterable of str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: dict -- an ``array.array`` of each field, keyed by its
+              name.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    names = list(_FIELD_TYPES if fields is None else fields)
+    for name in names:
+        if name not in _FIELD_TYPES:
+            raise ValueError("'{0}' is not a valid field.".format(name))
+
+    result = dict((name, array.array(_FIELD_TYPES[name])) for name in names)
+    day_fields = [(name, result[name]) for name in names
+                  if name not in _TIME_FIELDS]
+    time_fields = [(result[name],) + _TIME_FIELDS[name] for name in names
+                   if name in _TIME_FIELDS]
+
+    days_seen = {}
+    for wall in _column(values, tz, utc)._walls():
+        days, time_of_day = divmod(wall, 86400000000)
+        if day_fields:
+            try:
+                civil = days_seen[days]
+            except KeyError:
+                civil = days_seen[days] = _civil_fields(days)
+            for name, field in day_fields:
+                field.append(civil[name])
+        for field, divisor, modulus in time_fields:
+            field.append(time_of_day // divisor % modulus)
+
+    return result
+
+
+def floor(value, unit, tz=None, utc=False):
+    """Round a datetime down to the start of a unit of time.
+
+    The start of the unit is found in the time zone specified by ``tz``,
+    taking daylight saving time into account. Weeks start on Monday.
+
+    Time zone aware datetimes are rounded in their own time zone unless
+    ``tz`` is provided, and an aware datetime is returned. Time zone
+    naive datetimes are assumed to be in the time zone specified by
+    ``tz`` and a naive datetime is returned. If no value is provided for
+    ``tz``, the current system time zone will be used. If the ``utc``
+    parameter is set to ``True`` or ``set_utc()`` has been called,
+    however, UTC will be used instead.
+
+    :param value: A datetime object.
+    :type value: datetime.datetime.
+    :param unit: One of ``'year'``, ``'month'``, ``'week'``, ``'day'``,
+                 ``'hour'``, ``'minute'`` or ``'second'``.
+    :type unit: str.
+    :param tz: The time zone in which to round.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: datetime.datetime -- the rounded datetime.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    return _round_value(value, unit, tz, utc, up=False)
+
+
+def floor_many(values, unit, tz=None, utc=False):
+    """Round many times down to the start of a unit of time.
+
+    This works like ``floor()``, but the start of each unit is only
+    calculated once for all of the values in it. Time zone naive
+    datetimes are assumed to be in the time zone specified by ``tz``.
+    If no value is provided for ``tz``, the time zone of a
+    :class:`DatetimeColumn` or the current system time zone will be
+    used. If the ``utc`` parameter is set to ``True`` or ``set_utc()``
+    has been called, however, UTC will be used instead.
+
+    :param values: The times to round.
+    :type values: when.DatetimeColumn, iterable of datetime.datetime.
+    :param unit: One of ``'year'``, ``'month'``, ``'week'``, ``'day'``,
+                 ``'hour'``, ``'minute'`` or ``'second'``.
+    :type unit: str.
+    :param tz: The time zone in which to round.
+    :type tz: datetime.tzinfo, str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: when.DatetimeColumn -- the rounded times.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    column = _column(values, tz, utc)
+    return DatetimeColumn._from_zone_id(
+        _round(column._data, unit, column._zone), column._zone)
+
+
+def format(value, format_string, locale=None):
     """Get a formatted version of a datetime.
 
     This is a wrapper for ``strftime()``. The full list of directives
@@ -279,8 +4466,18 @@ def format(value, format_string):
     :param format_string: A string specifying formatting the directives
                           or to use.
     :type format_string: str.
+    :param locale: The name of a locale, like ``'de_DE.UTF-8'``, to use
+                   instead of the current one. Its names and formats are
+                   loaded by another Python process the first time it's
+                   used and cached, so formatting with it is thread-safe
+                   and the current locale is never changed. The ``%E``
+                   and ``%O`` modifiers can't be used with a locale.
+    :type locale: str.
     :returns: str -- the formatted datetime.
-    :raises: TypeError
+    :raises: TypeError, ValueError
+
+    .. versionchanged:: 0.5.0
+       Added the ``locale`` parameter.
 
     .. versionchanged:: 0.4.0
        ``TypeError`` is now raised
@@ -292,17 +4489,95 @@ def format(value, format_string):
         message = "'{0}' object is not a valid date or time."
         raise TypeError(message.format(type(value).__name__))
 
-    # Check to see if `format_string` is a value from the `formats`
-    # class. If it is, obtain the real value from
-    # `locale.nl_langinfo()`.
-    if format_string in formats:
-        format_string = locale.nl_langinfo(getattr(locale, format_string))
+    if locale is None:
+        # Check to see if `format_string` is a value from the `formats`
+        # class. If it is, obtain the real value from
+        # `locale.nl_langinfo()`.
+        return value.strftime(_expand_format(format_string))
+
+    names = _locale_names(locale)
+    render = _compile_format(_expand_format(format_string, names), names)
+
+    offset = tzname = None
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        offset, tzname = value.utcoffset(), value.tzname()
+        if offset is not None:
+            offset = _timedelta_microseconds(offset)
+
+    # Dates are formatted as midnight and times as on January 1, 1900,
+    # like strftime() formats them.
+    if isinstance(value, datetime.time):
+        value = datetime.datetime.combine(datetime.date(1900, 1, 1), value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return render(_naive_microseconds(value), offset, tzname)
+
+
+def from_epoch(value, tz=None, unit='s', utc=False, aware=False):
+    """Get the datetime of a Unix timestamp.
+
+    The datetime is in the time zone specified by ``tz``. If no value is
+    provided for ``tz``, the current system time zone will be used. If
+    the ``utc`` parameter is set to ``True`` or ``set_utc()`` has been
+    called, however, UTC will be used instead. Like the datetimes
+    returned by ``now()`` and ``shift()``, it's time zone naive unless
+    ``aware`` is set to ``True``.
+
+    :param value: The timestamp.
+    :type value: int, float.
+    :param tz: The time zone of the datetime.
+    :type tz: datetime.tzinfo, str.
+    :param unit: The unit of the timestamp, ``'s'``, ``'ms'`` or
+                 ``'us'``.
+    :type unit: str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :param aware: Whether or not to return a time zone aware datetime.
+    :type aware: bool.
+    :returns: datetime.datetime -- the datetime.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    microseconds = _from_epoch(value, _epoch_unit(unit))
+    zone = _zone_id(_resolve_timezone(tz, utc))
+    try:
+        return Instant._from_zone_id(microseconds, zone).to_datetime(aware)
+    except OverflowError:
+        # The local time of the first or last datetime can be out of
+        # range too.
+        raise ValueError('The timestamp is outside of the range of '
+                         'datetimes.')
+
+
+def from_epoch_many(values, tz=None, unit='s', utc=False):
+    """Get a column of many Unix timestamps.
+
+    :param values: The timestamps.
+    :type values: iterable of int or float.
+    :param tz: The time zone of the column.
+    :type tz: datetime.tzinfo, str.
+    :param unit: The unit of the timestamps, ``'s'``, ``'ms'`` or
+                 ``'us'``.
+    :type unit: str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: when.DatetimeColumn -- the column.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
 
-    return value.strftime(format_string)
+    scale = _epoch_unit(unit)
+    data = array.array('q', [_from_epoch(value, scale) for value in values])
+    return DatetimeColumn._from_zone_id(data,
+                                        _zone_id(_resolve_timezone(tz, utc)))
 
 
 def future(years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
-           seconds=0, milliseconds=0, microseconds=0, utc=False):
+           seconds=0, milliseconds=0, microseconds=0, utc=False,
+           business_days=0, business_calendar=None):
     """Get a datetime in the future.
 
     ``future()`` accepts the all of the parameters of
@@ -310,13 +4585,21 @@ def future(years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
     ``months``. ``years`` and ``months`` will add their respective units
     of time to the datetime.
 
+    A duration string like ``'2h30m'`` can be passed in place of
+    ``years``. It's parsed with ``parse_duration()`` and its units are
+    added to the datetime along with the other parameters.
+
+    ``business_days`` are added last, using ``business_calendar``. If no
+    value is provided for ``business_calendar``, Saturday and Sunday
+    will be the only days that aren't business days.
+
     By default ``future()`` will return the datetime in the system's
     local time. If the ``utc`` parameter is set to ``True`` or
     ``set_utc()`` has been called, the datetime will be based on UTC
     instead.
 
-    :param years: The number of years to add.
-    :type years: int.
+    :param years: The number of years to add, or a duration string.
+    :type years: int, str.
     :param months: The number of months to add.
     :type months: int.
     :param weeks: The number of weeks to add.
@@ -335,12 +4618,25 @@ def future(years=0, months=0, weeks=0, days=0, hours=0, minutes=0,
     :type microseconds: int.
     :param utc: Whether or not to use UTC instead of local time.
     :type utc: bool.
+    :param business_days: The number of business days to add.
+    :type business_days: int.
+    :param business_calendar: The calendar of business days.
+    :type business_calendar: when.BusinessCalendar.
     :returns: datetime.datetime -- the calculated datetime.
+
+    .. versionchanged:: 0.5.0
+       Added the ``business_days`` and ``business_calendar``
+       parameters.
+       ``years`` can be a duration string.
     """
 
-    return _add_time(now(utc), years=years, months=months, weeks=weeks,
-                     days=days, hours=hours, minutes=minutes, seconds=seconds,
-                     milliseconds=milliseconds, microseconds=microseconds)
+    amounts = _duration_amounts(years, months, weeks, days, hours, minutes,
+                                seconds, milliseconds, microseconds)
+    value = _add_time(now(utc), **amounts)
+    if business_days:
+        business_calendar = business_calendar or _business_week()
+        value = business_calendar.add_business_days(value, business_days)
+    return value
 
 
 def how_many_leap_days(from_date, to_date):
@@ -409,6 +4705,119 @@ def how_many_leap_days(from_date, to_date):
     return number_of_leaps
 
 
+def humanize(value, relative_to=None, granularity='second', utc=False):
+    """Describe how far a time is from now, like ``'3 hours ago'`` or
+    ``'in 2 days'``.
+
+    The largest whole unit is used. Months and years are counted on the
+    calendar, so ``humanize(past(months=2))`` is ``'2 months ago'``.
+    Times less than one unit of ``granularity`` away are ``'just
+    now'``.
+
+    Time zone naive datetimes, including ``relative_to``, are assumed to
+    be in the current system time zone, like the datetimes returned by
+    ``now()``. If the ``utc`` parameter is set to ``True`` or
+    ``set_utc()`` has been called, however, UTC will be assumed instead.
+
+    :param value: The time to describe.
+    :type value: datetime.datetime, when.Instant.
+    :param relative_to: The time to describe it from. Defaults to now.
+    :type relative_to: datetime.datetime, when.Instant.
+    :param granularity: The smallest unit to use: ``'second'``,
+                        ``'minute'``, ``'hour'``, ``'day'``, ``'week'``,
+                        ``'month'`` or ``'year'``.
+    :type granularity: str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: str -- the description.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    return humanize_many([value], relative_to, granularity, utc)[0]
+
+
+def humanize_many(values, relative_to=None, granularity='second',
+                  utc=False):
+    """Describe how far many times are from now.
+
+    This works like ``humanize()``, but the current time is only looked
+    up once for all of the values.
+
+    :param values: The times to describe.
+    :type values: when.DatetimeColumn, iterable of datetime.datetime or
+                  when.Instant.
+    :param relative_to: The time to describe them from. Defaults to now.
+    :type relative_to: datetime.datetime, when.Instant.
+    :param granularity: The smallest unit to use: ``'second'``,
+                        ``'minute'``, ``'hour'``, ``'day'``, ``'week'``,
+                        ``'month'`` or ``'year'``.
+    :type granularity: str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: list -- the descriptions.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    granularity = _humanize_granularity(granularity)
+
+    if isinstance(values, DatetimeColumn):
+        zone, data = values._zone, values._data
+    else:
+        zone = _zone_id(_resolve_timezone(None, utc))
+        data = [_instant_microseconds(value, zone) for value in values]
+    table = _zone_table(zone)
+
+    if relative_to is None:
+        now = int(time.time() * 1000000)
+    else:
+        now = _instant_microseconds(relative_to, zone)
+    now_wall = now + table.offset(now)
+
+    return [_humanize(value, value + table.offset(value), now, now_wall,
+                      granularity)
+            for value in data]
+
+
+def intern_datetime(value):
+    """Get a datetime using a shared ``tzinfo``.
+
+    Time zone aware datetimes that are created separately can each hold
+    their own copy of the same ``tzinfo``. The datetime returned uses
+    the same ``tzinfo`` object as every other interned datetime with the
+    same time zone, UTC offset and daylight saving time offset, so
+    large collections of datetimes hold and pickle fewer objects. Time
+    zone naive datetimes are returned unchanged.
+
+    :param value: A datetime object.
+    :type value: datetime.datetime.
+    :returns: datetime.datetime -- the same datetime.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(value, datetime.datetime):
+        message = "'{0}' object is not a valid datetime."
+        raise TypeError(message.format(type(value).__name__))
+
+    tz = value.tzinfo
+    if tz is None:
+        return value
+
+    key = (getattr(tz, 'zone', None) or str(tz), value.utcoffset(),
+           value.dst(), value.tzname())
+    shared = _TZINFOS.get(key)
+    if shared is None:
+        if len(_TZINFOS) >= _TZINFOS_MAX:
+            _TZINFOS.clear()
+        shared = _TZINFOS.setdefault(key, tz)
+    return value if shared is tz else value.replace(tzinfo=shared)
+
+
 def is_5_oclock():
     # Congratulations, you've found an easter egg!
     #
@@ -487,6 +4896,121 @@ def is_timezone_naive(value):
     return value.tzinfo is None or value.tzinfo.utcoffset(value) is None
 
 
+def load_column(path):
+    """Load a column of timestamps saved by ``save_column()``.
+
+    The file is memory-mapped rather than read, so loading is immediate
+    regardless of its size, and the operating system only reads the
+    parts of the file that are used. Slicing the column doesn't copy the
+    values either, so a large file can be processed one slice at a time,
+    e.g. ``column[i:i + 1000000].format('%Y-%m-%d')``.
+
+    :param path: The path of the file.
+    :type path: str.
+    :returns: when.DatetimeColumn -- the column.
+    :raises: ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    with open(path, 'rb') as f:
+        header = f.read(_COLUMN_HEADER.size)
+        if len(header) < _COLUMN_HEADER.size:
+            raise ValueError("'{0}' is not a timestamp file.".format(path))
+
+        magic, version, resolution, zone_length, count = \
+            _COLUMN_HEADER.unpack(header)
+        if magic != _COLUMN_MAGIC:
+            raise ValueError("'{0}' is not a timestamp file.".format(path))
+        if version != _COLUMN_VERSION:
+            message = "Version {0} timestamp files are not supported."
+            raise ValueError(message.format(version))
+
+        zone = f.read(zone_length).decode('utf-8')
+        start = _COLUMN_HEADER.size + zone_length
+        start += -start % 8
+
+        if not count:
+            data = array.array('q')
+        else:
+            # The memoryview keeps the mapping open after the file is
+            # closed.
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            data = memoryview(mapping)[start:start + count * 8]
+            if len(data) != count * 8:
+                raise ValueError("'{0}' is truncated.".format(path))
+            data = data.cast('q')
+
+    if sys.byteorder != 'little' or resolution != 1:
+        data = array.array('q', data)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        if resolution != 1:
+            data = array.array('q', [value * resolution for value in data])
+
+    zone = _zone_id(_resolve_timezone(zone))
+    return DatetimeColumn._from_zone_id(data, zone)
+
+
+def next_occurrences(rules, value=None):
+    """Get the next occurrence of many recurrence rules.
+
+    ``value`` is converted to the time zone of each :class:`Recurrence`
+    only once for all of the rules that share that time zone.
+
+    :param rules: The rules to evaluate.
+    :type rules: iterable of when.Recurrence.
+    :param value: The datetime after which to look. Defaults to the
+                  current time in UTC.
+    :type value: datetime.datetime.
+    :returns: list -- the next occurrence of each rule.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if value is None:
+        value = pytz.UTC.localize(now(utc=True))
+
+    wall_times = {}
+    occurrences = []
+    for rule in rules:
+        key = id(rule.tz)
+        if key not in wall_times:
+            wall_times[key] = rule._wall_time(value)
+        occurrences.append(next(rule._iter_from(wall_times[key],
+                                                inclusive=False)))
+
+    return occurrences
+
+
+def next_transition(tz, after):
+    """Get the first transition of a time zone after a time.
+
+    Time zone naive datetimes are assumed to be in the time zone
+    specified by ``tz``. The transitions of each time zone are cached,
+    so this only takes a binary search.
+
+    :param tz: The time zone.
+    :type tz: datetime.tzinfo, str.
+    :param after: The time after which to look.
+    :type after: datetime.datetime, when.Instant.
+    :returns: when.Transition -- the next transition, or ``None`` if the
+              time zone has none after ``after``.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    zone = _zone_id(_resolve_timezone(tz))
+    table = _zone_table(zone)
+
+    index = table.index(_instant_microseconds(after, zone)) + 1
+    if index < len(table.starts):
+        return Transition._from_zone_id(zone, index)
+    return None
+
+
 def now(utc=False):
     """Get a datetime representing the current date and time.
 
@@ -505,8 +5029,159 @@ def now(utc=False):
         return datetime.datetime.now()
 
 
+def pack_datetime(value):
+    """Pack a datetime into a few bytes.
+
+    The bytes hold the number of microseconds since the Unix epoch and
+    the name of the time zone, which is much smaller and faster to
+    pickle or send to another process than the datetime itself. Time
+    zones are named by their pytz or ``zoneinfo`` name. Time zones
+    without a name, like ``datetime.timezone``, are stored as their UTC
+    offset, which must be a whole number of minutes. The datetime can be
+    restored with ``unpack_datetime()``.
+
+    :param value: A datetime object.
+    :type value: datetime.datetime.
+    :returns: bytes -- the packed datetime.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(value, datetime.datetime):
+        message = "'{0}' object is not a valid datetime."
+        raise TypeError(message.format(type(value).__name__))
+
+    if value.tzinfo is None:
+        return _PACKED_DATETIME.pack(_naive_microseconds(value))
+
+    tz = value.tzinfo
+    zone = getattr(tz, 'zone', None) or getattr(tz, 'key', None)
+    if not zone:
+        offset = _timedelta_microseconds(value.utcoffset())
+        if offset % 60000000:
+            message = ("The UTC offset of '{0}' isn't a whole number of "
+                       "minutes.")
+            raise ValueError(message.format(tz))
+        minutes = offset // 60000000
+        zone = '{0}{1:02d}:{2:02d}'.format('-' if minutes < 0 else '+',
+                                           *divmod(abs(minutes), 60))
+    return (_PACKED_DATETIME.pack(_epoch_microseconds(value))
+            + zone.encode('utf-8'))
+
+
+def parse_duration(value):
+    """Parse a duration like ``'1y2mo3w4d5h'`` or ``'2h 30m'``.
+
+    The result holds the keyword arguments of ``future()`` and
+    ``past()``, with only the units that appear in ``value``. The units
+    are ``y`` (years), ``mo`` (months), ``w`` (weeks), ``d`` (days),
+    ``h`` (hours), ``m`` (minutes), ``s`` (seconds), ``ms``
+    (milliseconds) and ``us`` (microseconds); their longer names, like
+    ``min`` or ``hours``, can be used too. A unit that appears more than
+    once is added up. Parsed durations are cached, so the same string is
+    only parsed once.
+
+    :param value: The duration.
+    :type value: str.
+    :returns: dict -- the number of each unit of time.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(value, str):
+        message = "'{0}' object is not a valid duration."
+        raise TypeError(message.format(type(value).__name__))
+
+    try:
+        return dict(_DURATIONS[value])
+    except KeyError:
+        pass
+
+    amounts = {}
+    position = 0
+    while position < len(value):
+        match = _DURATION_PART.match(value, position)
+        if match is None or match.group(2) not in _DURATION_UNITS:
+            break
+        unit = _DURATION_UNITS[match.group(2)]
+        amounts[unit] = amounts.get(unit, 0) + int(match.group(1))
+        position = match.end()
+    if not amounts or position < len(value):
+        raise ValueError("'{0}' is not a valid duration.".format(value))
+
+    if len(_DURATIONS) >= _DURATIONS_MAX:
+        _DURATIONS.clear()
+    _DURATIONS[value] = amounts
+    return dict(amounts)
+
+
+def partition(start, end, unit, tz=None, max_parts=None, utc=False):
+    """Split a period of time into parts that follow a unit of time.
+
+    The parts are :class:`Interval` objects, generated lazily, that
+    cover the time from ``start`` up to ``end`` without gaps or overlap.
+    Each part begins and ends where ``floor()`` would round to in the
+    time zone specified by ``tz``, except that the first part begins at
+    ``start`` and the last one ends at ``end``. On days when daylight
+    saving time starts or ends, day parts are 23 or 25 hours long, and
+    every boundary is an exact instant, which ``Interval.shift()`` can
+    show in UTC.
+
+    If no value is provided for ``max_parts``, there is a part for each
+    unit. Otherwise there are at most ``max_parts`` parts of whole units
+    with durations as close to each other as the units allow, making it
+    easy to spread work evenly over a number of workers.
+
+    Time zone naive datetimes are assumed to be in the time zone
+    specified by ``tz``. If no value is provided for ``tz``, the current
+    system time zone will be used. If the ``utc`` parameter is set to
+    ``True`` or ``set_utc()`` has been called, however, UTC will be used
+    instead.
+
+    :param start: The beginning of the period.
+    :type start: datetime.datetime, when.Instant.
+    :param end: The end of the period.
+    :type end: datetime.datetime, when.Instant.
+    :param unit: One of ``'year'``, ``'month'``, ``'week'``, ``'day'``,
+                 ``'hour'``, ``'minute'`` or ``'second'``.
+    :type unit: str.
+    :param tz: The time zone of the units.
+    :type tz: datetime.tzinfo, str.
+    :param max_parts: The maximum number of parts.
+    :type max_parts: int.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: iterator -- the :class:`Interval` of each part, in order.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    zone = _zone_id(_resolve_timezone(tz, utc))
+    start = _instant_microseconds(start, zone)
+    end = _instant_microseconds(end, zone)
+    _wall_floor(unit)
+
+    if end < start:
+        message = "The value of 'start' must not be after the value of 'end'."
+        raise ValueError(message)
+    if max_parts is not None:
+        if (isinstance(max_parts, bool)
+                or not isinstance(max_parts, numbers.Integral)):
+            message = "'{0}' object is not a valid number of parts."
+            raise TypeError(message.format(type(max_parts).__name__))
+        max_parts = int(max_parts)
+        if max_parts < 1:
+            raise ValueError("The value of 'max_parts' must be at least 1.")
+
+    return _partition(start, end, unit, zone, max_parts)
+
+
 def past(years=0, months=0, weeks=0, days=0, hours=0, minutes=0, seconds=0,
-         milliseconds=0, microseconds=0, utc=False):
+         milliseconds=0, microseconds=0, utc=False, business_days=0,
+         business_calendar=None):
     """Get a datetime in the past.
 
     ``past()`` accepts the all of the parameters of
@@ -514,12 +5189,20 @@ def past(years=0, months=0, weeks=0, days=0, hours=0, minutes=0, seconds=0,
     ``months``. ``years`` and ``months`` will add their respective units
     of time to the datetime.
 
+    A duration string like ``'2h30m'`` can be passed in place of
+    ``years``. It's parsed with ``parse_duration()`` and its units are
+    subtracted from the datetime along with the other parameters.
+
+    ``business_days`` are subtracted last, using ``business_calendar``.
+    If no value is provided for ``business_calendar``, Saturday and
+    Sunday will be the only days that aren't business days.
+
     By default ``past()`` will return the datetime in the system's local
     time. If the ``utc`` parameter is set to ``True`` or ``set_utc()``
     has been called, the datetime will be based on UTC instead.
 
-    :param years: The number of years to subtract.
-    :type years: int.
+    :param years: The number of years to subtract, or a duration string.
+    :type years: int, str.
     :param months: The number of months to subtract.
     :type months: int.
     :param weeks: The number of weeks to subtract.
@@ -538,13 +5221,245 @@ def past(years=0, months=0, weeks=0, days=0, hours=0, minutes=0, seconds=0,
     :type microseconds: int.
     :param utc: Whether or not to use UTC instead of local time.
     :type utc: bool.
+    :param business_days: The number of business days to subtract.
+    :type business_days: int.
+    :param business_calendar: The calendar of business days.
+    :type business_calendar: when.BusinessCalendar.
     :returns: datetime.datetime -- the calculated datetime.
+
+    .. versionchanged:: 0.5.0
+       Added the ``business_days`` and ``business_calendar``
+       parameters.
+       ``years`` can be a duration string.
+       ``milliseconds`` and ``microseconds`` are now subtracted.
+    """
+
+    amounts = _duration_amounts(years, months, weeks, days, hours, minutes,
+                                seconds, milliseconds, microseconds)
+    value = _add_time(now(utc), **dict((unit, -amount)
+                                       for unit, amount in amounts.items()))
+    if business_days:
+        business_calendar = business_calendar or _business_week()
+        value = business_calendar.add_business_days(value, -business_days)
+    return value
+
+
+def range(start, stop, years=0, months=0, weeks=0, days=0, hours=0,
+          minutes=0, seconds=0, milliseconds=0, microseconds=0):
+    """Get a lazy range of datetimes.
+
+    ``range()`` accepts the same units of time as ``future()`` and
+    ``past()`` to describe the step between items. When no step is
+    given, a step of one day is used. All of the units must either be
+    positive, producing an ascending range, or negative, producing a
+    descending range. As with the builtin ``range()``, ``stop`` is never
+    included. ``start`` and ``stop`` must both be dates or both be
+    datetimes, and datetimes must both be naive or both be aware. If
+    they are dates, the step must be a whole number of days.
+
+    The ``n``-th item is the same value ``_add_time()`` would produce
+    for ``start`` and ``n`` times the step, including the way days that
+    don't exist in the destination month are handled. This makes
+    ``when.range(when.now(), stop, months=1)`` behave like calling
+    ``when.future(months=i)`` in a loop, without repeating the work for
+    every item. The result supports iteration, indexing, slicing,
+    ``len()`` and ``reversed()``.
+
+    :param start: The first datetime in the range.
+    :type start: datetime.datetime, datetime.date.
+    :param stop: The datetime at which to stop.
+    :type stop: datetime.datetime, datetime.date.
+    :param years: The number of years between items.
+    :type years: int.
+    :param months: The number of months between items.
+    :type months: int.
+    :param weeks: The number of weeks between items.
+    :type weeks: int.
+    :param days: The number of days between items.
+    :type days: int.
+    :param hours: The number of hours between items.
+    :type hours: int.
+    :param minutes: The number of minutes between items.
+    :type minutes: int.
+    :param seconds: The number of seconds between items.
+    :type seconds: int.
+    :param milliseconds: The number of milliseconds between items.
+    :type milliseconds: int.
+    :param microseconds: The number of microseconds between items.
+    :type microseconds: int.
+    :returns: a lazy sequence of datetimes.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(start, datetime.date):
+        message = "'{0}' object is not a valid date or datetime."
+        raise TypeError(message.format(type(start).__name__))
+    if not isinstance(stop, datetime.date):
+        message = "'{0}' object is not a valid date or datetime."
+        raise TypeError(message.format(type(stop).__name__))
+    if (isinstance(start, datetime.datetime)
+            != isinstance(stop, datetime.datetime)):
+        message = ("The values of 'start' and 'stop' must both be dates or "
+                   "both be datetimes.")
+        raise TypeError(message)
+    if (isinstance(start, datetime.datetime)
+            and (start.utcoffset() is None) != (stop.utcoffset() is None)):
+        message = ("The values of 'start' and 'stop' must both be naive or "
+                   "both be aware.")
+        raise TypeError(message)
+
+    delta = datetime.timedelta(weeks=weeks, days=days, hours=hours,
+                               minutes=minutes, seconds=seconds,
+                               milliseconds=milliseconds,
+                               microseconds=microseconds)
+    if not (delta or years or months):
+        delta = datetime.timedelta(days=1)
+
+    zero = datetime.timedelta(0)
+    ascending = delta > zero or years > 0 or months > 0
+    descending = delta < zero or years < 0 or months < 0
+    if ascending and descending:
+        message = ("The values of 'years', 'months', 'weeks', 'days', "
+                   "'hours', 'minutes', 'seconds', 'milliseconds' and "
+                   "'microseconds' must all have the same sign.")
+        raise ValueError(message)
+    if (not isinstance(start, datetime.datetime)
+            and (delta.seconds or delta.microseconds)):
+        # Adding less than a day to a date doesn't change it.
+        message = "Dates can only be separated by whole days."
+        raise ValueError(message)
+
+    items = _DateRange(start, delta, years, months, _range(0))
+
+    def before_stop(step):
+        try:
+            value = items._at(step)
+        except (OverflowError, ValueError):
+            # Stepping past datetime.MINYEAR or datetime.MAXYEAR means
+            # the value is past `stop`, too.
+            return False
+        return value < stop if ascending else value > stop
+
+    # The items are monotonic, so the number of them before `stop` can
+    # be found by doubling an upper bound and then bisecting, touching
+    # only O(log n) items.
+    if not before_stop(0):
+        count = 0
+    else:
+        low, high = 0, 1
+        while before_stop(high):
+            low, high = high, high * 2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if before_stop(middle):
+                low = middle
+            else:
+                high = middle
+        count = low + 1
+
+    items._indices = _range(count)
+    return items
+
+
+def resolve_timezone(name):
+    """Get a time zone from a name that may not be written exactly.
+
+    Names are matched without regard to case, spaces and hyphens can be
+    used instead of underscores, and time zones can be found by the
+    last part of their name, like ``'new_york'``, unless another common
+    time zone shares it. Fixed UTC offsets like ``'+05:30'`` are also
+    accepted. Names that have been resolved before are remembered, so
+    looking them up again only takes a dictionary lookup.
+
+    This is also used to find the time zones passed to ``shift()`` and
+    the rest of the module by name.
+
+    :param name: The name of the time zone.
+    :type name: str.
+    :returns: datetime.tzinfo -- the time zone.
+    :raises: TypeError, pytz.UnknownTimeZoneError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(name, str):
+        message = "'{0}' object is not a valid time zone name."
+        raise TypeError(message.format(type(name).__name__))
+
+    try:
+        return _RESOLVED_ZONES[name]
+    except KeyError:
+        pass
+
+    if name[:1] in ('+', '-'):
+        try:
+            return pytz.FixedOffset(_parse_offset(name) // 60000000)
+        except ValueError:
+            raise pytz.UnknownTimeZoneError(name)
+
+    try:
+        tz = pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        found = _zone_names().lookup(name)
+        if found is None:
+            raise
+        tz = pytz.timezone(found)
+
+    if len(_RESOLVED_ZONES) >= _RESOLVED_ZONES_MAX:
+        _RESOLVED_ZONES.clear()
+    _RESOLVED_ZONES[name] = tz
+    return tz
+
+
+def save_column(path, column):
+    """Save a column of timestamps to a compact binary file.
+
+    The file holds a small header with the name of the time zone
+    followed by the values as packed 64-bit integers. It can be loaded
+    with ``load_column()``. Time zones without a name are saved as their
+    UTC offset, like ``'+05:30'``. The file is written next to ``path``
+    and then moved into place, so a column loaded from ``path`` can be
+    saved back to it. It keeps the permissions of the file it replaces,
+    and new files get the usual permissions allowed by the umask.
+
+    :param path: The path of the file.
+    :type path: str.
+    :param column: The timestamps to save.
+    :type column: when.DatetimeColumn.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
     """
 
-    return _add_time(now(utc), years=-years, months=-months, weeks=-weeks,
-                     days=-days, hours=-hours, minutes=-minutes,
-                     seconds=-seconds, milliseconds=milliseconds,
-                     microseconds=microseconds)
+    if not isinstance(column, DatetimeColumn):
+        message = "'{0}' object is not a valid column."
+        raise TypeError(message.format(type(column).__name__))
+
+    zone = _zone_name(column._zone).encode('utf-8')
+    header = _COLUMN_HEADER.pack(_COLUMN_MAGIC, _COLUMN_VERSION, 1, len(zone),
+                                 len(column))
+    padding = b'\0' * (-(len(header) + len(zone)) % 8)
+
+    data = column.microseconds
+    if sys.byteorder != 'little' or (isinstance(data, memoryview)
+                                     and not data.contiguous):
+        data = array.array('q', data)
+        if sys.byteorder != 'little':
+            data.byteswap()
+
+    # Write to a new file and move it into place, so that saving over
+    # the file a column was loaded from doesn't truncate its mapping.
+    fd, temporary = _open_temporary(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header + zone + padding)
+            f.write(memoryview(data).cast('B'))
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
 
 
 def set_utc():
@@ -600,26 +5515,10 @@ def shift(value, from_tz=None, to_tz=None, utc=False):
     if is_timezone_aware(value):
         from_tz = value.tzinfo
     else:
-        if not from_tz:
-            if _FORCE_UTC or utc:
-                from_tz = pytz.UTC
-            else:
-                from_tz = timezone_object()  # Use the system's time zone
-        else:
-            if not isinstance(from_tz, datetime.tzinfo):
-                # This will raise pytz.UnknownTimeZoneError
-                from_tz = pytz.timezone(from_tz)
+        from_tz = _resolve_timezone(from_tz, utc)
 
     # Check for a to timezone
-    if not to_tz:
-        if _FORCE_UTC or utc:
-            to_tz = pytz.UTC
-        else:
-            to_tz = timezone_object()  # Use the system's time zone
-    else:
-        if not isinstance(to_tz, datetime.tzinfo):
-            # This will raise pytz.UnknownTimeZoneError
-            to_tz = pytz.timezone(to_tz)
+    to_tz = _resolve_timezone(to_tz, utc)
 
     if from_tz == to_tz:
         return value
@@ -633,6 +5532,58 @@ def shift(value, from_tz=None, to_tz=None, utc=False):
     return value.astimezone(to_tz).replace(tzinfo=None)
 
 
+def sleep_until(value, result=None, loop=None, utc=False):
+    """Wait in an asyncio coroutine until a datetime has passed.
+
+    ``await when.sleep_until(when.future(minutes=5))`` works like
+    ``asyncio.sleep()`` with a datetime instead of a number of seconds.
+    Time zone naive datetimes are assumed to be in the current system
+    time zone. If the ``utc`` parameter is set to ``True`` or
+    ``set_utc()`` has been called, UTC will be assumed instead. All of
+    the waits for a loop share a single loop timer.
+
+    :param value: When to stop waiting.
+    :type value: datetime.datetime.
+    :param result: The value to return when done waiting.
+    :param loop: The event loop. Defaults to the current loop.
+    :type loop: asyncio.AbstractEventLoop.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: asyncio.Future -- a future to wait on.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    return _loop_deadlines(loop, utc).sleep_until(value, result)
+
+
+def suggest_timezones(prefix, limit=10):
+    """Get the names of the time zones that best match a prefix.
+
+    The prefix is normalized like the names passed to
+    ``resolve_timezone()`` and can match the start of a whole name, of
+    any part of it, like ``'new_y'``, or of any word of its last part,
+    like ``'york'``. Time zones are ranked in that order, then common
+    time zones come first, then the shortest names.
+
+    :param prefix: The start of the name.
+    :type prefix: str.
+    :param limit: The maximum number of names to return.
+    :type limit: int.
+    :returns: list -- the names of the time zones, best match first.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(prefix, str):
+        message = "'{0}' object is not a valid time zone name."
+        raise TypeError(message.format(type(prefix).__name__))
+
+    return _zone_names().suggest(prefix, limit)
+
+
 def timezone():
     """Get the name of the current system time zone.
 
@@ -678,10 +5629,10 @@ def _timezone_from_etc_localtime():
             tz = pytz.timezone(tzname)
 
             if localtime.zone.endswith(tz.zone):
-                # Continuing with the OSX 10.9.5 example, the comparisons below
-                # continue incorrectly when comparing localtime._transition_info
-                # with tz._transition_info, as the tz version has one
-                # more entry than the localtime version.
+                # Continuing with the OSX 10.9.5 example, the comparisons
+                # below continue incorrectly when comparing
+                # localtime._transition_info with tz._transition_info, as the
+                # tz version has one more entry than the localtime version.
                 matches.append(tz.zone)
                 continue
 
@@ -731,7 +5682,64 @@ def timezone_object(tz_name=None):
               zone.
     """
 
-    return pytz.timezone(tz_name if tz_name else timezone())
+    return resolve_timezone(tz_name if tz_name else timezone())
+
+
+def to_epoch(value, tz=None, unit='s', utc=False):
+    """Get the Unix timestamp of a datetime.
+
+    Time zone naive datetimes are assumed to be in the time zone
+    specified by ``tz``, defaulting like the ``from_tz`` parameter of
+    ``shift()``. The timestamp is calculated with integer arithmetic and
+    rounded down to a whole unit.
+
+    :param value: The datetime.
+    :type value: datetime.datetime, when.Instant.
+    :param tz: The time zone of ``value`` if it's naive.
+    :type tz: datetime.tzinfo, str.
+    :param unit: The unit of the timestamp, ``'s'``, ``'ms'`` or
+                 ``'us'``.
+    :type unit: str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: int -- the timestamp.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    scale = _epoch_unit(unit)
+    zone = _zone_id(_resolve_timezone(tz, utc))
+    return _instant_microseconds(value, zone) // scale
+
+
+def to_epoch_many(values, tz=None, unit='s', utc=False):
+    """Get the Unix timestamps of many datetimes.
+
+    This works like ``to_epoch()``. The values of a
+    :class:`DatetimeColumn` are already stored as timestamps, so they
+    are only divided.
+
+    :param values: The datetimes.
+    :type values: when.DatetimeColumn, iterable of datetime.datetime.
+    :param tz: The time zone of naive datetimes.
+    :type tz: datetime.tzinfo, str.
+    :param unit: The unit of the timestamps, ``'s'``, ``'ms'`` or
+                 ``'us'``.
+    :type unit: str.
+    :param utc: Whether or not to use UTC instead of local time.
+    :type utc: bool.
+    :returns: array.array -- the timestamps.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    scale = _epoch_unit(unit)
+    data = _column(values, tz, utc)._data
+    if scale == 1:
+        return array.array('q', data)
+    return array.array('q', [value // scale for value in data])
 
 
 def today():
@@ -752,6 +5760,88 @@ def tomorrow():
     return datetime.date.today() + datetime.timedelta(days=1)
 
 
+def transitions(tz, start, end):
+    """Get the transitions of a time zone between two times.
+
+    Transitions at ``start`` are included, those at ``end`` aren't. Time
+    zone naive datetimes are assumed to be in the time zone specified by
+    ``tz``. The transitions of each time zone are cached, so this only
+    takes a binary search.
+
+    :param tz: The time zone.
+    :type tz: datetime.tzinfo, str.
+    :param start: The beginning of the period.
+    :type start: datetime.datetime, when.Instant.
+    :param end: The end of the period.
+    :type end: datetime.datetime, when.Instant.
+    :returns: list -- the :class:`Transition` objects, in order.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    return _transitions(_zone_id(_resolve_timezone(tz)), start, end)
+
+
+def transitions_many(zones, start, end):
+    """Get the transitions of many time zones between two times.
+
+    This works like ``transitions()``. Time zone naive datetimes are
+    assumed to be in each of the time zones, so the same wall times can
+    be checked everywhere.
+
+    :param zones: The time zones.
+    :type zones: iterable of datetime.tzinfo or str.
+    :param start: The beginning of the period.
+    :type start: datetime.datetime, when.Instant.
+    :param end: The end of the period.
+    :type end: datetime.datetime, when.Instant.
+    :returns: dict -- the list of :class:`Transition` objects of each
+              time zone, keyed by the values in ``zones``.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    result = {}
+    for tz in zones:
+        result[tz] = _transitions(_zone_id(_resolve_timezone(tz)), start, end)
+    return result
+
+
+def unpack_datetime(data):
+    """Restore a datetime packed by ``pack_datetime()``.
+
+    Time zone aware datetimes are returned in their original time zone,
+    as a pytz time zone, and use the shared ``tzinfo`` of
+    ``intern_datetime()``.
+
+    :param data: The packed datetime.
+    :type data: bytes.
+    :returns: datetime.datetime -- the datetime.
+    :raises: TypeError, ValueError, pytz.UnknownTimeZoneError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(data, (bytes, bytearray)):
+        message = "'{0}' object is not a valid packed datetime."
+        raise TypeError(message.format(type(data).__name__))
+    if len(data) < _PACKED_DATETIME.size:
+        raise ValueError('The data is not a packed datetime.')
+
+    microseconds = _PACKED_DATETIME.unpack_from(data)[0]
+    zone = bytes(data[_PACKED_DATETIME.size:]).decode('utf-8')
+    if not zone:
+        return _EPOCH + datetime.timedelta(microseconds=microseconds)
+
+    if zone[0] in '+-':
+        tz = pytz.FixedOffset(_parse_offset(zone) // 60000000)
+    else:
+        tz = resolve_timezone(zone)
+    return intern_datetime(_from_epoch_microseconds(microseconds, tz))
+
+
 def unset_utc():
     """Set all datetimes to system time.
 
@@ -764,6 +5854,38 @@ def unset_utc():
     _FORCE_UTC = False
 
 
+def world_clock(at=None):
+    """Get the wall time in every common time zone.
+
+    The common time zones are kept in an index grouped by the UTC offset
+    they use, which only needs to be updated when one of them
+    transitions, so each distinct wall time is only calculated once.
+
+    Time zone naive datetimes are assumed to be in the current system
+    time zone. If ``set_utc()`` has been called, however, UTC will be
+    assumed instead.
+
+    :param at: The time to use. Defaults to now.
+    :type at: datetime.datetime, when.Instant.
+    :returns: dict -- the naive wall time of each time zone, keyed by
+              its name.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    with _ZONE_INDEX_LOCK:
+        index, microseconds = _query_zones(at)
+
+        clock = {}
+        for offset, names in index.offsets.items():
+            wall = _EPOCH + datetime.timedelta(microseconds=microseconds
+                                               + offset)
+            for name in names:
+                clock[name] = wall
+        return clock
+
+
 def yesterday():
     """Get a date representing yesterday's date.
 
@@ -771,3 +5893,55 @@ def yesterday():
     """
 
     return datetime.date.today() - datetime.timedelta(days=1)
+
+
+def zones_at_offset(offset, at=None):
+    """Get the common time zones using a UTC offset.
+
+    The common time zones are kept in an index grouped by the UTC offset
+    they use, which only needs to be updated when one of them
+    transitions.
+
+    Time zone naive datetimes are assumed to be in the current system
+    time zone. If ``set_utc()`` has been called, however, UTC will be
+    assumed instead.
+
+    :param offset: The offset, like ``'+05:30'`` or ``'-0800'``.
+    :type offset: datetime.timedelta, str.
+    :param at: The time to use. Defaults to now.
+    :type at: datetime.datetime, when.Instant.
+    :returns: list -- the sorted names of the time zones.
+    :raises: TypeError, ValueError
+
+    .. versionadded:: 0.5.0
+    """
+
+    offset = _parse_offset(offset)
+
+    with _ZONE_INDEX_LOCK:
+        return _query_zones(at)[0].zones(offset)
+
+
+def zones_with_abbreviation(abbreviation, at=None):
+    """Get the common time zones using an abbreviation, like ``'EST'``.
+
+    Time zone naive datetimes are assumed to be in the current system
+    time zone. If ``set_utc()`` has been called, however, UTC will be
+    assumed instead.
+
+    :param abbreviation: The abbreviation.
+    :type abbreviation: str.
+    :param at: The time to use. Defaults to now.
+    :type at: datetime.datetime, when.Instant.
+    :returns: list -- the sorted names of the time zones.
+    :raises: TypeError
+
+    .. versionadded:: 0.5.0
+    """
+
+    if not isinstance(abbreviation, str):
+        message = "'{0}' object is not a valid abbreviation."
+        raise TypeError(message.format(type(abbreviation).__name__))
+
+    with _ZONE_INDEX_LOCK:
+        return _query_zones(at)[0].zones(abbreviation)